@@ -8,24 +8,60 @@ Functions for processing downscaled model towards CORE-WESM dataset
 
 
 import os
+import re
+import time
+import json
+import shutil
+import hashlib
 import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 import numpy as np
 
+import ospro as op
+import raw_data as rd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pacsv = None
+    pc = None
+
 logger = logging.getLogger(__name__)
 
+# version of cached scenario results, to be increased if format changes
+_RESULTS_CACHE_VERSION = 1
+
+# filtered national scenario results, by file content and filter, least
+# recently used first
+_SCENARIO_RESULTS = OrderedDict()
+# maximum number of scenario results kept in memory
+_SCENARIO_RESULTS_SIZE = 32
+
 
 #%% Define util functions for dataset integration
 
 
-def load_model(path):
+def load_model(path, n_workers=1, engine=None):
     """ Load county model
     
     Parameters
     ----------
     path : str
-        Path to folder with (unprocessed) county model to load.
+        Path to folder with (unprocessed) county model to load, i.e., with
+        a spreadsheet file or a directory with parquet files (see
+        ospro.write_workbook) for each model.
+    n_workers : int, optional
+        Number of worker processes used to load spreadsheet files in
+        parallel. The default is 1.
+    engine : str, optional
+        Engine used to read spreadsheet files (see ospro.read_workbook).
+        The default is None.
 
     Raises
     ------
@@ -44,18 +80,51 @@ def load_model(path):
         raise ValueError("Model directory does not exists or a file and not"
                          " a directory is provided.")
     
-    # get list of all files
-    files = [f for f in os.listdir(path) if f.endswith(".xlsx")]
+    # get list of all files and directories with parquet files
+    files = [f for f in os.listdir(path)
+             if f.endswith(".xlsx")
+             or (os.path.isdir(path+f)
+                 and any(e.endswith(".parquet")
+                         for e in os.listdir(path+f)))]
     
     data = dict()
     
-    for f in files:
-        data[f] = pd.read_excel(path+f,sheet_name=None,
-                                keep_default_na=False)
+    if n_workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers,
+                                                 len(files))) as ex:
+            for f,sheets in zip(files, ex.map(_load_workbook,
+                                              [path+f for f in files],
+                                              [engine]*len(files))):
+                data[f] = sheets
+    else:
+        for f in files:
+            data[f] = _load_workbook(path+f, engine)
 
     return data
 
-def save_model(path, data, overwrite=False):
+def _load_workbook(f, engine=None):
+    """ Load all sheets of a model spreadsheet file.
+    
+    Parameters
+    ----------
+    f : str
+        File path to spreadsheet file.
+    engine : str, optional
+        Engine used to read spreadsheet file (see ospro.read_workbook).
+        The default is None.
+
+    Returns
+    -------
+    dict
+        Dictionary of DataFrames with sheet names as keys.
+
+    """
+    
+    return op.read_workbook(f,engine=engine,sheet_name=None,
+                            keep_default_na=False)
+
+def save_model(path, data, overwrite=False, output_format="xlsx",
+               index=False, n_workers=1, engine=None, update=False):
     """ Save processed model
 
     Parameters
@@ -66,6 +135,29 @@ def save_model(path, data, overwrite=False):
         Model data.
     overwrite : bool, optional
         If to overwrite if non-empty directory exists. The default is False.
+    output_format : str, optional
+        Format of saved model, i.e., 'xlsx' for a spreadsheet file or
+        'parquet' for a directory with a parquet file for each sheet (see
+        ospro.write_workbook) per model. A model saved in the other format
+        is removed. The default is 'xlsx'.
+    index : bool or list, optional
+        If to save the index of the sheets, or list of names of sheets for
+        which the index is saved. The default is False.
+    n_workers : int, optional
+        Number of worker processes used to save models in parallel. The
+        default is 1.
+    engine : str, optional
+        Engine used to write spreadsheet files (see ospro.write_workbook).
+        The default is None.
+    update : bool, optional
+        If to update models saved as directories with parquet files, i.e.,
+        to only save the sheets provided (see ospro.write_workbook). The
+        default is False.
+
+    Raises
+    ------
+    ValueError
+        Raised if the output format is not implemented.
 
     Returns
     -------
@@ -73,6 +165,10 @@ def save_model(path, data, overwrite=False):
 
     """
     
+    if output_format not in ["xlsx","parquet"]:
+        raise ValueError(f"Output format '{output_format}' is not"
+                         " implemented.")
+    
     # check if directory exists, create if not
     if not os.path.exists(path):
         os.makedirs(path)
@@ -85,16 +181,173 @@ def save_model(path, data, overwrite=False):
             return True
         
 
+    files = list()
     for k in data.keys():
-        with pd.ExcelWriter(path+k, engine='openpyxl') as writer:
-            for s in data[k].keys():
-                data[k][s].to_excel(writer,merge_cells=False,
-                            sheet_name=s, index=False)     
+        name = k[:-len(".xlsx")] if k.endswith(".xlsx") else k
+        if output_format == "xlsx":
+            f, other = path+name+".xlsx", path+name
+        else:
+            f, other = path+name, path+name+".xlsx"
+        files.append(f)
+        
+        # remove model saved in the other format
+        if os.path.isfile(other):
+            os.remove(other)
+        elif os.path.isdir(other):
+            shutil.rmtree(other)
+    
+    # save models, in parallel if required
+    if n_workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers,
+                                                 len(files))) as ex:
+            list(ex.map(op.write_workbook, files, data.values(),
+                        [index]*len(files), [engine]*len(files),
+                        [update]*len(files)))
+    else:
+        for f,sheets in zip(files, data.values()):
+            op.write_workbook(f, sheets, index=index, engine=engine,
+                              update=update)
 
     logger.info("Saved updated data.")
     
 
 
+def load_scenario_results(path, param="TotalTechnologyAnnualActivity",
+                          techs=None, cache_dir=None):
+    """ Load national scenario results of a parameter
+    
+    Scenario runs are discovered as subdirectories 'runN' of path that
+    include a CSV file of the parameter results (with region 'r',
+    technology 't', and year 'y' columns and the value as last column) and
+    are named 'SN'. Technologies are filtered while reading the file in
+    batches and the filtered results are cached per file content.
+    
+    Parameters
+    ----------
+    path : str
+        Path to directory with national scenario runs.
+    param : str, optional
+        Name of result parameter. The default is
+        'TotalTechnologyAnnualActivity'.
+    techs : str, optional
+        Regular expression matched against technology names to filter
+        results, e.g., 'RK1|RK2'. The default is None, i.e., all
+        technologies.
+    cache_dir : str, optional
+        Path to directory used to also cache filtered results on disk
+        (requires pyarrow). The default is None.
+
+    Raises
+    ------
+    FileNotFoundError
+        Raised if no scenario runs with results of the parameter exist.
+
+    Returns
+    -------
+    DataFrame
+        Results indexed by SCENARIO and TECHNOLOGY (sorted for each
+        scenario, scenarios in order of runs) with years as columns, summed
+        over other dimensions (e.g., regions), missing values set to 0.
+
+    """
+    
+    # discover scenario runs
+    runs = dict()
+    if os.path.isdir(path):
+        for e in os.scandir(path):
+            m = re.fullmatch(r"run(\d+)", e.name)
+            f = os.path.join(e.path, param+".csv")
+            if m is not None and e.is_dir() and os.path.isfile(f):
+                runs[int(m.group(1))] = f
+    if len(runs) == 0:
+        raise FileNotFoundError(f"No scenario runs with results for '{param}'"
+                                f" found in '{path}'.")
+    
+    df = pd.concat({"S"+str(n):_load_scenario_file(runs[n], techs, cache_dir)
+                    for n in sorted(runs)},
+                   names=["SCENARIO"])
+    df = df.sort_index(axis=1).fillna(0)
+    
+    return df
+
+def _load_scenario_file(f, techs, cache_dir):
+    """ Load filtered results of a single scenario run as technology x year
+    DataFrame, from cache if file and filter are unchanged.
+    """
+    
+    h = hashlib.sha256()
+    with open(f, "rb") as fh:
+        for chunk in iter(lambda: fh.read(2**20), b""):
+            h.update(chunk)
+    h.update(json.dumps([techs, _RESULTS_CACHE_VERSION]).encode())
+    key = h.hexdigest()
+    
+    if key in _SCENARIO_RESULTS:
+        _SCENARIO_RESULTS.move_to_end(key)
+        return _SCENARIO_RESULTS[key].copy()
+    
+    entry = (None if cache_dir is None or pa is None
+             else os.path.join(cache_dir, key))
+    if entry is not None and os.path.isfile(os.path.join(entry,
+                                                         "results.parquet")):
+        df = pd.read_parquet(os.path.join(entry, "results.parquet"))
+        df.columns = pd.Index(df.columns.astype(int), name="y")
+        # update access time for LRU eviction
+        os.utime(entry)
+        logger.debug(f"Results of '{f}' loaded from cache.")
+    else:
+        df = _read_scenario_file(f, techs)
+        if entry is not None:
+            # write to temporary directory first, then move in place
+            tmp = os.path.join(cache_dir, f".{key}.{os.getpid()}.tmp")
+            os.makedirs(tmp, exist_ok=True)
+            df.rename(columns=str).to_parquet(os.path.join(tmp,
+                                                           "results.parquet"))
+            with open(os.path.join(tmp, "meta.json"), "w") as fh:
+                json.dump({"source":os.path.abspath(f),
+                           "created":time.time()}, fh)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # entry has been created concurrently
+                shutil.rmtree(tmp, ignore_errors=True)
+    
+    _SCENARIO_RESULTS[key] = df
+    if len(_SCENARIO_RESULTS) > _SCENARIO_RESULTS_SIZE:
+        _SCENARIO_RESULTS.popitem(last=False)
+    
+    return df.copy()
+
+def _read_scenario_file(f, techs):
+    """ Read results of a single scenario run in batches, keeping only
+    technologies matching techs, and pivot to technology x year DataFrame.
+    """
+    
+    with open(f) as fh:
+        cols = fh.readline().strip().split(",")
+    value = cols[-1]
+    
+    if pacsv is not None:
+        reader = pacsv.open_csv(f, convert_options=pacsv.ConvertOptions(
+            column_types={"t":pa.string(), value:pa.float64()}))
+        batches = [b if techs is None
+                   else b.filter(pc.match_substring_regex(b.column("t"),
+                                                          techs))
+                   for b in reader]
+        df = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+    else:
+        df = pd.concat([c if techs is None
+                        else c.loc[c["t"].str.contains(techs)]
+                        for c in pd.read_csv(f, chunksize=2**16,
+                                             dtype={"t":str, value:float})])
+    
+    df = df.pivot_table(index="t", columns="y", values=value,
+                        aggfunc="sum", fill_value=0)
+    df.index.names = ["TECHNOLOGY"]
+    
+    return df
+
+
 #%% Define functions for the integration of county-resolved datasets
 
 
@@ -104,7 +357,10 @@ def cookstove_dataset(data,
                       housing_dem,
                       nat_scens,
                       el_access,
-                      market_seg):
+                      market_seg,
+                      milestones=None,
+                      cache_dir=None,
+                      engine=None):
     """ Enhance cooking sector representation
     
 
@@ -119,11 +375,23 @@ def cookstove_dataset(data,
     housing_dem : str
         File path to data with housing demographics.
     nat_scens : str
-        Path to directory with national scenario data.
+        Path to directory with national scenario data, i.e., runs in
+        subdirectories 'runN' (see load_scenario_results).
     el_access : str
         File path to data on electricity access.
     market_seg : str
         File path to data on clean cooking market segmentation.
+    milestones : list, optional
+        Years after the base year (2024) for which the county pathways are
+        calculated, years in between are interpolated. Can include every
+        year of the model horizon. The default is None, i.e., 2030 and 2050.
+    cache_dir : str, optional
+        Path to directory used to cache the national scenario data and raw
+        data tables (see load_scenario_results and raw_data.load_source).
+        The default is None.
+    engine : str, optional
+        Engine used to read spreadsheet files (see ospro.read_workbook).
+        The default is None.
 
     Returns
     -------
@@ -133,59 +401,22 @@ def cookstove_dataset(data,
     """
     
     
-    #%% helper functions
-    def to_frac(df):
-        df = df.divide(df.sum())
-        return df
-    def to_abs(df,total):
-        df = df*total
-        return df
-   
     #%% load county data
     
     # load list of counties
     counties = pd.read_csv(list_counties,
                            keep_default_na=False)
-    # load data tables
-    cdf = pd.read_excel(housing_char,
-                        sheet_name="Table 5.7",
-                        skiprows=2,
-                        usecols="A:S"
-                        )
-
-    cdf.columns = ['Geography',
-                    'ELC001',
-                    'ELC001',
-                    'ELC001',
-                    'ELC001',
-                    'BGS001',
-                    'LPG001',    
-                    'ETH001',
-                    'NA',
-                    'BIO00X',
-                    'BIO00X',
-                    'CHC00X',
-                    'BIO00X',
-                    'BIO00X',
-                    'BIO00X',
-                    'KER001',
-                    'NA',
-                    'BIO00X',
-                    'HH']
-    
-    cdf = cdf.set_index("Geography")
-    cdf.columns.names = ["Stoves"]
-    cdf = cdf.T.groupby("Stoves").sum()
-
-
-    sdf = pd.read_excel(housing_char,
-                        sheet_name="Table 5.8",
-                        skiprows=1,
-                        usecols="A:N"
-                        )
-    sdf.columns = ["Geography"] + list(sdf.columns[1:])
-    sdf = sdf.set_index("Geography")
-    sdf = sdf.T
+    # load data tables (indexed by county codes)
+    cdf = rd.load_source("housing_cooking_fuel",
+                         housing_char,
+                         list_counties=list_counties,
+                         engine=engine,
+                         cache_dir=cache_dir).T
+    sdf = rd.load_source("housing_cooking_stoves",
+                         housing_char,
+                         list_counties=list_counties,
+                         engine=engine,
+                         cache_dir=cache_dir).T
     cdf.loc["BIO001",:] = cdf.loc["BIO00X",:]* (sdf.loc["Three stone stove/open fire",:]
                                                 /(sdf.loc["Three stone stove/open fire",:]
                                                   +sdf.loc["Improved Firewood Jiko",:]))
@@ -199,13 +430,11 @@ def cookstove_dataset(data,
                                                 /(sdf.loc["Ordinary Charcoal Jiko",:]
                                                   +sdf.loc["Improved Charcoal Jiko",:])) 
     # load urban/rural fraction
-    urdf = pd.read_excel(housing_dem,
-                        sheet_name="Table 3.5",
-                        skiprows=2,
-                        usecols="A:D"
-                        )
-    urdf.columns = ["Geography","Rural","Urban","Total"]
-    urdf = urdf.set_index("Geography")
+    urdf = rd.load_source("housing_urban_rural",
+                          housing_dem,
+                          list_counties=list_counties,
+                          engine=engine,
+                          cache_dir=cache_dir)
 
     cdf = pd.concat([cdf,urdf.T])
     
@@ -235,12 +464,7 @@ def cookstove_dataset(data,
 
     # clean up
     cdf = cdf.loc[[i for i in cdf.index if i.startswith("RK")]]
-    cdf = cdf.rename(columns={"Nairobi City":"Nairobi",
-                              "Homabay":"HomaBay",
-                              "Taita-Taveta":"TaitaTaveta"})
-    cdf.columns = cdf.columns.str.replace(" ","")       
-    cdf = cdf.rename(columns=counties.loc[:,["ID","NAME"]].set_index("NAME")["ID"].to_dict())
-    cdf = cdf.iloc[:,4:]
+    cdf = cdf.loc[:,cdf.columns.isin(counties["ID"])]
     cdf.index.names = ["TECHNOLOGY"]
     cdf.columns.names = ["REGION"]
 
@@ -253,433 +477,354 @@ def cookstove_dataset(data,
     cdf = cdf.stack()
     cdf = cdf.swaplevel()
     
+    #%% load shared input data
+    
+    # calculate county totals (demand)
+    df = pd.concat([data[k]["SpecifiedAnnualDemand"] for k in data.keys()
+                    if "SpecifiedAnnualDemand" in data[k].keys()])
+    # FIXME: integrate choosing scenarios once used
+    df = df.drop(["MODEL","SCENARIO","PARAMETER"],axis=1)
+    df = df.loc[df["COMMODITY"].str.startswith("DEMRK")]
+    ct = df.set_index(["REGION","COMMODITY"])
+    
+    # load datasets shaping prioritization
+    ela = rd.load_source("electricity_access",
+                         el_access,
+                         cache_dir=cache_dir)
+    ms = rd.load_source("market_segmentation",
+                        market_seg,
+                        cache_dir=cache_dir)
+    
     #%% load national data
     
-    scenarios = ["S1","S2","S3","S4","S5"]
+    # load activity data of cooking techs for all national scenarios
+    df = load_scenario_results(nat_scens,
+                               techs="RK1|RK2",
+                               cache_dir=cache_dir)
+    scenarios = list(df.index.get_level_values("SCENARIO").unique())
     
-    # iterate through scenarios, processing data for each and adding to model
-    # data
-    for i,s in enumerate(scenarios):
-        
-        # get string for national data
-        file = (nat_scens+"run"+str((i+1))
-                +"/TotalTechnologyAnnualActivity.csv")# str((i+1))
-        # load activity data for national scenario
-        df = pd.read_csv(file)
-        df = df.set_index(list(df.columns[:-1]))
-        
-        # filter for cooking techs
-        df = df.loc[df.index.get_level_values("t").str.contains("RK1|RK2")]
-        
-        # rearrange dataframe
-        df = df.unstack(fill_value=0).droplevel(level=0,axis=1)
-        df = df.droplevel(level=0)
-        df.index.names = ["TECHNOLOGY"]
-        
-        # split in urban and rural, calculate and save national totals
-        nru = df.loc[df.index.get_level_values("TECHNOLOGY").str.contains("RK2")]
-        nur = df.loc[df.index.get_level_values("TECHNOLOGY").str.contains("RK1")]
-        nru = to_frac(nru)
-        nur = to_frac(nur)
-        
-        # calculate and save county totals (demand)
-        df = None
-        for k in data.keys():
-            if "SpecifiedAnnualDemand" in data[k].keys():
-                if df is None:
-                    df = data[k]["SpecifiedAnnualDemand"]
-                else:
-                    df = pd.concat([df,data[k]["SpecifiedAnnualDemand"]])
-                    
-        # FIXME: integrate choosing scenarios once used
-        df = df.drop(["MODEL","SCENARIO","PARAMETER"],axis=1)
-        df = df.loc[df["COMMODITY"].str.startswith("DEMRK")]
-        ct = df.set_index(["REGION","COMMODITY"])
-                
+    # split in urban and rural, calculate national fractions per scenario
+    nru = df.loc[df.index.get_level_values("TECHNOLOGY").str.contains("RK2")]
+    nur = df.loc[df.index.get_level_values("TECHNOLOGY").str.contains("RK1")]
+    nru = nru.div(nru.groupby(level="SCENARIO").sum(),level="SCENARIO")
+    nur = nur.div(nur.groupby(level="SCENARIO").sum(),level="SCENARIO")
+    
+    #%% adjust pathways based on county baseline
+    
+    baseyears = [2019,2020,2021,2022,2023,2024]
+    if milestones is None:
+        milestones = [2030,2050]
+    years = [baseyears[-1]]+sorted(set(y for y in milestones
+                                       if y > baseyears[-1]))
+    if not set(years).issubset(df.columns):
+        raise ValueError("Milestone years of the cooking pathway need to be"
+                         " part of the national scenario data.")
+    
+    # rural and urban pathways for all scenarios
+    cru = _cooking_pathway(nru,
+                           ct.xs("DEMRK2",level="COMMODITY"),
+                           cdf,
+                           list(counties["ID"]),
+                           ela,
+                           (ms.loc[:,"Q4"]/(ms.loc[:,"Q3"]+ms.loc[:,"Q4"])).fillna(0),
+                           "RK2",
+                           baseyears,
+                           years)
+    cur = _cooking_pathway(nur,
+                           ct.xs("DEMRK1",level="COMMODITY"),
+                           cdf,
+                           list(counties["ID"]),
+                           ela,
+                           ms.loc[:,"Q2"]/(ms.loc[:,"Q1"]+ms.loc[:,"Q2"]),
+                           "RK1",
+                           baseyears,
+                           years)
+    
+    #%% update model parameter and save
     
-        # extend to county dataframe
-        cru = pd.concat([nru]*len(counties["ID"]),
-                        keys=list(counties["ID"]),
-                        names=["REGION"])
-        cur = pd.concat([nur]*len(counties["ID"]),
-                        keys=list(counties["ID"]),
-                        names=["REGION"])  
+    # get absolute numbers
+    crut = _to_county_abs(cru,ct.xs("DEMRK2",level="COMMODITY"))
+    curt = _to_county_abs(cur,ct.xs("DEMRK1",level="COMMODITY"))
+    
+    # concat rural and urban, rearrange dataframe (per scenario first rural,
+    # then urban)
+    ow = pd.concat([crut,curt],keys=[0,1],names=["SEGMENT"])
+    ow = ow.iloc[np.lexsort((np.arange(len(ow)),
+                             ow.index.get_level_values("SEGMENT"),
+                             ow.index.get_level_values("SCENARIO").map(
+                                 {s:i for i,s in enumerate(scenarios)})))]
+    ow = ow.droplevel("SEGMENT")
+    ow = pd.concat([ow],
+                   keys=[("#ALL","TotalTechnologyAnnualActivityLowerLimit")],
+                   names=["MODEL","PARAMETER"])
+    ow = ow.reorder_levels(["MODEL","SCENARIO","PARAMETER",
+                            "REGION","TECHNOLOGY"])
+    
+    # add activity limits
+    for k in data.keys():
         
-        # calculate absolut numbers
-        crut = cru*ct.xs("DEMRK2",level="COMMODITY")
-        curt = cur*ct.xs("DEMRK1",level="COMMODITY")
+        if "TotalTechnologyAnnualActivityLo" in data[k].keys():
+            df = data[k]["TotalTechnologyAnnualActivityLo"]
+            ind = ["MODEL",
+                   "SCENARIO",
+                   "PARAMETER",
+                   "REGION",
+                   "TECHNOLOGY"]
+            df = df.set_index(ind)
+            
+            
+            # FIXME: if structure of spreadsheet is changed (e.g., not all
+            # county technologies together in one sheet), this might not
+            # work
+            cow = ow.loc[ow.index.get_level_values("REGION").isin(
+                            df.index.get_level_values("REGION"))]            
+            
+            df = pd.concat([df,cow])
+            
+            # overwrite data
+            data[k]["TotalTechnologyAnnualActivityLo"] = df.reset_index()
+            
+            # remove upper limit
+            if "TotalTechnologyAnnualActivityUp" in data[k].keys():
+                dfu = data[k]["TotalTechnologyAnnualActivityUp"].set_index(ind)
+                # FIXME: just delete all cooking tech from limit?
+                fil = dfu.index.get_level_values("TECHNOLOGY").isin(ow.index.get_level_values("TECHNOLOGY"))
+                dfu = dfu.loc[~fil,:]
+                
+                # overwrite data
+                data[k]["TotalTechnologyAnnualActivityUp"] = dfu.reset_index()
+                
+    return data
+
+
+def _to_county_abs(df, dem):
+    """ Scale county fractions (indexed by scenario, region and technology)
+    with the county demand of the corresponding segment.
+    """
+    dem = dem.reindex(index=df.index.get_level_values("REGION"),
+                      columns=df.columns)
+    return df*dem.to_numpy()
+
 
+def _cooking_pathway(nat, dem, base, regions, ela, q, prefix, baseyears,
+                     years):
+    """ Allocate national cooking technology pathways of one segment to
+    counties, for all national scenarios in one pass.
     
-    #%% integrate county baseline data
+    Starting from the county baseline, the national change in each milestone
+    year is distributed across counties: technologies phased down nationally
+    are reduced proportionally to their county use, the freed demand is
+    reallocated to the remaining technologies based on electricity access,
+    market segmentation and current biomass/charcoal use, and a correction
+    step ensures the national technology totals are met.
     
-        # apply to dataset
-        baseyears = [2019,2020,2021,2022,2023,2024]
-        for by in baseyears:
-            cru.loc[:,by] = cdf
-            cur.loc[:,by] = cdf
-        cru = cru.fillna(0)
-        cur = cur.fillna(0)
 
+    Parameters
+    ----------
+    nat : DataFrame
+        National technology fractions indexed by SCENARIO and TECHNOLOGY.
+    dem : DataFrame
+        County demand of the segment indexed by REGION.
+    base : Series
+        County baseline fractions indexed by REGION and TECHNOLOGY.
+    regions : list
+        Counties to which the national pathways are allocated.
+    ela : DataFrame
+        Electricity access indexed by REGION with years as columns, linearly
+        interpolated for the milestone years (constant beyond the first and
+        last year).
+    q : Series
+        Market segment fraction able to afford clean cooking, indexed by
+        REGION.
+    prefix : str
+        Technology prefix of the segment, e.g., 'RK1'.
+    baseyears : list
+        Years set to the county baseline.
+    years : list
+        Sorted milestone years for which the allocation is calculated,
+        starting with the last base year. Years in between are linearly
+        interpolated.
+
+    Returns
+    -------
+    DataFrame
+        County technology fractions indexed by SCENARIO, REGION and
+        TECHNOLOGY.
 
-    #%% adjust pathway based on county baseline
+    """
     
-        years = [2024,2030,2050]
-        
-        for ii in range(1,len(years)):
-            
-            ### rural calc
-            
-            # calc national totals per tech
-            nrutt = to_abs(nru,ct.xs("DEMRK2",level="COMMODITY").sum())
-            # overwrite with previous fractions
-            cru.loc[:,years[ii]] = cru.loc[:,years[ii-1]] 
-            
-            # get rural county totals per tech
-            crut = cru*ct.xs("DEMRK2",level="COMMODITY")
-            
-            # get national change with regard to baseyear
-            diff = nrutt- crut.groupby("TECHNOLOGY").sum()
-            
-            # get techs that are phased down
-            po_tech = diff.loc[diff[years[ii]]<0].index.to_list()
-            
+    # dense scenario x county x technology x year arrays, technologies not
+    # part of a scenario are kept as NaN throughout
+    scenarios = nat.index.get_level_values("SCENARIO").unique()
+    techs = nat.index.get_level_values("TECHNOLOGY").unique().sort_values()
+    ns, nr, nt = len(scenarios), len(regions), len(techs)
+    full = nat.reindex(pd.MultiIndex.from_product([scenarios,techs]))
+    present = full.index.isin(nat.index).reshape(ns,nt)
+    share = full.to_numpy(dtype=float).reshape(ns,nt,-1)
+    
+    dem = dem.reindex(index=regions,columns=nat.columns).to_numpy(dtype=float)
+    
+    # extend to counties and integrate county baseline data
+    cr = np.repeat(share[:,None],nr,axis=1)
+    bv = base.reindex(pd.MultiIndex.from_product([regions,techs])).to_numpy()
+    iby = nat.columns.get_indexer(baseyears)
+    cr[...,iby] = bv.reshape(1,nr,nt,1)
+    cr = np.where(present[:,None,:,None],np.nan_to_num(cr),np.nan)
+    
+    # technology categories shaping the prioritization of additions
+    cat = np.zeros(nt,dtype=int)
+    for i, s in enumerate(["ELC","BIO005","CHC005"]):
+        cat[techs.str.contains(s)] = i+1
+    
+    # electricity access in milestone years
+    ey = sorted(set(ela.columns).union(years[1:]))
+    ela = _fill_linear(ela.reindex(index=regions,columns=ey).to_numpy(dtype=float),
+                       np.asarray(ey,dtype=float))
+    ela = ela[:,[ey.index(y) for y in years[1:]]]
+    
+    iy = nat.columns.get_indexer(years)
+    _allocate_pathway(cr,
+                      share*np.nansum(dem,axis=0),
+                      dem,
+                      ela,
+                      q.reindex(regions).to_numpy(dtype=float),
+                      cat,
+                      np.asarray(techs.str.contains("ELC|LPG|BGS")),
+                      techs.get_loc(prefix+"BIO001"),
+                      techs.get_loc(prefix+"CHC001"),
+                      iy,
+                      iby[0])
+    
+    # replace years between milestones through interpolation
+    cr[...,np.setdiff1d(np.arange(iy[0],iy[-1]+1),iy)] = np.nan
+    cr = _fill_linear(cr,nat.columns.to_numpy(dtype=float))
+    
+    cr = pd.DataFrame(cr.reshape(-1,cr.shape[-1]),
+                      index=pd.MultiIndex.from_product([scenarios,regions,techs],
+                                                       names=["SCENARIO","REGION","TECHNOLOGY"]),
+                      columns=nat.columns)
+    cr = cr.loc[np.broadcast_to(present[:,None],(ns,nr,nt)).ravel()]
+    
+    return cr
 
-            # calc fraction of tech use in county with respect to total 
-            # national use of tech (for techs being phased out)
-            dedf = crut.loc[crut.index.get_level_values("TECHNOLOGY").isin(po_tech)]/crut.loc[crut.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("TECHNOLOGY").sum()
-            
-            
-            fr1 = crut.loc[crut.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("REGION").sum()/crut.loc[crut.index.get_level_values("TECHNOLOGY").isin(po_tech)].sum()
-           
-            # get dataframe with difference copied across counties
-            diffc = pd.concat([diff]*len(fr1),
-                              names=["REGION"],
-                              keys= fr1.index)
-            # calculate fraction of additions (equals substractions per county)
-            ded = dedf*diffc.loc[diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)]
-            addf = ded.groupby("REGION").sum()/ded.sum()
-            add = addf*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)]
-            
-            ### adjusting addition to match local circumstances
-            # load datasets shaping prioritization
-            ela = pd.read_csv(el_access,
-                              usecols=[2,4,5,6,7],
-                              index_col=[0],
-                              keep_default_na=False
-                              )
-            ela.index.names = ["REGION"]
-            ela.columns = ela.columns.astype(int)
-            
-            ms = pd.read_csv(market_seg,
-                              usecols=[3,4,5,6,7,8],
-                              index_col=[0],
-                              keep_default_na=False
-                              )
-            ms.loc[:,years[ii]] = (ms.loc[:,"Q4"]/(ms.loc[:,"Q3"]+ms.loc[:,"Q4"])).fillna(0)
-            cf = cru.loc[cru.index.get_level_values("TECHNOLOGY").str.contains("ELC|LPG|BGS")].groupby("REGION").sum()
-            
-            ms.loc[:,years[ii]] = cf.loc[:,2019]+(1-cf.loc[:,2019])*ms.loc[:,years[ii]]
-            ms.index.names = ["REGION"]
-            ela = ela.mul(ms.loc[:,years[ii]],axis=0)
-            ela = ela/ela.sum()
-            
-            prio = diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech),years[ii]]
-            prio = prio.reset_index()
-            
-            prio = prio.merge(right= ela[years[ii]],
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_ELC")
-                                     )
-            #bio = (crut.xs("RK2BIO001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            bio = (cru.xs("RK2BIO001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            bio = bio/bio.sum()
-                   
-            bio.name = str(years[ii])
-            prio = prio.merge(right=bio ,
-                              on="REGION",
-                              how="left",
-                              suffixes=("","_BIO005")
-                              )
-            #chc = (crut.xs("RK2CHC001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            chc = (cru.xs("RK2CHC001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            chc = chc/chc.sum()
-            chc.name = str(years[ii])
-            prio = prio.merge(right= chc,
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_CHC005")
-                                     )
-            oth = ms.loc[:,years[ii]]
-            oth = oth/oth.sum()
-            oth.name = str(years[ii])
-            prio = prio.merge(right= oth,
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_OTH")
-                                     )
-            prio = prio.set_index(["REGION","TECHNOLOGY"])
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("ELC"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("ELC"),str(years[ii])+"_ELC"]
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("BIO005"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("BIO005"),str(years[ii])+"_BIO005"]
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005"),str(years[ii])+"_CHC005"]
-            prio.loc[~prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005|BIO005|ELC"),str(years[ii])] = prio.loc[~prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005|BIO005|ELC"),str(years[ii])+"_OTH"]
-            
-            prio = prio.loc[:,str(years[ii])]
-                                  
-            prio = prio/prio.groupby("TECHNOLOGY").sum()
-            
 
-            # calculate allocation based on per county percentage and totals
-            prio = prio*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech),years[ii]]
-            # calculate county fractions
-            prio = prio/prio.groupby("REGION").sum()
-            prio.name= years[ii]
-            
-            add_target = prio.to_frame()*addf*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("REGION").sum()
-            # add_target.groupby("TECHNOLOGY").sum()
+def _fill_linear(v, x):
+    """ Fill NaN values along the last axis of v by linear interpolation
+    between the valid values at the years x, keeping the last valid value
+    thereafter (as DataFrame.interpolate(axis=1) for consecutive years).
+    """
+    n = v.shape[-1]
+    pos = np.arange(n)
+    valid = ~np.isnan(v)
+    lo = np.maximum.accumulate(np.where(valid,pos,-1),axis=-1)
+    hi = np.minimum.accumulate(np.where(valid,pos,n)[...,::-1],axis=-1)[...,::-1]
+    fill = ~valid & (lo >= 0)
+    lo = np.maximum(lo,0)
+    hi = np.where(hi == n,lo,hi)
+    vlo = np.take_along_axis(v,lo,axis=-1)
+    vhi = np.take_along_axis(v,hi,axis=-1)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        vi = np.where(hi == lo,vlo,(vhi-vlo)/(x[hi]-x[lo])*(x-x[lo])+vlo)
+    return np.where(fill,vi,v)
+
+
+def _allocate_pathway(cr, nt, dem, ela, q, cat, clean, ibio, ichc, iy, i0):
+    """ Allocation kernel for the cooking transition pathway of one segment.
+    
+    Updates the county technology fractions in place for each milestone year
+    (see _cooking_pathway). Sums skip NaN values, i.e., technologies not
+    part of a scenario.
+    
 
-            # calculate difference to national change that needs to be matched
-            diff_adj = add.groupby("TECHNOLOGY").sum()-add_target.groupby("TECHNOLOGY").sum()
-            
-            # get techs that are phased down
-            po_tech_adj = diff_adj.loc[diff_adj[years[ii]]<0].index.to_list()
-            
-            if len(po_tech_adj) > 0:
-                dedf = add_target.loc[add_target.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]/add_target.loc[add_target.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)].groupby("TECHNOLOGY").sum()
-                
-                # get dataframe with difference copied across counties
-                diffc_adj = pd.concat([diff_adj]*len(fr1),
-                                      names=["REGION"],
-                                      keys= fr1.index)
-                
-                # calculate fraction of additions (equals substractions per county)
-                ded_adj = dedf*diffc_adj.loc[diffc_adj.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]
-                addf = ded_adj.groupby("REGION").sum()/ded_adj.sum()
-                
-                add_adj = addf*diffc_adj.loc[~diffc_adj.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]
-                
-                # adjust additions based on calculated prio while ensuring
-                # county totals and national tech fractions are followed
-                add = (add_target+pd.concat([add_adj,ded_adj])).clip(0)
-            else:
-                add = add_target
+    Parameters
+    ----------
+    cr : ndarray
+        County technology fractions (scenario x county x technology x year).
+    nt : ndarray
+        National technology totals (scenario x technology x year).
+    dem : ndarray
+        County demand (county x year).
+    ela : ndarray
+        Electricity access in the milestone years (county x milestone).
+    q : ndarray
+        Market segment fraction able to afford clean cooking (county).
+    cat : ndarray
+        Prioritization category per technology (0: other, 1: electric,
+        2: improved biomass, 3: improved charcoal).
+    clean : ndarray
+        Mask of technologies counted as clean cooking in the baseline.
+    ibio : int
+        Technology index of traditional biomass stoves.
+    ichc : int
+        Technology index of traditional charcoal stoves.
+    iy : list
+        Year indices of the milestones, starting with the last base year.
+    i0 : int
+        Year index of the baseline used for the market segmentation.
 
-            # add/substract and overwrite with actual dataframe
-            crut_ = (crut+pd.concat([add,ded])).clip(0)
-            cru_ = crut_/crut_.groupby("REGION").sum()
-            cru.loc[:,years[ii]] = cru_.loc[:,years[ii]]
-            
-            ### urban calc
-            
-            # calc national totals per tech
-            nurtt = to_abs(nur,ct.xs("DEMRK1",level="COMMODITY").sum())
-            # overwrite with previous fractions
-            cur.loc[:,years[ii]] = cur.loc[:,years[ii-1]] 
-            
-            # get urban county totals per tech
-            curt = cur*ct.xs("DEMRK1",level="COMMODITY")
-            
-            # get national change with regard to baseyear
-            diff = nurtt- curt.groupby("TECHNOLOGY").sum()
+    Returns
+    -------
+    None.
+
+    """
+    
+    with np.errstate(divide="ignore",invalid="ignore"):
+        for k in range(1,len(iy)):
+            prev, y = iy[k-1], iy[k]
             
-            # get techs that are phased down
-            po_tech = diff.loc[diff[years[ii]]<0].index.to_list()
+            # overwrite with previous fractions, get county totals per tech
+            c = cr[...,prev]
+            crt = c*dem[None,:,None,y]
             
-
-            # calc fraction of tech use in county with respect to total 
-            # national use of tech (for techs being phased out)
-            dedf = curt.loc[curt.index.get_level_values("TECHNOLOGY").isin(po_tech)]/curt.loc[curt.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("TECHNOLOGY").sum()
+            # get national change, techs that are phased down
+            diff = nt[...,y]-np.nansum(crt,axis=1)
+            po = (diff<0)[:,None,:]
+            dc = np.broadcast_to(diff[:,None,:],crt.shape)
             
-            fr1 = curt.loc[curt.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("REGION").sum()/curt.loc[curt.index.get_level_values("TECHNOLOGY").isin(po_tech)].sum()
-           
-            # get dataframe with difference copied across counties
-            diffc = pd.concat([diff]*len(fr1),
-                              names=["REGION"],
-                              keys= fr1.index)
+            # deduct proportionally to county use of phased down techs and
             # calculate fraction of additions (equals substractions per county)
-            ded = dedf*diffc.loc[diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)]
-            addf = ded.groupby("REGION").sum()/ded.sum()
-            
-            add = addf*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)]
+            ded = np.where(po,crt,np.nan)
+            ded = ded/np.nansum(ded,axis=1,keepdims=True)*dc
+            addf = np.nansum(ded,axis=2)/np.nansum(ded,axis=(1,2))[:,None]
+            add = np.where(po,np.nan,addf[...,None]*dc)
             
             ### adjusting addition to match local circumstances
+            cf = np.nansum(np.where(clean,cr[...,i0],0),axis=2)
+            msy = cf+(1-cf)*q
+            prio = np.stack([msy,
+                             msy*ela[:,k-1],
+                             c[...,ibio]*(1-msy),
+                             c[...,ichc]*(1-msy)])
+            prio = prio/np.nansum(prio,axis=2,keepdims=True)
+            prio = np.where(po,np.nan,np.moveaxis(prio[cat],0,-1))
+            prio = prio/np.nansum(prio,axis=1,keepdims=True)
             
-            # load datasets shaping prioritization
-            ela = pd.read_csv(el_access,
-                              usecols=[2,4,5,6,7],
-                              index_col=[0],
-                              keep_default_na=False
-                              )
-            ela.index.names = ["REGION"]
-            ela.columns = ela.columns.astype(int)
-            
-            ms = pd.read_csv(market_seg,
-                              usecols=[3,4,5,6,7,8],
-                              index_col=[0],
-                              keep_default_na=False
-                              )
-            ms.loc[:,years[ii]] = ms.loc[:,"Q2"]/(ms.loc[:,"Q1"]+ms.loc[:,"Q2"])
-            cf = cur.loc[cur.index.get_level_values("TECHNOLOGY").str.contains("ELC|LPG|BGS")].groupby("REGION").sum()
-            
-            ms.loc[:,years[ii]] = cf.loc[:,2019]+(1-cf.loc[:,2019])*ms.loc[:,years[ii]]
-            ms.index.names = ["REGION"]
-            ela = ela.mul(ms.loc[:,years[ii]],axis=0)
-            ela = ela/ela.sum()
-            
-            prio = diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech),years[ii]]
-            prio = prio.reset_index()
-            
-            
-            prio = prio.merge(right= ela[years[ii]],
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_ELC")
-                                     )
-            #bio = (curt.xs("RK1BIO001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            bio = (cur.xs("RK1BIO001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            bio = bio/bio.sum()
-            bio.name = str(years[ii])
-            prio = prio.merge(right=bio ,
-                              on="REGION",
-                              how="left",
-                              suffixes=("","_BIO005")
-                              )
-            #chc = (curt.xs("RK1CHC001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            chc = (cur.xs("RK1CHC001",level="TECHNOLOGY")[years[ii-1]]*(1- ms.loc[:,years[ii]]))
-            chc = chc/chc.sum()
-            chc.name = str(years[ii])
-            prio = prio.merge(right= chc,
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_CHC005")
-                                     )
-            oth = ms.loc[:,years[ii]]
-            oth = oth/oth.sum()
-            oth.name = str(years[ii])
-            prio = prio.merge(right= oth,
-                                     on="REGION",
-                                     how="left",
-                                     suffixes=("","_OTH")
-                                     )
-            prio = prio.set_index(["REGION","TECHNOLOGY"])
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("ELC"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("ELC"),str(years[ii])+"_ELC"]
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("BIO005"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("BIO005"),str(years[ii])+"_BIO005"]
-            prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005"),str(years[ii])] = prio.loc[prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005"),str(years[ii])+"_CHC005"]
-            prio.loc[~prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005|BIO005|ELC"),str(years[ii])] = prio.loc[~prio.index.get_level_values("TECHNOLOGY").str.contains("CHC005|BIO005|ELC"),str(years[ii])+"_OTH"]
-            
-            prio = prio.loc[:,str(years[ii])]
-                                  
-            prio = prio/prio.groupby("TECHNOLOGY").sum()
-
             # calculate allocation based on per county percentage and totals
-            prio = prio*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech),years[ii]]
+            prio = prio*dc
             # calculate county fractions
-            prio = prio/prio.groupby("REGION").sum()
-            prio.name= years[ii]
-            
-
-            add_target = prio.to_frame()*addf*diffc.loc[~diffc.index.get_level_values("TECHNOLOGY").isin(po_tech)].groupby("REGION").sum()
-            # add_target.groupby("TECHNOLOGY").sum()
-            
-            # calculate difference to national change that needs to be matched
-            diff_adj = add.groupby("TECHNOLOGY").sum()-add_target.groupby("TECHNOLOGY").sum()
-            
-            # get techs that are phased down
-            po_tech_adj = diff_adj.loc[diff_adj[years[ii]]<0].index.to_list()
-            
-            if len(po_tech_adj) > 0:
-                dedf = add_target.loc[add_target.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]/add_target.loc[add_target.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)].groupby("TECHNOLOGY").sum()
-                
-                # get dataframe with difference copied across counties
-                diffc_adj = pd.concat([diff_adj]*len(fr1),
-                                      names=["REGION"],
-                                      keys= fr1.index)
-                
-                # calculate fraction of additions (equals substractions per county)
-                ded_adj = dedf*diffc_adj.loc[diffc_adj.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]
-                addf = ded_adj.groupby("REGION").sum()/ded_adj.sum()
-                
-                add_adj = addf*diffc_adj.loc[~diffc_adj.index.get_level_values("TECHNOLOGY").isin(po_tech_adj)]
-                
-                # adjust additions based on calculated prio while ensuring
-                # county totals and national tech fractions are followed
-                add = (add_target+pd.concat([add_adj,ded_adj])).clip(0)
-            else:
-                add = add_target
-            
-            # add/substract and overwrite with actual dataframe
-            curt_ = (curt+pd.concat([add,ded])).clip(0)
-            cur_ = curt_/curt_.groupby("REGION").sum()
-            cur.loc[:,years[ii]] = cur_.loc[:,years[ii]]
-            
-        # calculate totals  
-        crut = cru*ct.xs("DEMRK2",level="COMMODITY")
-        curt = cur*ct.xs("DEMRK1",level="COMMODITY")
-    
-    #%% replace selected years through interpolation
-    
-        iy = list(range(2025,2030))
-        
-        cru.loc[:,iy] = np.nan
-        cru = cru.interpolate(axis=1)
-        
-        cur.loc[:,iy] = np.nan
-        cur = cur.interpolate(axis=1)
-        
-        iy = list(range(2031,2050))
-        
-        cru.loc[:,iy] = np.nan
-        cru = cru.interpolate(axis=1)
-        
-        cur.loc[:,iy] = np.nan
-        cur = cur.interpolate(axis=1)
-
-
-    #%% update model parameter and save
-    
-        # get absolute numbers
-        crut = cru*ct.xs("DEMRK2",level="COMMODITY")
-        curt = cur*ct.xs("DEMRK1",level="COMMODITY")
-        
-        # concat rural and urban, rearrange dataframe
-        ow = pd.concat([crut,curt],
-                       keys=[("#ALL",s,
-                        "TotalTechnologyAnnualActivityLowerLimit")]
-                        *(len(crut)+len(curt)),
-                        names=["MODEL","SCENARIO","PARAMETER"])
-    
-        # add activity limits
-        for k in data.keys():
-            
-            if "TotalTechnologyAnnualActivityLo" in data[k].keys():
-                df = data[k]["TotalTechnologyAnnualActivityLo"]
-                ind = ["MODEL",
-                       "SCENARIO",
-                       "PARAMETER",
-                       "REGION",
-                       "TECHNOLOGY"]
-                df = df.set_index(ind)
-                
-                
-                # FIXME: if structure of spreadsheet is changed (e.g., not all
-                # county technologies together in one sheet), this might not
-                # work
-                cow = ow.loc[ow.index.get_level_values("REGION").isin(
-                                df.index.get_level_values("REGION"))]            
-                
-                df = pd.concat([df,cow])
-                
-                # overwrite data
-                data[k]["TotalTechnologyAnnualActivityLo"] = df.reset_index()
-                
-                # remove upper limit
-                if "TotalTechnologyAnnualActivityUp" in data[k].keys():
-                    dfu = data[k]["TotalTechnologyAnnualActivityUp"].set_index(ind)
-                    # FIXME: just delete all cooking tech from limit?
-                    fil = dfu.index.get_level_values("TECHNOLOGY").isin(crut.index.get_level_values("TECHNOLOGY").append(curt.index.get_level_values("TECHNOLOGY")))
-                    dfu = dfu.loc[~fil,:]
-                    
-                    # overwrite data
-                    data[k]["TotalTechnologyAnnualActivityUp"] = dfu.reset_index()
-                
-    return data
+            prio = prio/np.nansum(prio,axis=2,keepdims=True)
+            
+            add_target = prio*addf[...,None]*np.nansum(np.where(po,np.nan,dc),
+                                                       axis=2,keepdims=True)
+            
+            # calculate difference to national change that needs to be
+            # matched, get techs that are phased down
+            diff_adj = np.nansum(add,axis=1)-np.nansum(add_target,axis=1)
+            po_adj = (diff_adj<0)[:,None,:]
+            da = np.broadcast_to(diff_adj[:,None,:],crt.shape)
+            
+            ded_adj = np.where(po_adj,add_target,np.nan)
+            ded_adj = ded_adj/np.nansum(ded_adj,axis=1,keepdims=True)*da
+            addf_adj = np.nansum(ded_adj,axis=2)/np.nansum(ded_adj,axis=(1,2))[:,None]
+            add_adj = np.where(po_adj,ded_adj,addf_adj[...,None]*da)
+            
+            # adjust additions based on calculated prio while ensuring
+            # county totals and national tech fractions are followed
+            # (only for scenarios with techs to be adjusted)
+            add = np.where(po_adj.any(axis=2,keepdims=True),
+                           np.clip(add_target+add_adj,0,None),
+                           add_target)
+            
+            # add/substract and overwrite with county fractions
+            crt_ = np.clip(crt+np.where(po,ded,add),0,None)
+            cr[...,y] = crt_/np.nansum(crt_,axis=2,keepdims=True)
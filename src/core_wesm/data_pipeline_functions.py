@@ -5,20 +5,29 @@ Functions for creating the input data set of CORE-WESM
 """
 
 import os
+import re
 import sys
 import shutil
 import logging
+import hashlib
+import json
 
 import pandas as pd
-import yaml
+import numpy as np
 
 import otoole
 
 import county_functions as cf
+import ospro as op
+import raw_data as rd
 
 
 logger = logging.getLogger(__name__)
 
+# version of downscaling, to be increased if the downscaled data change,
+# e.g., to rebuild models that are updated incrementally
+_DOWNSCALE_VERSION = 1
+
 
 #%% Set up logger
 
@@ -116,13 +125,23 @@ def downscale(input_file,
               county_sectors,
               remove_fte_tech_mode,
               output_path,
-              overwrite=False):
+              overwrite=False,
+              engine=None,
+              output_format="xlsx",
+              n_workers=1,
+              writer_engine=None,
+              incremental=False,
+              gdp_method="mean",
+              cache_dir=None,
+              registry=None):
     """ Downscale the national model dataset to a county dataset
 
     Parameters
     ----------
     input_file : str
-        File path to the national model spreadsheet file.
+        File path to the national model datafile (otoole list format only,
+        see ospro.read_datafile) or spreadsheet file (as converted by
+        convert_datafile).
     dataconfig_file : str
         File path to the data config file as required by the otoole package.
     tech_sector_mapping : str
@@ -133,52 +152,157 @@ def downscale(input_file,
         File path to a csv file with a list of counties with names and codes.
     pop_file : str
         File path to a csv file with population data.
-    gdp_file : str
-        File path to a csv file with gross county product data.
+    gdp_file : str or list
+        File path to a csv file with gross county product data, or list of
+        file paths for several years (vintages), e.g., 'GCP_2020.csv'.
     county_sectors : list
         List of sectors to be disaggregated to the county-level.
     remove_fte_tech_mode : bool
         If to remove FTE technologies used to track fuel use and emissions 
         in sectors.
-    output_path : str
-        Path to the directory to be used to save the downscaled model.
+    output_path : str or None
+        Path to the directory to be used to save the downscaled model. If
+        None, the model is not saved but only returned (and cannot be
+        updated incrementally).
     overwrite : bool
         If to overwrite model if output_path is a non-empty, existing
         directory.
+    engine : str, optional
+        Engine used to read spreadsheet files (see ospro.read_workbook).
+        The default is None.
+    output_format : str, optional
+        Format of the downscaled model, i.e., 'xlsx' for a spreadsheet file
+        or 'parquet' for a directory with a parquet file for each sheet per
+        county and the national model (see county_functions.save_model).
+        The default is 'xlsx'.
+    n_workers : int, optional
+        Number of worker processes used to save the downscaled model in
+        parallel. The default is 1.
+    writer_engine : str, optional
+        Engine used to write spreadsheet files (see ospro.write_workbook).
+        The default is None.
+    incremental : bool, optional
+        If to update an existing downscaled model incrementally. Inputs are
+        fingerprinted (saved in a manifest file in output_path) and the
+        model is kept if they are unchanged. For parquet files, only
+        parameters whose inputs changed, e.g., national data, the sector
+        mapping of their rows, or downscaling factors of their sectors, are
+        downscaled and saved again. For spreadsheet files, all parameters
+        are downscaled again and only files with changed data are saved
+        (with all their sheets). The state of the saved files is recorded
+        as well, and files (or sheets) that are missing or changed since,
+        e.g., deleted or edited, are saved again. Changes of the data
+        config, the list of counties, or remove_fte_tech_mode require a
+        complete rebuild, as does the first incremental update. If False,
+        nothing is fingerprinted and a manifest of an earlier incremental
+        update is removed. The default is False.
+    gdp_method : str, optional
+        Method to combine gross county product data of several years, i.e.,
+        'mean' to average the shares of counties or 'interpolate' to
+        interpolate shares linearly between the years of the files (see
+        FactorRegistry.from_files). The default is 'mean'.
+    cache_dir : str, optional
+        Path to directory used to cache the raw population and GCP data
+        tables (see raw_data.load_source). The default is None.
+    registry : FactorRegistry, optional
+        Registry of downscaling factors by sector, e.g., to register factors
+        of further sectors. If None, the population and GCP based factors
+        are used (see FactorRegistry.from_files), in which case pop_file,
+        pop_file_ruur, and gdp_file are required. The default is None.
         
     Raises
     ------
     FileExistsError
         Raised if config or datafile do not exist.
     ValueError
-        Raised if there is a mismatch between data and config file.
+        Raised if there is a mismatch between data and config file, the
+        output format is not implemented, or the regions of the registry
+        do not match the list of counties.
 
     Returns
     -------
-    None.
+    dict or None
+        Downscaled model data, i.e., a dictionary of DataFrames for each
+        sheet (as loaded by county_functions.load_model) for each model.
+        None if the data are not completely downscaled, i.e., if an existing
+        model is kept, is up to date, or is only updated incrementally for
+        parquet files.
 
     """
     # check if model already exists
-    if os.path.exists(output_path) and len(os.listdir(output_path)) != 0:
-        if not overwrite:
+    if (output_path is not None and os.path.exists(output_path)
+        and len(os.listdir(output_path)) != 0):
+        if not overwrite and not incremental:
             logger.info("Downscaled model already exists and will not be"
                            " overwritten. Set 'overwrite' to True to"
                            " overwrite existing models.")
             return
         
+    if output_format not in ["xlsx","parquet"]:
+        raise ValueError(f"Output format '{output_format}' is not"
+                         " implemented.")
+        
     # check if files exists
     if not os.path.isfile(input_file):
-        raise FileExistsError("Input spreadsheet file does not exist.")
+        raise FileExistsError("Input file does not exist.")
     if not os.path.isfile(dataconfig_file):
         raise FileExistsError("Data config file does not exist.")
         
     # create the output directory if it does not exist
-    if not os.path.exists(output_path):
+    if output_path is not None and not os.path.exists(output_path):
         os.makedirs(output_path)
     
+    # fingerprint inputs and options if updated incrementally, skip if
+    # model is up to date
+    track = incremental and output_path is not None
+    state = dict()
+    manifest = None
+    if track:
+        state = {"version":_DOWNSCALE_VERSION,
+                 "inputs":{k:_get_file_fingerprint(f) for k,f in
+                           [("input_file",input_file),
+                            ("dataconfig_file",dataconfig_file),
+                            ("tech_sector_mapping",tech_sector_mapping),
+                            ("comm_sector_mapping",comm_sector_mapping),
+                            ("list_counties",list_counties),
+                            ("pop_file",pop_file),
+                            ("pop_file_ruur",pop_file_ruur),
+                            ("gdp_file",gdp_file)]},
+                 "county_sectors":list(county_sectors),
+                 "remove_fte_tech_mode":remove_fte_tech_mode,
+                 "output_format":output_format,
+                 "gdp_method":gdp_method}
+        manifest = _load_manifest(output_path)
+    damaged = dict()
+    if manifest is not None and manifest["output_format"] == output_format:
+        # saved models that are missing or changed since saved, e.g.,
+        # deleted or edited, are saved again
+        damaged = _get_damaged_outputs(output_path, manifest["files"],
+                                       output_format)
+    if manifest is not None:
+        if damaged:
+            logger.info("Saving missing or changed models again: "
+                        +", ".join(damaged.keys())+".")
+        if (not damaged
+            and all(manifest.get(k) == v for k,v in state.items())):
+            logger.info("Downscaled model is up to date.")
+            return
+        changed = [k for k,v in state["inputs"].items()
+                   if manifest["inputs"].get(k) != v]
+        if changed:
+            logger.info("Updating downscaled model, changed inputs: "
+                        +", ".join(changed)+".")
+        # inputs and options that affect all data require a rebuild
+        if (any(manifest.get(k) != state[k] for k in ["version",
+                                                      "remove_fte_tech_mode",
+                                                      "output_format"])
+            or "dataconfig_file" in changed or "list_counties" in changed):
+            manifest = None
+    
     
     # load technology to sector mapping
-    tech_to_sector_data = pd.read_excel(tech_sector_mapping)
+    tech_to_sector_data = op.read_workbook(tech_sector_mapping, engine=engine,
+                                           sheet_name=0)
     tech_to_sector_dict = dict(zip(tech_to_sector_data['technology'], tech_to_sector_data['sector']))
     sector_to_tech_dict = dict()
     for sector,tech in zip(tech_to_sector_data["sector"],
@@ -187,7 +311,8 @@ def downscale(input_file,
     sectors_list = list(tech_to_sector_data["sector"].unique())
     
     # load demand commodities to sector mapping
-    com_to_sector_data = pd.read_excel(comm_sector_mapping)
+    com_to_sector_data = op.read_workbook(comm_sector_mapping, engine=engine,
+                                          sheet_name=0)
     com_to_sector_dict = dict(zip(com_to_sector_data['commodity'], com_to_sector_data['sector']))
     sector_to_com_dict = dict()
     for sector,com in zip(com_to_sector_data["sector"],
@@ -200,65 +325,63 @@ def downscale(input_file,
     list_counties = counties["ID"].tolist()
     
     # load data config
-    with open(dataconfig_file) as s:    
-        try:
-            dcfg = yaml.safe_load(s)
-        except yaml.YAMLError as exc:
-            logger.error(exc)  
-    
+    dcfg = op.DataConfig.from_file(dataconfig_file)
     
-    # load the spreadsheet file into pandas DataFrames
-    model_data = pd.read_excel(input_file,
-                               sheet_name=None,
-                               engine="openpyxl",
-                               #engine="xlrd"
-                               )
     
-    # get a list of all sheet names
-    sheets_list = list(model_data.keys())
+    # load the national model, parsing datafiles directly, i.e., with
+    # defaults removed while parsing, or loading the spreadsheet file
+    if os.path.splitext(input_file)[1].lower() not in [".xlsx",".xls",
+                                                        ".ods"]:
+        model_data = op.read_datafile(input_file, dcfg)
+    else:
+        # load the spreadsheet file into pandas DataFrames
+        model_data = op.read_workbook(input_file,
+                                      sheet_name=None,
+                                      engine=engine,
+                                      #engine="xlrd"
+                                      )
     
+        # get a list of all sheet names
+        sheets_list = list(model_data.keys())
     
-    # FIXME: use narrow table format (and then removing defaults – 
-    # keep long format otherwise currently an issue with ospro)?
     
-    # rearrange and clean sheets (remove defaults, set index)
-    sheet_cap = {s:False for s in sheets_list}
-    for param in dcfg.keys():
-        # skip result variables
-        if dcfg[param]["type"] == "result":
-            continue
+        # FIXME: use narrow table format (and then removing defaults – 
+        # keep long format otherwise currently an issue with ospro)?
     
-        if param in sheets_list:
-            sheet_cap[param] = True
-        elif "short_name" in dcfg[param].keys() and dcfg[param]["short_name"] in sheets_list:
-            model_data[param] = model_data.pop(dcfg[param]["short_name"])
-            sheet_cap[dcfg[param]["short_name"]] = True
-        else:
-            logger.info(f"Parameter {param} is not part of the input dataset.")
-            continue
+        # rearrange and clean sheets (remove defaults, set index)
+        sheet_cap = {s:False for s in sheets_list}
+        for param in dcfg.inputs:
+            if param in sheets_list:
+                sheet_cap[param] = True
+            elif "short_name" in dcfg[param].keys() and dcfg[param]["short_name"] in sheets_list:
+                model_data[param] = model_data.pop(dcfg[param]["short_name"])
+                sheet_cap[dcfg[param]["short_name"]] = True
+            else:
+                logger.info(f"Parameter {param} is not part of the input dataset.")
+                continue
         
-        # set index
-        if "indices" in dcfg[param].keys():
-            model_data[param] = model_data[param].set_index([i for i in dcfg[param]["indices"] if (i != "YEAR" or "YEAR" in model_data[param].columns)])
+            # set index
+            if "indices" in dcfg[param].keys():
+                model_data[param] = model_data[param].set_index([i for i in dcfg[param]["indices"] if (i != "YEAR" or "YEAR" in model_data[param].columns)])
         
-        # convert to long format if years in colums
-        if "YEAR" in model_data[param].index.names:
-            model_data[param] = model_data[param].unstack("YEAR").droplevel(level=0,
-                                                                            axis=1)
+            # convert to long format if years in colums
+            if "YEAR" in model_data[param].index.names:
+                model_data[param] = model_data[param].unstack("YEAR").droplevel(level=0,
+                                                                                axis=1)
             
-        # filter based on default value, replace empty cells with default
-        if dcfg[param]["type"]=="param":
-            # get default value
-            default = dcfg[param]["default"]
-            # filter out rows with only default value
-            model_data[param] = model_data[param].loc[~(model_data[param]==default).all(axis=1)]
-            # replace empty cells with default values
-            model_data[param] = model_data[param].fillna(default)
+            # filter based on default value, replace empty cells with default
+            if dcfg[param]["type"]=="param":
+                # get default value
+                default = dcfg[param]["default"]
+                # filter out rows with only default value
+                model_data[param] = model_data[param].loc[~(model_data[param]==default).all(axis=1)]
+                # replace empty cells with default values
+                model_data[param] = model_data[param].fillna(default)
             
-    if not all(sheet_cap.values()):
-        logger.error("The following sheets do not correspond to entries in"
-                     "the configuration file: " + ", ".join([k for k,v in sheet_cap.items() if v is False]))
-        raise ValueError
+        if not all(sheet_cap.values()):
+            logger.error("The following sheets do not correspond to entries in"
+                         "the configuration file: " + ", ".join([k for k,v in sheet_cap.items() if v is False]))
+            raise ValueError
 
 
     #%% Get sectoral mapping for emissions
@@ -281,78 +404,32 @@ def downscale(input_file,
                            em_to_sector_data["emission"]):
         sector_to_em_dict.setdefault(sector, []).append(em)
     
+    # map technologies, commodities, and emissions to the position of their
+    # sector in the sector list (the first sector if mapped to several)
+    sector_codes = dict()
+    for dim,mapping in zip(["TECHNOLOGY","COMMODITY","EMISSION"],
+                           [sector_to_tech_dict,sector_to_com_dict,
+                            sector_to_em_dict]):
+        codes = dict()
+        for i,sector in enumerate(sectors_list):
+            for e in mapping.get(sector, []):
+                codes.setdefault(e, i)
+        sector_codes[dim] = pd.Series(codes, dtype=int)
 
 
     #%% Arrange downscaling factors
 
-    # Read population data; total, urban and rural; and rearrange
-    county_pop = pd.read_csv(pop_file,
-                             keep_default_na=False,
-                             usecols = ["ID"] + [str(y) for y in range(2019,2051)],
-                             index_col= "ID",
-                             nrows=47)
-    county_pop = county_pop.apply(pd.to_numeric)
-    county_pop = county_pop/county_pop.sum()
-    county_pop.columns = county_pop.columns.astype(int)
-    county_pop.index.name = "REGION"
-    
-    county_pop_ur = pd.read_csv(pop_file_ruur,
-                             keep_default_na=False,
-                             skiprows=3,
-                             usecols = [2,5],
-                             index_col= "ID",
-                             nrows=47,
-                             thousands=",")
-    county_pop_ur = county_pop_ur.apply(pd.to_numeric)
-    #county_pop_ur = county_pop_ur/county_pop_ur.sum()
-    county_pop_ur.index.name = "REGION"
-    county_pop_ur.columns = ["VALUE"]
-    
-    county_pop_ru = pd.read_csv(pop_file_ruur,
-                             keep_default_na=False,
-                             skiprows=3,
-                             usecols = [5,8],
-                             index_col= "ID",
-                             nrows=47,
-                             thousands=",")
-    county_pop_ru = county_pop_ru.apply(pd.to_numeric)
-    #county_pop_ru = county_pop_ru/county_pop_ru.sum()
-    county_pop_ru.index.name = "REGION"
-    county_pop_ru.columns = ["VALUE"]
-    
-    county_pop_urf = county_pop.mul((county_pop_ur/(county_pop_ur+county_pop_ru))
-                                    ["VALUE"],axis=0)
-    county_pop_urf = county_pop_urf/county_pop_urf.sum()
-    county_pop_ruf = county_pop.mul((county_pop_ru/(county_pop_ur+county_pop_ru))
-                                    ["VALUE"],axis=0)
-    county_pop_ruf = county_pop_ruf/county_pop_ruf.sum()
-    
-
-    # Read GCP data
-    gcp_data = pd.read_csv(gdp_file,
-                           keep_default_na=False,
-                           usecols= ["ID"] + ["Sec_"+str(i) for i in range (1,20)],
-                           index_col = "ID",
-                           nrows=47
-                           )
-    gcp_data = gcp_data.apply(pd.to_numeric)
-    gcp_mapping = {"Agriculture":['Sec_1'],
-                      "Industry":['Sec_2', 'Sec_3', 'Sec_6'],
-                      "Services":['Sec_4', 'Sec_5',
-                                  'Sec_7', 'Sec_9',
-                                  'Sec_10', 'Sec_11',
-                                  'Sec_12','Sec_13',
-                                  'Sec_14', 'Sec_15',
-                                  'Sec_16', 'Sec_17',
-                                  'Sec_18', 'Sec_19'],
-                      "Transport":['Sec_8']}
-    
-    
-    gcp_factors = dict()
-    for sec in gcp_mapping.keys():
-        gcp_factors[sec] = gcp_data[gcp_mapping[sec]].sum(axis=1)
-        gcp_factors[sec] = gcp_factors[sec]/gcp_factors[sec].sum()
-        gcp_factors[sec].index.name = "REGION"
+    # get registry of population and GCP based factors (cached for inputs)
+    # if not provided
+    if registry is None:
+        registry = FactorRegistry.from_files(list_counties, pop_file,
+                                             pop_file_ruur, gdp_file,
+                                             gdp_method=gdp_method,
+                                             cache_dir=cache_dir)
+    elif registry.regions != list_counties:
+        logger.error("The regions of the downscaling factor registry do not"
+                     " match the list of counties.")
+        raise ValueError
         
 
     #%% sector processing
@@ -364,7 +441,7 @@ def downscale(input_file,
            "UDCTag","UDCConstant","UDCMultiplierActivity", # UDC not currently used
            "UDCMultiplierNewCapacity","UDCMultiplierTotalCapacity",
            "CapitalCostStorage", "OperationalLifeStorage" # Storage not currently used
-           ] + [n for n in dcfg.keys() if dcfg[n]["type"]=="set"]
+           ] + dcfg.sets
     # params to be disaggregated
     param_disagg = ['ResidualCapacity', 'AccumulatedAnnualDemand',
                     'SpecifiedAnnualDemand','TotalTechnologyAnnualActivityLowerLimit',
@@ -377,16 +454,83 @@ def downscale(input_file,
     fuel_links_up = ["ELC001"]
 
     
+    # check downscaling factors of sectors
+    for sector in county_sectors:
+        if sector not in registry:
+            logger.warning(f"No downscaling factor defined for "
+                           f"sector {sector}, assume equal shares of"
+                           " counties.")
+    
+    # get sector of each row of parameters and, if updated incrementally,
+    # fingerprint parameters based on their data and the sector mapping and
+    # factors used
+    codes = dict()
+    fingerprints = dict()
+    for param in dcfg.inputs:
+        
+        df = model_data[param]
+        
+        # sets, general, unused, reserve margin and RE target params are
+        # saved in national data
+        if (param in gen
+            or "ReserveMargin" in param or param.startswith("RE")):
+            if track:
+                fingerprints[param] = _get_fingerprint(df)
+            continue
+        
+        dim = next((d for d in sector_codes.keys()
+                    if d in df.index.names), None)
+        if dim is None:
+            logger.error(f"Data for parameter {param} cannot be allocated"
+                         " to sectors.")
+            raise ValueError
+        codes[param] = _get_sector_codes(df.index, dim, sector_codes[dim])
+        if (codes[param] == -1).any():
+            logger.error(f"Data for parameter {param} could not be completely allocated."
+                         "Remaining values include:")
+            logger.error(df.index[codes[param] == -1])
+            raise ValueError
+        
+        if not track:
+            continue
+        
+        # sectors of rows, if downscaled, and downscaling factors used
+        sectors = list()
+        for c in np.unique(codes[param]):
+            sec = sectors_list[c]
+            sectors.append([sec, sec in county_sectors])
+            if sec in county_sectors and param in param_disagg:
+                sectors[-1].append(registry.fingerprint(sec))
+        fingerprints[param] = _get_fingerprint(df, codes[param], sectors)
+    
+    # get parameters to be downscaled, i.e., parameters with changed inputs
+    # or, for spreadsheet files, all parameters
+    if manifest is None:
+        changed = set(dcfg.inputs)
+    else:
+        changed = {p for p in dcfg.inputs
+                   if manifest["params"].get(p) != fingerprints[p]}
+        if remove_fte_tech_mode and changed & {"InputActivityRatio",
+                                               "OutputActivityRatio"}:
+            changed = set(dcfg.inputs)
+        # parameters of missing or changed sheets of saved models
+        for k,sns in damaged.items():
+            changed.update(p for p in dcfg.inputs
+                           if sns is None or dcfg.sheet_names[p] in sns)
+        logger.info(f"Downscaling {len(changed)} parameters with changed"
+                    " inputs or outputs.")
+    compute = set(dcfg.inputs) if output_format == "xlsx" else changed
+    
     # create dicts for data
     ddata = dict()
     for g in list_counties + ["National"]:
         ddata[g] = dict()
         
-    # downscale data
-    for param in dcfg.keys():
+    # downscale data, collecting the data of each parameter in lists and
+    # concatenating them once
+    for param in dcfg.inputs:
         
-        # skip result variables
-        if dcfg[param]["type"] == "result":
+        if param not in compute:
             continue
         
         df_copy = model_data[param].copy()
@@ -394,164 +538,202 @@ def downscale(input_file,
         
         # if set, general or unused param, save in national data
         if param in gen:
-            if param in ddata["National"].keys():
-                ddata["National"][param] = pd.concat([ddata["National"][param],
-                                                      df_copy])
-            else:
-                ddata["National"][param] = df_copy   
+            ddata["National"][param] = df_copy   
             continue
         # if reserve margin or RE target, save in electricity sector data
         elif "ReserveMargin" in param or param.startswith("RE"):
-                if param in ddata["National"].keys():
-                    ddata["National"][param] = pd.concat([ddata["National"][param],
-                                                          df_copy])
-                else:
-                    ddata["National"][param] = df_copy   
-                continue
-                   
-        for sector in sectors_list:
-            # get sector data
-            if "TECHNOLOGY" in df_copy.index.names:
-                fil = df_copy.index.get_level_values("TECHNOLOGY").isin(sector_to_tech_dict[sector])
-                df_sec = df_copy.loc[fil]
-                df_copy = df_copy.loc[~fil]
-            elif "COMMODITY" in df_copy.index.names:
-                if sector not in sector_to_com_dict.keys():
-                    continue
-                fil = df_copy.index.get_level_values("COMMODITY").isin(sector_to_com_dict[sector])
-                df_sec = df_copy.loc[fil]
-                df_copy = df_copy.loc[~fil]
-            elif "EMISSION" in df_copy.index.names:
-                if sector not in sector_to_em_dict.keys():
-                    continue
-                fil = df_copy.index.get_level_values("EMISSION").isin(sector_to_em_dict[sector])
-                df_sec = df_copy.loc[fil]
-                df_copy = df_copy.loc[~fil]
-            else:
-                logger.error(f"Data for sector {sector} for parameter {param} cannot be allocated.")
-                raise ValueError
+            ddata["National"][param] = df_copy   
+            continue
+        
+        parts = {g:[] for g in ddata.keys()}
+        for code,df_sec in df_copy.groupby(codes[param], sort=True):
+            sector = sectors_list[code]
             
-    
-            # process data
-            if df_sec.empty:
+            # adjust to connect relevant fuels to national level
+            if param == "InputActivityRatio" and sector in county_sectors:
+                df_sec = df_sec.rename(index={f:":RE1:"+f
+                                              for f in fuel_links_down},
+                                       level="COMMODITY")
+            if param == "OutputActivityRatio" and sector in county_sectors:
+                df_sec = df_sec.rename(index={f:":RE1:"+f
+                                              for f in fuel_links_up},
+                                       level="COMMODITY")
+            
+            if sector not in county_sectors:
+                parts["National"].append(df_sec)
                 continue
+            
+            # get the data of all counties, scaling values with a
+            # county x column matrix of factors if to be disaggregated
+            if param in param_disagg:
+                values = (registry.matrix(sector, df_sec.columns)[:,None,:]
+                          * df_sec.to_numpy(dtype=float)[None,:,:])
+                for i,c in enumerate(list_counties):
+                    parts[c].append(pd.DataFrame(values[i],
+                                                 index=_get_region_index(df_sec,
+                                                                         c),
+                                                 columns=df_sec.columns))
             else:
-                # adjust to connect relevant fuels to national level
-                if param == "InputActivityRatio" and sector in county_sectors:
-                    for f in fuel_links_down:
-                        df_sec = df_sec.rename(index={f:":RE1:"+f},
-                                               level="COMMODITY")
-                if param == "OutputActivityRatio" and sector in county_sectors:
-                    for f in fuel_links_up:
-                        df_sec = df_sec.rename(index={f:":RE1:"+f},
-                                               level="COMMODITY")
-                        
-                        
-                if sector in county_sectors and param not in param_disagg:
-    
-                    for c in list_counties:
-                        df = df_sec.rename(index={"RE1":c})
-                        if param in ddata[c].keys():
-                            ddata[c][param] = pd.concat([ddata[c][param],df])
-                        else:
-                            ddata[c][param] = df
-                elif sector in county_sectors and param in param_disagg:
-                    for c in list_counties:
-                        df = df_sec.rename(index={"RE1":c})
-                        if sector == "Residential":
-                            fac = county_pop
-                        elif sector == "Residential-Urban":
-                            fac = county_pop_urf
-                        elif sector == "Residential-Rural":
-                            fac = county_pop_ruf
-                        elif sector in gcp_factors.keys():
-                            fac = gcp_factors[sector]
-                        else:
-                            fac = 1/47
-                            logger.warning(f"No downscaling factor defined for"
-                                           f"sector {sector}, assume 1/47.")
-                        if param in ddata[c].keys():
-                            ddata[c][param] = pd.concat([ddata[c][param],df.mul(fac,axis=0)])
-                        else:
-                            ddata[c][param] = df.mul(fac,axis=0)
-                else:
-                    if param in ddata["National"].keys():
-                        ddata["National"][param] = pd.concat([ddata["National"][param],
-                                                              df_sec])
-                    else:
-                        ddata["National"][param] = df_sec.copy()
+                for c in list_counties:
+                    parts[c].append(df_sec.set_axis(_get_region_index(df_sec,
+                                                                      c),
+                                                    axis=0))
+        
+        for g,l in parts.items():
+            if l:
+                ddata[g][param] = pd.concat(l)
             
     
-        if not df_copy.empty:
-            logger.error(f"Data for parameter {param} could not be completely allocated."
-                         "Remaining values include:")
-            logger.error(df_copy.index)
-            raise ValueError
     #%% simplify model if triggered
     
     # FIXME: note that removing FTE technologies currently also removes
     # sectoral emission accounting, could move these EmissionActivityRatios
     # to sector end-use tech
+    relink = dict()
     if remove_fte_tech_mode:
         
-        # get fuel connections
-        relink = dict()
-        for k in ddata.keys():
-           relink.update({ddata[k]["OutputActivityRatio"].xs((fte,1),level=("TECHNOLOGY","MODE_OF_OPERATION")).index.get_level_values("COMMODITY").values[0]:
-                          ddata[k]["InputActivityRatio"].xs((fte,1),level=("TECHNOLOGY","MODE_OF_OPERATION")).index.get_level_values("COMMODITY").values[0]
-                          for fte in 
-                          [t for t in ddata[k]["InputActivityRatio"].index.get_level_values("TECHNOLOGY") if t.startswith("FTE")]}
-                         )
-               
-        for k in ddata.keys():
-            for p in ddata[k].keys():
-                # remove FTE techs and fuels, remove second mode
-                if p == "TECHNOLOGY":
+        # get fuel connections, i.e., input fuel of FTE technologies for
+        # each of their output fuels, from manifest if not downscaled
+        if "InputActivityRatio" in compute:
+            relink = _get_fte_relink(ddata)
+        else:
+            relink = manifest["relink"]
+        
+        # remove FTE techs and fuels, remove second mode, and relink
+        # technologies using end use sector fuels, for all regions at once
+        for p in dcfg.inputs:
+            regions = [k for k in ddata.keys() if p in ddata[k]]
+            if not regions:
+                continue
+            if p == "TECHNOLOGY":
+                for k in regions:
                     ddata[k][p] = ddata[k][p].loc[~ddata[k][p]["VALUE"].str.startswith("FTE")]
-                    continue
-                if p == "COMMODITY":
+                continue
+            if p == "COMMODITY":
+                for k in regions:
                     ddata[k][p] = ddata[k][p].loc[~ddata[k][p]["VALUE"].isin(relink.keys())]
-                    continue
-                if p== "MODE_OF_OPERATION":
+                continue
+            if p == "MODE_OF_OPERATION":
+                for k in regions:
                     ddata[k][p] = ddata[k][p].loc[ddata[k][p]["VALUE"]==1]
-                    continue
-                if "TECHNOLOGY" in ddata[k][p].index.names:
-                    ddata[k][p] = ddata[k][p].loc[~ddata[k][p].index.get_level_values("TECHNOLOGY").str.startswith("FTE")]
-                    # relink technologies using end use sector fuels
-                    if "COMMODITY" in ddata[k][p].index.names:
-                        ddata[k][p] = ddata[k][p].rename(index=relink)
-                if "MODE_OF_OPERATION" in ddata[k][p].index.names:
-                    ddata[k][p] = ddata[k][p].loc[ddata[k][p].index.get_level_values("MODE_OF_OPERATION")==1]
+                continue
+            names = ddata[regions[0]][p].index.names
+            if ("TECHNOLOGY" not in names
+                and "MODE_OF_OPERATION" not in names):
+                continue
+            
+            # filter the combined index of all regions and split it again
+            index = ddata[regions[0]][p].index.append([ddata[k][p].index
+                                                       for k in regions[1:]])
+            keep = np.ones(len(index), dtype=bool)
+            if "TECHNOLOGY" in names:
+                keep &= ~_get_level_mask(index, "TECHNOLOGY",
+                                         lambda l: l.str.startswith("FTE"))
+            if "MODE_OF_OPERATION" in names:
+                keep &= _get_level_mask(index, "MODE_OF_OPERATION",
+                                        lambda l: l == 1)
+            index = index[keep]
+            if "TECHNOLOGY" in names and "COMMODITY" in names:
+                index = _rename_level(index, "COMMODITY", relink)
+            
+            bounds = np.cumsum([0]+[len(ddata[k][p]) for k in regions])
+            kept = np.concatenate([[0], np.cumsum(keep)])[bounds]
+            for i,k in enumerate(regions):
+                ddata[k][p] = ddata[k][p].iloc[keep[bounds[i]:bounds[i+1]]].set_axis(
+                                        index[kept[i]:kept[i+1]], axis=0)
                 
         
 #%% save files
       
+    # fingerprint downscaled data if updated incrementally, to only save
+    # files (and, for parquet files, sheets) with changed data
+    outputs = {g:({p:_get_fingerprint(df) for p,df in ddata[g].items()}
+                  if track else dict())
+               for g in ddata.keys()}
+    previous = dict(manifest["outputs"]) if manifest is not None else dict()
+    # save sheets of missing or changed saved models again
+    for g,sns in damaged.items():
+        previous[g] = {p:v for p,v in previous.get(g, dict()).items()
+                       if sns is not None and dcfg.sheet_names[p] not in sns}
+    for g in ddata.keys():
+        outputs[g].update({p:v for p,v in previous.get(g, dict()).items()
+                           if p not in compute})
+    
+    # arrange sheets of models to be saved, and of all models if all data
+    # are downscaled, i.e., returned
+    complete = (compute == set(dcfg.inputs))
     # FIXME: remove empty sheets before saving?
+    model = dict()
+    sheets = dict()
     for k in ddata.keys():
-        with pd.ExcelWriter(output_path+k+".xlsx", engine='openpyxl') as writer:
-            for param in ddata[k].keys():
-                if "short_name" in dcfg[param].keys():
-                    sheet = dcfg[param]["short_name"]
+        upd = [p for p in ddata[k].keys()
+               if not track
+               or previous.get(k, dict()).get(p) != outputs[k][p]]
+        rem = [p for p in previous.get(k, dict()).keys()
+               if p not in outputs[k]]
+        save = output_path is not None and (upd or rem)
+        if not save and not complete:
+            continue
+        model[k] = dict()
+        for param in ddata[k].keys():
+            if (not complete and output_format == "parquet"
+                and param not in upd):
+                continue
+            # FIXME: use SET for sets as index level (?)
+            df = ddata[k][param]
+            for l,v in zip(['PARAMETER','SCENARIO','MODEL'],
+                           [param,'#ALL','#ALL']):
+                if dcfg[param]["type"] == "set":
+                    df.insert(0, l, v)
                 else:
-                    sheet = param
-
-                # FIXME: use SET for sets as index level (?)
-                df = ddata[k][param]
-                for l,v in zip(['PARAMETER','SCENARIO','MODEL'],
-                               [param,'#ALL','#ALL']):
-                    if dcfg[param]["type"] == "set":
-                        df.insert(0, l, v)
-                    else:
-                        df = pd.concat([df],
-                                       keys=[v],
-                                       names=[l])
-
-                ind = True if dcfg[param]["type"]=="param" else False
-                df.to_excel(writer,merge_cells=False,
-                            sheet_name=sheet, index=ind)     
+                    df = pd.concat([df],
+                                   keys=[v],
+                                   names=[l])
+            model[k][dcfg.sheet_names[param]] = df
+        if not save:
+            continue
+        sheets[k] = {dcfg.sheet_names[p]:model[k][dcfg.sheet_names[p]]
+                     for p in ddata[k].keys()
+                     if output_format != "parquet" or p in upd}
+        # remove sheets of parameters no longer part of the data
+        if output_format == "parquet":
+            for param in rem:
+                sheets[k][dcfg.sheet_names[param]] = None
+    
+    if output_path is not None:
+        cf.save_model(output_path, sheets, overwrite=True,
+                      output_format=output_format,
+                      index=[dcfg.sheet_names[p] for p in dcfg.params],
+                      n_workers=n_workers, engine=writer_engine,
+                      update=(manifest is not None))
+        
+    if track:
+        # save manifest for incremental updates, including the state of
+        # the saved models to detect later changes
+        files = {k:_get_output_state(output_path, k, output_format)
+                 for k in ddata.keys()}
+        _save_manifest(output_path, {**state,
+                                     "params":fingerprints,
+                                     "outputs":outputs,
+                                     "relink":relink,
+                                     "files":files})
+    elif output_path is not None:
+        # remove manifest of a previous incremental update, which does not
+        # describe the rebuilt model
+        _remove_manifest(output_path)
 
     logger.info("Successfully downscaled the national model.")
     
+    if not complete:
+        return None
+    
+    # return sheets as loaded from saved models, i.e., with index as columns
+    psheets = {dcfg.sheet_names[p] for p in dcfg.params}
+    
+    return {k:{sn:(df.reset_index() if sn in psheets else df)
+               for sn,df in model[k].items()}
+            for k in model.keys()}
+    
 
 
 #%% 
@@ -562,6 +744,12 @@ def process_county_model(dataconfig_file,
                          ft_param,
                          output_path,
                          overwrite=False,
+                         n_workers=1,
+                         engine=None,
+                         output_format="xlsx",
+                         writer_engine=None,
+                         data=None,
+                         return_data=False,
                          **kwargs):
     """ Integrate county-resolved and other datasets
     
@@ -571,27 +759,53 @@ def process_county_model(dataconfig_file,
     dataconfig_file : str
         File path to the data config file as required by the otoole package.
     input_path : str
-        File path to the directory with the input model spreadsheet files.
+        File path to the directory with the input model spreadsheet files
+        (or directories with parquet files).
     datasets : list
         List of dataset or other processing steps (strings) to be integrated.
     ft_param : str
         File path to the spreadsheet file with the fratoo multi-scale
         parameters.
-    output_path : str
+    output_path : str or None
         File path to the directory where the processed model spreadsheet files
-        are to be saved.
+        are to be saved. If None, the model is not saved but only returned.
     overwrite : bool
         If to overwrite model if output_path is a non-empty, existing
         directory.
+    n_workers : int, optional
+        Number of worker processes used to load and save spreadsheet files
+        in parallel. The default is 1.
+    engine : str, optional
+        Engine used to read spreadsheet files (see ospro.read_workbook).
+        The default is None.
+    output_format : str, optional
+        Format of the processed model (see county_functions.save_model).
+        The default is 'xlsx'.
+    writer_engine : str, optional
+        Engine used to write spreadsheet files (see ospro.write_workbook).
+        The default is None.
+    data : dict, optional
+        Model data as returned by downscale, used instead of loading the
+        model from input_path. The data are changed in place. The default
+        is None.
+    return_data : bool, optional
+        If to return the processed model data, e.g., to be passed to the
+        next stage in memory. The data are always returned if output_path
+        is None. The default is False.
 
     Returns
     -------
-    None.
+    dict or None
+        Processed model data, i.e., a dictionary of DataFrames for each
+        sheet for each model, including the fratoo multi-scale parameters
+        ('multiscale_params'), e.g., to be read with ospro.read_spreadsheets.
+        None if the data are not returned or an existing model is kept.
 
     """
     
     # check if model already exists
-    if os.path.exists(output_path) and len(os.listdir(output_path)) != 0:
+    if (output_path is not None and os.path.exists(output_path)
+        and len(os.listdir(output_path)) != 0):
         if not overwrite:
             logger.info("Model already exists and will not be overwritten."
                            " Set 'overwrite' to True to overwrite existing"
@@ -601,7 +815,8 @@ def process_county_model(dataconfig_file,
     # load data
     logger.info('Loading data.')
     
-    data = cf.load_model(input_path)
+    if data is None:
+        data = cf.load_model(input_path, n_workers=n_workers, engine=engine)
     
     
     # integrate datasets
@@ -609,6 +824,7 @@ def process_county_model(dataconfig_file,
     
     if "cooking" in datasets:
         data = cf.cookstove_dataset(data,
+                                    engine=engine,
                                     **kwargs)
         logger.info("Integrated the 'cooking' dataset/enhancements.")
         
@@ -621,10 +837,538 @@ def process_county_model(dataconfig_file,
     
 
     # save data
-    cf.save_model(output_path, data, overwrite=overwrite)
+    if output_path is not None:
+        cf.save_model(output_path, data, overwrite=overwrite,
+                      output_format=output_format, n_workers=n_workers,
+                      engine=writer_engine)
+    
+        # copy spreadsheet file with fratoo multi-scale structure to folder
+        shutil.copy(ft_param, output_path+"multiscale_params.xlsx")
     
-    # copy spreadsheet file with fratoo multi-scale structure to folder
-    shutil.copy(ft_param, output_path+"multiscale_params.xlsx")
+    if not return_data and output_path is not None:
+        return
+    
+    # add fratoo multi-scale structure to the data returned
+    data["multiscale_params"] = op.read_workbook(ft_param, engine=engine,
+                                                 sheet_name=None,
+                                                 keep_default_na=False)
+    
+    return data
 
     
-    
\ No newline at end of file
+    
+
+
+class FactorRegistry():
+    """ Registry of downscaling factors by sector.
+    
+    Factors of a sector are registered as DataFrame (by region and year),
+    Series (by region), float (same for all regions), or as function
+    returning one of these, which is only called when the factors are first
+    used. Factor matrices aligned to regions and years are cached, i.e.,
+    only computed once for each sector and set of years.
+    
+    Parameters
+    ----------
+    regions : list
+        List of regions.
+    default : float, optional
+        Factor of sectors without registered factors. The default is None,
+        i.e., an equal share for each region.
+
+    """
+    
+    # gross county product sectors of downscaled sectors
+    GCP_MAPPING = {"Agriculture":['Sec_1'],
+                   "Industry":['Sec_2', 'Sec_3', 'Sec_6'],
+                   "Services":['Sec_4', 'Sec_5',
+                               'Sec_7', 'Sec_9',
+                               'Sec_10', 'Sec_11',
+                               'Sec_12','Sec_13',
+                               'Sec_14', 'Sec_15',
+                               'Sec_16', 'Sec_17',
+                               'Sec_18', 'Sec_19'],
+                   "Transport":['Sec_8']}
+    
+    # registries created from files, by files (only for the latest state of
+    # the files), copies are returned to be reused for unchanged files
+    _registries = dict()
+    
+    def __init__(self, regions, default=None):
+        self.regions = list(regions)
+        self.default = (1/len(self.regions) if default is None
+                        else default)
+        self._factors = dict()
+        self._interpolate = dict()
+        self._cache = dict()
+        
+    def __contains__(self, sector):
+        return sector in self._factors
+    
+    def copy(self):
+        """ Copy the registry, sharing the (unmodified) factors and cached
+        matrices, so that sectors can be registered without changing the
+        original registry.
+        
+        """
+        
+        registry = type(self)(self.regions, default=self.default)
+        registry._factors = dict(self._factors)
+        registry._interpolate = dict(self._interpolate)
+        registry._cache = dict(self._cache)
+        
+        return registry
+    
+    def register(self, sector, factors, interpolate=False):
+        """ Register downscaling factors of a sector.
+
+        Parameters
+        ----------
+        sector : str
+            Name of the sector.
+        factors : DataFrame, Series, float, or function
+            Downscaling factors, either by region and column (year), by
+            region, or the same for all regions, or a function without
+            arguments returning these.
+        interpolate : bool, optional
+            If to interpolate factors by region and year linearly between
+            years, and keep them constant before the first and after the
+            last year. Otherwise, factors are only available for the years
+            given. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        
+        self._factors[sector] = factors
+        self._interpolate[sector] = interpolate
+        self._cache = {k:v for k,v in self._cache.items() if k[0] != sector}
+        
+    def get(self, sector):
+        """ Get downscaling factors of a sector, default if not registered.
+        
+        """
+        
+        if sector not in self._factors:
+            return self.default
+        if callable(self._factors[sector]):
+            self._factors[sector] = self._factors[sector]()
+            
+        return self._factors[sector]
+    
+    def matrix(self, sector, columns):
+        """ Get downscaling factors of a sector as matrix of regions x
+        columns.
+
+        Parameters
+        ----------
+        sector : str
+            Name of the sector.
+        columns : Index
+            Columns (years) of the data to be downscaled.
+
+        Returns
+        -------
+        numpy.ndarray
+            Factors with one row for each region and one column for each
+            column of the data (NaN if not available).
+
+        """
+        
+        key = (sector, tuple(columns))
+        if key not in self._cache:
+            fac = self.get(sector)
+            if isinstance(fac, pd.DataFrame) and self._interpolate.get(sector):
+                years = np.asarray(fac.columns, dtype=float)
+                values = fac.reindex(index=self.regions).to_numpy(dtype=float)
+                cols = np.asarray(columns, dtype=float)
+                if len(years) == 1:
+                    m = np.repeat(values, len(cols), axis=1)
+                else:
+                    j = np.clip(np.searchsorted(years, cols), 1, len(years)-1)
+                    w = np.clip((cols-years[j-1])/(years[j]-years[j-1]), 0, 1)
+                    m = values[:,j-1]*(1-w) + values[:,j]*w
+            elif isinstance(fac, pd.DataFrame):
+                m = fac.reindex(index=self.regions,
+                                columns=columns).to_numpy(dtype=float)
+            elif isinstance(fac, pd.Series):
+                m = np.repeat(fac.reindex(self.regions).to_numpy(dtype=float)[:,None],
+                              len(columns), axis=1)
+            else:
+                m = np.full((len(self.regions), len(columns)), fac,
+                            dtype=float)
+            m.flags.writeable = False
+            self._cache[key] = m
+            
+        return self._cache[key]
+    
+    def fingerprint(self, sector):
+        """ Get fingerprint of the downscaling factors of a sector.
+        
+        """
+        
+        key = (sector, "fingerprint")
+        if key not in self._cache:
+            self._cache[key] = _get_fingerprint(self.get(sector),
+                                                self._interpolate.get(sector,
+                                                                      False))
+        
+        return self._cache[key]
+    
+    @classmethod
+    def from_files(cls, regions, pop_file, pop_file_ruur, gdp_file,
+                   gdp_method="mean", cache_dir=None):
+        """ Get registry of population and gross county product (GCP) based
+        downscaling factors.
+        
+        Residential sectors are downscaled based on the (urban or rural)
+        population and sectors in GCP_MAPPING based on the GCP of the
+        respective economic sectors. Factors are shares of the counties in
+        the files. Registries are cached and copies are returned as long
+        as the files are unchanged.
+
+        Parameters
+        ----------
+        regions : list
+            List of regions (county codes).
+        pop_file : str
+            File path to a csv file with population data by year.
+        pop_file_ruur : str
+            File path to a csv file with urban and rural population data.
+        gdp_file : str or list
+            File path to a csv file with GCP data, or list of file paths
+            for several years, the year being given in the file name, e.g.,
+            'GCP_2020.csv'.
+        gdp_method : str, optional
+            Method to combine GCP data of several years, i.e., 'mean' to
+            average the shares of counties or 'interpolate' to interpolate
+            shares linearly between years. The default is 'mean'.
+        cache_dir : str, optional
+            Path to directory used to cache the raw data tables (see
+            raw_data.load_source). The default is None.
+
+        Raises
+        ------
+        ValueError
+            Raised if the method is not implemented or the year of a GCP
+            file cannot be derived for interpolation.
+
+        Returns
+        -------
+        FactorRegistry
+            Registry of downscaling factors.
+
+        """
+        
+        if gdp_method not in ["mean","interpolate"]:
+            raise ValueError(f"Method '{gdp_method}' to combine GCP data is"
+                             " not implemented.")
+        gdp_files = [gdp_file] if isinstance(gdp_file, str) else list(gdp_file)
+        
+        files = [pop_file, pop_file_ruur]+gdp_files
+        key = (tuple(regions), gdp_method, tuple(files))
+        state = tuple((os.stat(f).st_mtime_ns, os.stat(f).st_size)
+                      for f in files)
+        if cls._registries.get(key, (None,))[0] == state:
+            return cls._registries[key][1].copy()
+        
+        registry = cls(regions)
+        
+        # Read population data; total, urban and rural; and rearrange
+        county_pop = rd.load_source("population", pop_file,
+                                    cache_dir=cache_dir)
+        county_pop = county_pop/county_pop.sum()
+        
+        county_pop_ruur = rd.load_source("population_urban_rural",
+                                         pop_file_ruur, cache_dir=cache_dir)
+        county_pop_ur = county_pop_ruur["Urban"]
+        county_pop_ru = county_pop_ruur["Rural"]
+        
+        county_pop_urf = county_pop.mul(county_pop_ur/(county_pop_ur+county_pop_ru),
+                                        axis=0)
+        county_pop_urf = county_pop_urf/county_pop_urf.sum()
+        county_pop_ruf = county_pop.mul(county_pop_ru/(county_pop_ur+county_pop_ru),
+                                        axis=0)
+        county_pop_ruf = county_pop_ruf/county_pop_ruf.sum()
+        
+        registry.register("Residential", county_pop)
+        registry.register("Residential-Urban", county_pop_urf)
+        registry.register("Residential-Rural", county_pop_ruf)
+        
+        # Read GCP data, shares of counties for each file (year)
+        gcp_factors = {sec:dict() for sec in cls.GCP_MAPPING.keys()}
+        for n,f in enumerate(gdp_files):
+            year = re.findall(r"\d{4}", os.path.basename(f))
+            if gdp_method == "interpolate" and not year:
+                raise ValueError(f"Year of GCP file '{f}' cannot be derived"
+                                 " from its name.")
+            gcp_data = rd.load_source("gcp", f, cache_dir=cache_dir)
+            for sec in cls.GCP_MAPPING.keys():
+                fac = gcp_data[cls.GCP_MAPPING[sec]].sum(axis=1)
+                gcp_factors[sec][int(year[-1]) if year else n] = fac/fac.sum()
+        
+        for sec,fac in gcp_factors.items():
+            fac = pd.concat(fac, axis=1).sort_index(axis=1)
+            fac.index.name = "REGION"
+            if gdp_method == "mean":
+                registry.register(sec, fac.mean(axis=1))
+            else:
+                registry.register(sec, fac, interpolate=True)
+        
+        cls._registries[key] = (state, registry)
+        
+        return registry.copy()
+    
+
+def _get_region_index(df, region, placeholder="RE1"):
+    """ Get the index of national data for a region, i.e., with the
+    placeholder region replaced by the region.
+    
+    The levels of the index are replaced instead of the labels of each row
+    where possible.
+
+    """
+    
+    index = df.index
+    if isinstance(index, pd.MultiIndex):
+        levels = [l.where(l != placeholder, region)
+                  if placeholder in l else l for l in index.levels]
+        if all(l.is_unique for l in levels):
+            return index.set_levels(levels)
+    return df.rename(index={placeholder:region}).index
+
+
+def _get_sector_codes(index, level, codes):
+    """ Get the sector code of each row of an index.
+    
+    Parameters
+    ----------
+    index : Index
+        Index of the data.
+    level : str
+        Name of the index level mapped to sectors.
+    codes : Series
+        Sector codes indexed by the values of the level.
+
+    Returns
+    -------
+    numpy.ndarray
+        Sector code of each row, -1 if not mapped to a sector.
+
+    """
+    
+    pos = codes.index.get_indexer(index.get_level_values(level))
+    
+    return np.where(pos >= 0, codes.to_numpy()[np.maximum(pos, 0)], -1)
+
+
+def _get_fte_relink(ddata):
+    """ Get the input fuel of FTE technologies for each of their output
+    fuels, across all regions.
+    
+    Parameters
+    ----------
+    ddata : dict
+        Data of each region, i.e., dict of parameter DataFrames.
+
+    Returns
+    -------
+    dict
+        Input fuel for each output fuel of FTE technologies.
+
+    """
+    
+    fte = dict()
+    for p in ["InputActivityRatio", "OutputActivityRatio"]:
+        rows = list()
+        for k in ddata.keys():
+            if p not in ddata[k]:
+                continue
+            index = ddata[k][p].index
+            index = index[_get_level_mask(index, "TECHNOLOGY",
+                                          lambda l: l.str.startswith("FTE"))
+                          & _get_level_mask(index, "MODE_OF_OPERATION",
+                                            lambda l: l == 1)]
+            rows.append(pd.DataFrame({"REGION":k,
+                                      "TECHNOLOGY":index.get_level_values("TECHNOLOGY"),
+                                      "COMMODITY":index.get_level_values("COMMODITY")}))
+        if not rows:
+            return dict()
+        fte[p] = pd.concat(rows).drop_duplicates(["REGION","TECHNOLOGY"])
+    
+    links = fte["OutputActivityRatio"].merge(fte["InputActivityRatio"],
+                                             on=["REGION","TECHNOLOGY"],
+                                             suffixes=("_out","_in"))
+    
+    return dict(zip(links["COMMODITY_out"], links["COMMODITY_in"]))
+
+
+def _get_level_mask(index, level, func):
+    """ Get boolean mask of the rows of an index, evaluating a function on
+    the values of an index level only once for each unique value.
+    
+    Parameters
+    ----------
+    index : Index
+        Index of the data.
+    level : str
+        Name of the index level.
+    func : function
+        Function returning a boolean array for an Index of level values.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean mask, False for missing values.
+
+    """
+    
+    if not isinstance(index, pd.MultiIndex):
+        return np.asarray(func(index), dtype=bool)
+    i = index.names.index(level)
+    mask = np.append(np.asarray(func(index.levels[i]), dtype=bool), False)
+    
+    return mask[index.codes[i]]
+
+
+def _rename_level(index, level, mapping):
+    """ Rename values of an index level, mapping the level values instead of
+    the labels of each row.
+    
+    """
+    
+    if not mapping:
+        return index
+    if not isinstance(index, pd.MultiIndex):
+        return index.map(lambda v: mapping.get(v, v))
+    i = index.names.index(level)
+    codes, uniques = pd.factorize(index.levels[i].map(lambda v:
+                                                       mapping.get(v, v)))
+    levels = list(index.levels)
+    levels[i] = uniques
+    codes_all = list(index.codes)
+    codes_all[i] = np.where(index.codes[i] >= 0,
+                            codes[np.maximum(index.codes[i], 0)], -1)
+    
+    return pd.MultiIndex(levels=levels, codes=codes_all, names=index.names,
+                         verify_integrity=False)
+
+
+def _get_fingerprint(*objs):
+    """ Get fingerprint of data, i.e., a hash of DataFrames, Series, arrays,
+    and other (json serializable) objects.
+    
+    """
+    
+    h = hashlib.sha256()
+    for o in objs:
+        if isinstance(o, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(o, index=True).to_numpy().tobytes())
+            h.update(repr((list(o.index.names),
+                           list(o.columns) if isinstance(o, pd.DataFrame)
+                           else o.name)).encode())
+        elif isinstance(o, np.ndarray):
+            h.update(o.tobytes())
+        else:
+            h.update(json.dumps(o, default=str).encode())
+            
+    return h.hexdigest()
+
+def _get_file_fingerprint(f):
+    """ Get fingerprint of the content of a file or list of files (or
+    None).
+    
+    """
+    
+    h = hashlib.sha256()
+    for g in ([f] if isinstance(f, str) else f or []):
+        with open(g, "rb") as fh:
+            for chunk in iter(lambda: fh.read(2**20), b""):
+                h.update(chunk)
+            
+    return h.hexdigest()
+
+def _load_manifest(path):
+    """ Load manifest of downscaled model, returns None if not available.
+    
+    """
+    
+    try:
+        with open(os.path.join(path, ".downscale_manifest.json")) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    
+    # ignore incomplete manifest
+    if not {"version","inputs","params","outputs","relink",
+            "files"} <= manifest.keys():
+        return None
+    
+    return manifest
+    
+def _get_output_state(path, name, output_format):
+    """ Get state (size and modification time) of a saved model, i.e., of
+    the spreadsheet file or of each parquet file by sheet, None if the
+    model is not saved.
+    
+    """
+    
+    if output_format == "xlsx":
+        f = path+name+".xlsx"
+        if not os.path.isfile(f):
+            return None
+        st = os.stat(f)
+        return [st.st_size, st.st_mtime_ns]
+    
+    if not os.path.isdir(path+name):
+        return None
+    state = dict()
+    for f in os.listdir(path+name):
+        if f.endswith(".parquet"):
+            st = os.stat(os.path.join(path+name, f))
+            state[f[:-len(".parquet")]] = [st.st_size, st.st_mtime_ns]
+    
+    return state
+
+def _get_damaged_outputs(path, files, output_format):
+    """ Get saved models that are missing or changed compared to the state
+    saved in the manifest, with the names of the missing or changed sheets
+    as values (None if the complete model is to be saved again).
+    
+    """
+    
+    damaged = dict()
+    for k,saved in files.items():
+        current = _get_output_state(path, k, output_format)
+        if current == saved:
+            continue
+        if not isinstance(saved, dict) or not isinstance(current, dict):
+            damaged[k] = None
+            continue
+        # other files added to the directory are ignored
+        sns = {sn for sn,v in saved.items() if current.get(sn) != v}
+        if sns:
+            damaged[k] = sns
+    
+    return damaged
+
+def _remove_manifest(path):
+    """ Remove manifest of downscaled model if available.
+    
+    """
+    
+    f = os.path.join(path, ".downscale_manifest.json")
+    if os.path.isfile(f):
+        os.remove(f)
+
+def _save_manifest(path, manifest):
+    """ Save manifest of downscaled model.
+    
+    """
+    
+    f = os.path.join(path, ".downscale_manifest.json")
+    with open(f+".tmp", "w") as fh:
+        json.dump(manifest, fh)
+    os.replace(f+".tmp", f)
@@ -7,12 +7,21 @@ Copyright (C) 2025 Leonhard Hofbauer, licensed under a MIT license
 """
 
 import os
+import io
+import re
 import yaml
 import pathlib
-import copy
 
 import subprocess
 import logging
+import hashlib
+import json
+import shutil
+import time
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping, MutableMapping
 
 import pandas as pd
 import numpy as np
@@ -29,33 +38,418 @@ try:
 except ImportError:
     highspy = None 
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
 
 pd.set_option('future.no_silent_downcasting', True)
 
 logger = logging.getLogger(__name__)
 
+# version of cache format, to be increased if cached tables change
+_CACHE_VERSION = 2
+
+
+class DataConfig(dict):
+    """ Configuration of OSeMOSYS data (in the format used for otoole).
+    
+    Dictionary with lookups that are derived once from the entries and
+    reused, e.g., names of sets and parameters. Lookups are recomputed if
+    entries are added or removed, but not if entries are modified in place,
+    for which the derivation methods (rename_sets, without) are to be used.
+    All functions that take a data config accept a dict or a DataConfig.
+    
+    Parameters
+    ----------
+    *args, **kwargs
+        Entries as for dict.
+
+    """
+    
+    def __init__(self, *args, **kwargs):
+        
+        super().__init__(*args, **kwargs)
+        self._lookups = dict()
+    
+    @classmethod
+    def from_file(cls, path):
+        """ Load data config from yaml file.
+        
+        Parameters
+        ----------
+        path : str
+            Path to data config file.
+
+        Returns
+        -------
+        DataConfig
+            Data config.
+
+        """
+        
+        with open(path) as s:
+            try:
+                return cls(yaml.safe_load(s))
+            except yaml.YAMLError as exc:
+                logger.error(exc)
+                raise
+    
+    @classmethod
+    def wrap(cls, dcfg):
+        """ Get data config as DataConfig, i.e., dcfg itself if already a
+        DataConfig.
+        
+        """
+        
+        return dcfg if isinstance(dcfg, cls) else cls(dcfg)
+    
+    def _lookup(self, name, func):
+        
+        if name not in self._lookups:
+            self._lookups[name] = func()
+            
+        return self._lookups[name]
+    
+    def _modified(self):
+        
+        self._lookups = dict()
+    
+    def __setitem__(self, k, v):
+        
+        super().__setitem__(k, v)
+        self._modified()
+    
+    def __delitem__(self, k):
+        
+        super().__delitem__(k)
+        self._modified()
+    
+    def pop(self, *args):
+        
+        v = super().pop(*args)
+        self._modified()
+        
+        return v
+    
+    def popitem(self):
+        
+        v = super().popitem()
+        self._modified()
+        
+        return v
+    
+    def setdefault(self, k, default=None):
+        
+        v = super().setdefault(k, default)
+        self._modified()
+        
+        return v
+    
+    def update(self, *args, **kwargs):
+        
+        super().update(*args, **kwargs)
+        self._modified()
+    
+    def clear(self):
+        
+        super().clear()
+        self._modified()
+    
+    def __reduce__(self):
+        
+        return (type(self), (dict(self),))
+    
+    @property
+    def sets(self):
+        """ Names of sets. """
+        return self._lookup("sets", lambda: [k for k,v in self.items()
+                                             if v["type"] == "set"])
+    
+    @property
+    def params(self):
+        """ Names of parameters. """
+        return self._lookup("params", lambda: [k for k,v in self.items()
+                                               if v["type"] == "param"])
+    
+    @property
+    def results(self):
+        """ Names of results. """
+        return self._lookup("results", lambda: [k for k,v in self.items()
+                                                if v["type"] == "result"])
+    
+    @property
+    def inputs(self):
+        """ Names of sets and parameters, i.e., all but results. """
+        return self._lookup("inputs", lambda: [k for k,v in self.items()
+                                               if v["type"] != "result"])
+    
+    @property
+    def ft_params(self):
+        """ Names of multi-scale (fratoo) parameters. """
+        return self._lookup("ft_params", lambda: [k for k in self.keys()
+                                                  if k.startswith("ft_")])
+    
+    @property
+    def short_names(self):
+        """ Short names mapped to full names. """
+        return self._lookup("short_names",
+                            lambda: {v["short_name"]:k
+                                     for k,v in self.items()
+                                     if "short_name" in v.keys()})
+    
+    @property
+    def sheet_names(self):
+        """ Names mapped to sheet names, i.e., short names if available. """
+        return self._lookup("sheet_names",
+                            lambda: {k:v.get("short_name", k)
+                                     for k,v in self.items()})
+    
+    @property
+    def defaults(self):
+        """ Default values of parameters and results. """
+        return self._lookup("defaults", lambda: {k:v["default"]
+                                                 for k,v in self.items()
+                                                 if v["type"] != "set"})
+    
+    @property
+    def index_positions(self):
+        """ Positions of sets in the indices of parameters and results. """
+        return self._lookup("index_positions",
+                            lambda: {k:{i:n for n,i
+                                        in enumerate(v["indices"])}
+                                     for k,v in self.items()
+                                     if "indices" in v.keys()})
+    
+    def rename_sets(self, mapping):
+        """ Get data config with sets renamed.
+        
+        Entries are shared with this data config unless they change, i.e.,
+        no (deep) copy is created. Indices of parameters are renamed and
+        renamed sets are moved to the end.
+        
+        Parameters
+        ----------
+        mapping : dict
+            Dictionary mapping old to new set names.
+
+        Returns
+        -------
+        DataConfig
+            Data config with renamed sets.
+
+        """
+        
+        d = dict()
+        for k,v in self.items():
+            if k in mapping:
+                continue
+            if v["type"] == "param" and any(i in mapping
+                                             for i in v["indices"]):
+                v = dict(v)
+                v["indices"] = [mapping.get(i, i) for i in v["indices"]]
+            d[k] = v
+        for k,n in mapping.items():
+            d[n] = self[k]
+        
+        return type(self)(d)
+    
+    def without(self, names):
+        """ Get data config without some entries, sharing the others.
+        
+        Parameters
+        ----------
+        names : list
+            Names of entries to be excluded, e.g., ft_params.
+
+        Returns
+        -------
+        DataConfig
+            Data config without the entries.
+
+        """
+        
+        names = set(names)
+        
+        return type(self)({k:v for k,v in self.items() if k not in names})
+
+
+class ScenarioData(MutableMapping):
+    """ Dictionary-like container of the data of a single scenario.
+    
+    Parameter data is stored as a base shared across scenarios (rows
+    defined for all scenarios) and override rows specific to the scenario.
+    Full DataFrames are materialized when first accessed and kept. Base and
+    override rows can also be given as callables, which are only called
+    when the parameter is first accessed (lazy resolution). Values that are
+    set explicitly, e.g., sets, are stored as they are.
+    
+    Parameters
+    ----------
+    base : dict, optional
+        Dictionary with parameter names as keys and DataFrames with the
+        shared rows (or callables returning them) as values. The
+        DataFrames are not modified, resolved callables are replaced by
+        their DataFrame. The default is None.
+    years : range, optional
+        Years of the scenario, used to filter shared rows of parameters
+        indexed over YEAR. All years are used if None. The default is None.
+
+    """
+    
+    def __init__(self, base=None, years=None):
+        
+        self._base = base if base is not None else dict()
+        self._years = years
+        # override rows (or callables) not yet materialized and
+        # materialized/set values
+        self._delta = dict()
+        self._data = dict()
+        # keys in order of insertion
+        self._keys = dict()
+    
+    def __getitem__(self, k):
+        
+        if k not in self._data:
+            if k not in self._delta:
+                raise KeyError(k)
+            self._data[k] = self._materialize(k)
+            del self._delta[k]
+            
+        return self._data[k]
+    
+    def __contains__(self, k):
+        
+        # avoid materializing parameters on membership checks
+        return k in self._keys
+    
+    def __setitem__(self, k, v):
+        
+        self._delta.pop(k, None)
+        self._data[k] = v
+        self._keys[k] = None
+    
+    def __delitem__(self, k):
+        
+        if k not in self._keys:
+            raise KeyError(k)
+        self._delta.pop(k, None)
+        self._data.pop(k, None)
+        del self._keys[k]
+    
+    def __iter__(self):
+        
+        return iter(list(self._keys))
+    
+    def __len__(self):
+        
+        return len(self._keys)
+    
+    def __repr__(self):
+        
+        return (f"{type(self).__name__}({len(self)} items,"
+                f" {len(self._delta)} not materialized)")
+    
+    def copy(self):
+        """ Copy the container, sharing base and override rows and copying
+        materialized values.
+        
+        Returns
+        -------
+        ScenarioData
+            Copy of the container.
+
+        """
+        
+        c = type(self)(base=self._base, years=self._years)
+        c._delta = dict(self._delta)
+        c._data = {k:v.copy(deep=True) for k,v in self._data.items()}
+        c._keys = dict(self._keys)
+        
+        return c
+    
+    def _set_delta(self, k, df):
+        """ Set the override rows of a parameter.
+        
+        """
+        
+        self._data.pop(k, None)
+        self._delta[k] = df
+        self._keys[k] = None
+    
+    def _materialize(self, k):
+        """ Combine shared and override rows of a parameter, with override
+        rows taking precedence.
+        
+        """
+        
+        delta = self._delta[k]
+        if k not in self._base:
+            # callables return new DataFrames, other rows might be shared
+            return delta() if callable(delta) else delta.copy()
+        if callable(delta):
+            delta = delta()
+        
+        # resolve shared rows once for all containers sharing the base
+        if callable(self._base[k]):
+            self._base[k] = self._base[k]()
+        base = self._base[k]
+        if self._years is not None and "YEAR" in base.index.names:
+            base = base.take(np.flatnonzero(
+                    base.index.get_level_values("YEAR").isin(self._years)))
+        if delta.empty:
+            return base.copy()
+        
+        df = pd.concat([base, delta])
+        
+        return df.take(np.flatnonzero(~df.index.duplicated(keep="last")))
+
 
 
 def read_spreadsheets(path,
                       scenario_list,
                       dcfg,
-                      file_extensions = [".xlsx",".xls",".ods"],
+                      file_extensions = [".xlsx",".xls",".ods",".parquet"],
                       read_recursively = False,
                       use_markers = False,
                       table_marker = None,
                       all_marker = "#ALL#",
                       set_defaults = {},
-                      rounding = False):
+                      rounding = False,
+                      cache_dir = None,
+                      cache_size = 2**30,
+                      n_workers = 1,
+                      engine = None,
+                      scenario_storage = "full",
+                      lazy = False):
     """ Read scenario data from spreadsheet files.
     
     Parameters
     ----------
-    path : str
-        Path to directory or spreadsheet file.
+    path : str or dict
+        Path to directory or spreadsheet file, or dictionary of workbooks
+        in memory, i.e., of dictionaries of sheet DataFrames with the header
+        row as columns (e.g., as returned by read_workbook with
+        keep_default_na=False), which are not cached.
     file_extension: list of str, optional
         List of strings of file extensions that will be considered as input
-        data files. The default is [".xlsx",".xls",".ods"].
-    dcfg : dict
+        data files. If ".parquet" is included, directories with parquet
+        files (see write_workbook) are read as spreadsheet files. The default
+        is [".xlsx",".xls",".ods",".parquet"].
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the same
         format as used for otoole).
     read_recursively: bool, optional
@@ -79,28 +473,61 @@ def read_spreadsheets(path,
     list_scenarios: list of dicts
         List of dictionaries describing each scenario (name, model, levers
         timehorizon).
-
+    cache_dir: str, optional
+        Path to directory used to cache the data tables parsed from each
+        spreadsheet file (requires pyarrow). Tables are reused if the file
+        content and relevant configuration are unchanged. No cache is used
+        if None. The default is None.
+    cache_size: int, optional
+        Maximum size of the cache in bytes. Least recently used entries are
+        removed if the size is exceeded. The default is 2**30 (1 GiB).
+    n_workers: int, optional
+        Number of worker processes used to parse spreadsheet files in
+        parallel. Data tables are returned in the order of the files. The
+        default is 1.
+    engine: str, optional
+        Engine used to read spreadsheet files, see read_workbook. The
+        default is None.
+    scenario_storage: str, optional
+        How scenario data is stored, i.e., 'full' for a dictionary of
+        complete DataFrames for each scenario, or 'delta' for a ScenarioData
+        container for each scenario, storing the rows defined for all
+        scenarios once and only the scenario-specific rows for each
+        scenario. The default is 'full'.
+    lazy: bool, optional
+        If to resolve parameters only when first accessed, returning a
+        ScenarioData container for each scenario. Sets are always read.
+        The default is False.
 
     Returns
     -------
     data : dict of dicts
-        Dictionary with a dictionary of DataFrames with parameters and sets for
-        each scenario.
+        Dictionary with a dictionary (or ScenarioData container) of
+        DataFrames with parameters and sets for each scenario.
 
     """
     
+    if scenario_storage not in ["full","delta"]:
+        raise ValueError(f"Scenario storage '{scenario_storage}' is not"
+                         " implemented.")
+    
     logging.info("Parsing data tables from spreadsheet files.")
     
     # load data spreadsheets
-    if not os.path.exists(path):
+    if isinstance(path, Mapping):
+        files = list(path.keys())
+    elif not os.path.exists(path):
         raise FileNotFoundError("Directory/file does not exist.")
-    if os.path.isfile(path):
+    elif os.path.isfile(path):
         if not path.endswith(tuple(file_extensions)):
             raise ValueError("File extension is not recognized.")                     
         files = [os.path.join(os.path.dirname(path),os.path.basename(path))]
     elif read_recursively is False:
         files = os.listdir(path)
-        files = [os.path.join(path,f) for f in files if f.endswith(tuple(file_extensions))]
+        files = [os.path.join(path,f) for f in files
+                 if f.endswith(tuple(file_extensions))
+                 or (".parquet" in file_extensions
+                     and _is_table_dir(os.path.join(path,f)))]
     else:
         files = []
         for root, dirs, fs in os.walk(path):
@@ -112,93 +539,35 @@ def read_spreadsheets(path,
     # cfg["TECHGROUP"] = {"type":"set",
     #                     "dtype":"str"}   
      
-    sets = [k for k,v in dcfg.items() if v["type"]=="set"]
+    dcfg = DataConfig.wrap(dcfg)
+    sets = dcfg.sets
         
     # list of data tables
     dts = list()
 
-    # import all spreadsheet files
-    for f in files:
-        # import file
-        sf = pd.read_excel(f,
-                           sheet_name=None,
-                           header=None,
-                           na_values=[""],
-                           keep_default_na=False)
-        
-        # iterate through sheets
-        for df in sf.values():
-            
-            if use_markers is False:
-                dt = df
-                # remove any additional rows
-                if dt.iloc[:,0].isna().any():
-                    li = dt.iloc[:,0].isna().idxmax()
-                    dt = dt.loc[:li,:].iloc[:-1]
-                
-                # remove any additional columns
-                if dt.iloc[0,:].isna().any():
-                    lc = dt.iloc[0,:].isna().idxmax()
-                    dt = dt.loc[:,:lc].iloc[:,:-1]   
-                
-                # set column names and reset index   
-                dt.columns = dt.iloc[0]
-                dt = dt[1:]
-                dt = dt.reset_index(drop=True)
-                
-                # check if PARAMETER is used instead of SET column and rename
-                se = [n for n,v in dcfg.items() if v["type"] == "set"]
-                if "PARAMETER" in dt.columns and not dt.empty and dt.loc[0,"PARAMETER"] in se:
-                    dt = dt.rename(columns={"PARAMETER":"SET"})
-                
-                # replace short parameter names with full names
-                ns ={v["short_name"]:n for n,v in dcfg.items()
-                     if "short_name" in v.keys()}
-                dt = dt.replace(ns)
-                
-                # add to list of data tables
-                dts.append(dt)
-                
-            else: 
-                # get location of marker
-                loc = np.where(df==table_marker)
-                # skip to next sheet if no marker
-                if loc[0].size == 0:
-                    continue
-                # iterate through each marker location
-                for r,c in zip(loc[0],loc[1]):
-                    dt = df.iloc[r:,c:]
-                    
-                    # remove any additional rows
-                    if dt.iloc[:,0].isna().any():
-                        li = dt.iloc[:,0].isna().idxmax()
-                        dt = dt.loc[:li,:].iloc[:-1]
-                    
-                    # remove any additional columns
-                    if dt.iloc[1,:].isna().any():
-                        lc = dt.iloc[1,:].isna().idxmax()
-                        dt = dt.loc[:,:lc].iloc[:,:-1]   
-                    
-                    # remove marker row
-                    dt = dt.iloc[1:,:]
-                    
-                    # set column names and reset index   
-                    dt.columns = dt.iloc[0]
-                    dt = dt[1:]
-                    dt = dt.reset_index(drop=True)
-                    
-                    # check if PARAMETER is used instead of SET column and rename
-                    se = [n for n,v in dcfg.items() if v["type"] == "set"]
-                    if "PARAMETER" in dt.columns and not dt.empty and dt.loc[0,"PARAMETER"] in se:
-                        dt = dt.rename(columns={"PARAMETER":"SET"})
-                    
-                    # replace short parameter names with full names
-                    ns ={v["short_name"]:n for n,v in dcfg.items()
-                         if "short_name" in v.keys()}
-                    dt = dt.replace(ns)
-                    
-                    # add to list of data tables
-                    dts.append(dt)
+    # check if cache can be used
+    if cache_dir is not None and pa is None:
+        logger.warning("Caching of data tables is not available as the"
+                       " required dependency (pyarrow) is not available.")
+        cache_dir = None
+
+    # import all spreadsheet files, in parallel if required, or get the
+    # tables of workbooks in memory
+    args = [(f, dcfg, use_markers, table_marker, engine, cache_dir,
+             cache_size)
+            for f in files]
+    if isinstance(path, Mapping):
+        for f in files:
+            dts.extend(_get_frame_tables(path[f], dcfg, use_markers,
+                                         table_marker))
+    elif n_workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers,
+                                                 len(files))) as ex:
+            for fdts in ex.map(_get_file_tables, *zip(*args)):
+                dts.extend(fdts)
+    else:
+        for a in args:
+            dts.extend(_get_file_tables(*a))
                 
     logging.info(f"{len(dts)} data tables read from the spreadsheet file(s).")
     
@@ -208,15 +577,54 @@ def read_spreadsheets(path,
     # create dataframe for set and parameter data
 
         
-    setsval = pd.concat([dt for dt in dts if "SET" in dt.columns])
+    setsval = pd.concat([dt for dt in dts if "SET" in dt.columns],
+                        ignore_index=True)
     params = pd.concat([pd.DataFrame([],columns=sets+["VALUE"])]
-                       +[dt for dt in dts if ("PARAMETER" in dt.columns)])
+                       +[dt for dt in dts if ("PARAMETER" in dt.columns)],
+                       ignore_index=True)
+    params = _parse_value_columns(params, _get_read_schema(dcfg))
 
     # set default value for sets if provided and no value given in data files
     for k,v in set_defaults.items():
         if k in sets:
             params[k] = params[k].fillna(v)
- 
+    
+    # get rows relevant for each scenario, splitting the (comma-separated)
+    # levers only once for all scenarios
+    setslev = setsval["SCENARIO"].str.split(",").explode()
+    paramslev = params["SCENARIO"].str.split(",").explode()
+    
+    setsrows = {s["name"]:_get_scenario_rows(setsval, setslev, s, all_marker)
+                for s in scenario_list}
+    paramsrows = {s["name"]:_get_scenario_rows(params, paramslev, s, all_marker)
+                  for s in scenario_list}
+    
+    # prepare parameter data once for all scenarios (when first used), i.e.,
+    # set index and dtypes and rearrange, partitioning rows by parameter
+    years = sorted(set().union(*[range(*s["timehorizon"])
+                                 for s in scenario_list]))
+    rows = np.logical_or.reduce([np.zeros(len(params), dtype=bool)]
+                                + list(paramsrows.values()))
+    pgroups = dict(tuple(params.loc[rows].groupby("PARAMETER", sort=False)))
+    
+    pdata = _PreparedParameters(pgroups, params.iloc[:0], dcfg, years,
+                                rounding, all_marker)
+    
+    # if delta storage, get rows defined for all scenarios once for each
+    # model, shared by the scenarios of the model
+    bases = dict()
+    if scenario_storage == "delta":
+        for s in scenario_list:
+            if s["model"] in bases:
+                continue
+            modelrows = ((params["MODEL"] == s["model"])
+                         | (params["MODEL"] == all_marker)).to_numpy()
+            bases[s["model"]] = dict()
+            for k in pdata:
+                f = functools.partial(_get_parameter_base, pdata, k,
+                                      modelrows, s)
+                bases[s["model"]][k] = f if lazy else f()
+    
     # create dict for scenario to write to spreadsheets
     md = dict()
     
@@ -226,7 +634,16 @@ def read_spreadsheets(path,
     for s in scenario_list:
         
             
-        md[s["name"]] = dict()
+        if scenario_storage == "delta":
+            md[s["name"]] = ScenarioData(base=bases[s["model"]],
+                                         years=range(*s["timehorizon"]))
+        elif lazy:
+            md[s["name"]] = ScenarioData()
+        else:
+            md[s["name"]] = dict()
+        
+        sgroups = dict(tuple(setsval.loc[setsrows[s["name"]]].groupby("SET",
+                                                               sort=False)))
         
         # iterate through parameters and sets
         for k,v in dcfg.items():
@@ -234,11 +651,7 @@ def read_spreadsheets(path,
             # if set, process accordingly
             if v["type"] == "set":
                 # get all relevant values
-                md[s["name"]][k] = setsval.loc[((setsval["MODEL"] == s["model"]) |
-                                       (setsval["MODEL"] == all_marker)) &
-                                          ((setsval["SCENARIO"].str.split(",",expand=True).isin(s["levers"]).any(axis=1)) |
-                                       (setsval["SCENARIO"] == all_marker)) &
-                                       (setsval["SET"] == k)]
+                md[s["name"]][k] = sgroups.get(k, setsval.iloc[:0])
                 md[s["name"]][k] =md[s["name"]][k].loc[:,[c for c in ["VALUE",
                                                        "DESCRIPTION",
                                                        "UNIT",
@@ -278,89 +691,226 @@ def read_spreadsheets(path,
                     
             # if parameter, process accordingly
             if v["type"] == "param":
-                # get all relevant values
-                md[s["name"]][k] = params.loc[((params["MODEL"] == s["model"]) |
-                                       (params["MODEL"] == all_marker)) &
-                                         ((params["SCENARIO"].str.split(",",expand=True).isin(s["levers"]).any(axis=1)) |
-                                       (params["SCENARIO"] == all_marker)) &
-                                       (params["PARAMETER"] == k)]
-                # drop irrelevant columns
-                md[s["name"]][k] = md[
-                        s["name"]][k].drop(["MODEL","PARAMETER"]
-                                         + [c for c in md[s["name"]][k].columns
-                                            if ("YEAR" in v["indices"])
-                                            and c not in [s for s in v["indices"]
-                                                          if s !="YEAR"]
-                                            +list(range(*s["timehorizon"]))+["SCENARIO"]]
-                                         + [c for c in md[s["name"]][k].columns
-                                            if ("YEAR" not in v["indices"])
-                                            and c not in (v["indices"]+["VALUE"]+["SCENARIO"])]
-                                         ,axis=1)
-                # set and sort index
-                md[s["name"]][k] = md[
-                        s["name"]][k].set_index(["SCENARIO"]+[s for s in v["indices"]
-                                               if s != "YEAR"])
-                md[s["name"]][k] = md[s["name"]][k].sort_index()
-            
-                
-                # set dtypes
-                md[s["name"]][k] = md[s["name"]][k].astype(v["dtype"])
-                md[s["name"]][k] = md[s["name"]][k].replace("nan",pd.NA)
-                if "YEAR" in v["indices"]:
-                    md[s["name"]][k].columns = md[s["name"]][k].columns.astype(dcfg["YEAR"]
-                                                               ["dtype"])
-                
-                # remove years not to be used
-                if "YEAR" in v["indices"]:
-                    md[s["name"]][k] = md[s["name"]][k].loc[:,md[
-                                s["name"]][k].columns.isin(range(*s["timehorizon"]))]
-                    
-                    
-                # if float round if required
-                if (v["dtype"] == "float") and (rounding != False):
-                    md[s["name"]][k] = md[s["name"]][k].round(rounding)
-                    
-                # rearrange params indexed over YEAR
-                if "YEAR" in v["indices"]:
-                    md[s["name"]][k].columns.name = "YEAR"
-                    md[s["name"]][k] = md[s["name"]][k].stack()
-                    md[s["name"]][k].name = "VALUE"
-                    md[s["name"]][k] = md[s["name"]][k].to_frame()      
-                
-                # check for duplicates
-                if (md[s["name"]][k].xs(all_marker,level="SCENARIO").index.has_duplicates
-                    if all_marker in md[s["name"]][k].index.get_level_values("SCENARIO") else False  or
-                    md[s["name"]][k].loc[ md[s["name"]][k].index.get_level_values("SCENARIO")!=all_marker].index.has_duplicates):
-
-                    logging.error(f"The values of parameter '{k}' are not unique"
-                                    f" for scenario '{s['name']}' with model '{s['model']}'.")
-                    logging.debug("The duplicates are:")
-                    logging.debug(md[s["name"]][k][md[s["name"]][k].index.duplicated(keep=False)])
-                    raise ValueError(f"The values of parameter '{k}' are not "
-                                    f"unique for scenario '{s['name']}' with model '{s['model']}'.")
-                # sort so that rows defined for all scenarios are appearing first
-                sorter = [all_marker] + [se for se in md[s["name"]][k].index.get_level_values("SCENARIO").unique() if se != all_marker]
-                md[s["name"]][k] =  md[s["name"]][k].sort_values(by="SCENARIO",
-                                                       key=lambda column: column.map(lambda e: sorter.index(e)))
-                 
-                # drop scenario level
-                md[s["name"]][k] = md[s["name"]][k].droplevel("SCENARIO")
-                
-                # if duplicates, only use second/last values (specifically defined for
-                # the scenario)
-                md[s["name"]][k] = md[s["name"]][k].loc[~md[s["name"]][k].index.duplicated(keep="last")]
-
-    
-                if md[s["name"]][k].empty:
-                    logging.debug(f"The values for parameter '{k}' are empty "
-                                    f"for scenario '{s['name']}' with model '{s['model']}'.")
-                    # md[s["name"]][k]= md[s["name"]][k].astype(str)
-                    # md[s["name"]][k].loc["",:] = ""
+                f = functools.partial(_get_scenario_parameter, pdata, k,
+                                      paramsrows[s["name"]], s,
+                                      scenario_storage == "delta")
+                if scenario_storage == "delta" or lazy:
+                    md[s["name"]]._set_delta(k, f if lazy else f())
+                else:
+                    md[s["name"]][k] = f()
                     
     logging.info("Processed data tables and arranged scenario data.")
     
     return md
 
+def invalidate_cache(cache_dir,
+                     path=None):
+    """ Invalidate cached data tables of spreadsheet files.
+    
+    Parameters
+    ----------
+    cache_dir : str
+        Path to cache directory as used with read_spreadsheets.
+    path : str, optional
+        Path to spreadsheet file or directory for which cached data tables
+        are to be removed. All entries are removed if None. The default is
+        None.
+
+    Returns
+    -------
+    n : int
+        Number of removed cache entries.
+
+    """
+    
+    if not os.path.isdir(cache_dir):
+        return 0
+    
+    n = 0
+    for e in os.scandir(cache_dir):
+        if not e.is_dir():
+            continue
+        if path is not None:
+            try:
+                with open(os.path.join(e.path, "meta.json")) as fh:
+                    source = json.load(fh)["source"]
+            except (OSError, ValueError, KeyError):
+                source = None
+            if (source is not None
+                and os.path.commonpath([source, os.path.abspath(path)])
+                != os.path.abspath(path)):
+                continue
+        shutil.rmtree(e.path, ignore_errors=True)
+        n += 1
+        
+    logging.info(f"Removed {n} entries from cache.")
+    
+    return n
+
+def read_workbook(path,
+                  engine=None,
+                  sheet_name=None,
+                  **kwargs):
+    """ Read sheets from a spreadsheet file or equivalent tabular files.
+    
+    Spreadsheet files are read using pandas.read_excel with the selected
+    engine. Csv and parquet files are passed through as a single sheet
+    (named after the file), and directories are read as a workbook with one
+    sheet per csv or parquet file.
+    
+    Parameters
+    ----------
+    path : str
+        Path to spreadsheet file, csv or parquet file, or directory.
+    engine : str, optional
+        Engine used to read spreadsheet files, i.e., 'calamine' (Rust-based,
+        requires python-calamine), 'openpyxl' (read-only mode), or None to
+        use the pandas default for the file type. If 'calamine' is not
+        available, 'openpyxl' is used. The default is None.
+    sheet_name : str or None, optional
+        Name of sheet to read, or None to read all sheets. The default is
+        None.
+    **kwargs
+        Further arguments passed to pandas.read_excel (or pandas.read_csv
+        for csv files). Only the header argument and empty cells as read
+        with keep_default_na (and na_values) are applied to parquet files.
+
+    Returns
+    -------
+    DataFrame or dict of DataFrames
+        Sheet data, or dictionary with sheet names as keys if sheet_name is
+        None.
+
+    """
+    
+    # pass through csv and parquet files
+    if os.path.isdir(path) or path.endswith((".csv",".parquet")):
+        if os.path.isdir(path):
+            files = sorted(f for f in os.listdir(path)
+                           if f.endswith((".csv",".parquet")))
+            files = {os.path.splitext(f)[0]:os.path.join(path,f)
+                     for f in files}
+        else:
+            files = {os.path.splitext(os.path.basename(path))[0]:path}
+        if sheet_name is not None:
+            if sheet_name not in files:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found.")
+            return _read_table_file(files[sheet_name], **kwargs)
+        return {n:_read_table_file(f, **kwargs) for n,f in files.items()}
+    
+    if engine == "calamine" and python_calamine is None:
+        logger.warning("The calamine engine is not available as the required"
+                       " dependency (python-calamine) is not available."
+                       " Using openpyxl instead.")
+        engine = "openpyxl"
+    if engine == "openpyxl" and not path.endswith((".xlsx",".xlsm")):
+        # openpyxl only supports xlsx files, use pandas default otherwise
+        engine = None
+        
+    return pd.read_excel(path,
+                         sheet_name=sheet_name,
+                         engine=engine,
+                         **kwargs)
+
+def write_workbook(path,
+                   sheets,
+                   index=False,
+                   engine=None,
+                   update=False):
+    """ Write sheets to a spreadsheet file or a directory of parquet files.
+    
+    Paths with a spreadsheet file extension are written as spreadsheet file
+    using the selected engine. Other paths are written as directory with
+    one parquet file per sheet (named after the sheet), which can be read
+    using read_workbook and read_spreadsheets. Parquet files of other sheets
+    in the directory are removed, unless the directory is updated. Files are
+    written to a temporary file first and then moved in place, i.e.,
+    existing files are only replaced by completely written files.
+    
+    Parameters
+    ----------
+    path : str
+        Path to spreadsheet file or directory.
+    sheets : dict of DataFrames
+        Sheet data with sheet names as keys.
+    index : bool or list, optional
+        If to write the index of the sheets (as columns), or list of names
+        of sheets for which the index is written. The default is False.
+    engine : str, optional
+        Engine used to write spreadsheet files, i.e., 'openpyxl' (using
+        pandas.ExcelWriter), 'xlsxwriter' (writing rows in constant memory
+        mode, without formatting of header and index cells, requires
+        xlsxwriter), or None for 'openpyxl'. If 'xlsxwriter' is not
+        available, 'openpyxl' is used. The default is None.
+    update : bool, optional
+        If to update a directory of parquet files, i.e., to only write the
+        sheets provided and keep other sheets. Sheets provided as None are
+        removed. This is not applicable for spreadsheet files, which are
+        always written completely. The default is False.
+
+    Raises
+    ------
+    ImportError
+        Raised if parquet files are to be written and pyarrow is not
+        available.
+
+    Returns
+    -------
+    None.
+
+    """
+    
+    def _index(n):
+        return n in index if isinstance(index, (list, tuple, set)) else index
+    
+    if path.endswith((".xlsx",".xlsm",".xls",".ods")):
+        if engine == "xlsxwriter" and xlsxwriter is None:
+            logger.warning("The xlsxwriter engine is not available as the"
+                           " required dependency (xlsxwriter) is not"
+                           " available. Using openpyxl instead.")
+            engine = "openpyxl"
+        
+        tmp = os.path.join(os.path.dirname(path),
+                           f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        try:
+            if engine == "xlsxwriter":
+                _write_xlsx_rows(tmp, sheets, _index)
+            else:
+                with open(tmp, "wb") as fh:
+                    with pd.ExcelWriter(fh, engine="openpyxl") as writer:
+                        for n,df in sheets.items():
+                            df.to_excel(writer, sheet_name=n,
+                                        merge_cells=False, index=_index(n))
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return
+    
+    if pa is None:
+        raise ImportError("Writing parquet files requires pyarrow, which is"
+                          " not available.")
+    
+    os.makedirs(path, exist_ok=True)
+    for n,df in sheets.items():
+        if df is None:
+            if os.path.exists(os.path.join(path, n+".parquet")):
+                os.remove(os.path.join(path, n+".parquet"))
+            continue
+        tmp = os.path.join(path, f".{n}.parquet.{os.getpid()}.tmp")
+        try:
+            _write_table_file(df.reset_index() if _index(n) else df, tmp)
+            os.replace(tmp, os.path.join(path, n+".parquet"))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    if update:
+        return
+    for f in os.listdir(path):
+        if f.endswith(".parquet") and f[:-len(".parquet")] not in sheets:
+            os.remove(os.path.join(path, f))
+
+
 def create_multiscale_model(data,
                             dcfg):
     """ Create multi-scale model for each scenario using the fratoo package.
@@ -369,7 +919,7 @@ def create_multiscale_model(data,
     ----------
     data : dict
         Data dictionary with one or more scenarios.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -392,7 +942,9 @@ def create_multiscale_model(data,
     
     for s in data.keys():
         mod[s] = ft.Model()
-        mod[s].init_from_dictionary(data[s], config=dcfg, process=False)
+        # fratoo requires complete, decoded DataFrames
+        sd = {k:_decode_frame(v) for k,v in data[s].items()}
+        mod[s].init_from_dictionary(sd, config=dcfg, process=False)
         mod[s].process_input_data(sep="9")
         
     logging.info("Created fratoo model(s).")
@@ -417,7 +969,7 @@ def get_multiscale_run_data(mod,
     region_sep : str
         Region separator to applied when REGION set values are integrated into
         other sets' values, e.g., TECHNOLOGY.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -452,9 +1004,8 @@ def get_multiscale_run_data(mod,
     
     logging.info("Created run data for multiscale model.")
     logging.info("Updating data configuration dictionary.")
-    for k in list(dcfg.keys()):
-        if k.startswith("ft_"):
-            dcfg.pop(k)
+    dcfg = DataConfig.wrap(dcfg)
+    dcfg = dcfg.without(dcfg.ft_params)
             
     logging.info("Updated data configuration dictionary.")
     
@@ -472,7 +1023,7 @@ def rename_set(mapping,
         Dictionary mapping old to new set names.
     data : dict
         Data dictionary with one or more scenarios.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
     
@@ -481,99 +1032,190 @@ def rename_set(mapping,
     data : dict of dicts
         Dictionary with a dictionary of DataFrames with parameters and set for
         each scenario.
-    dcfg : dict
+    dcfg : DataConfig
         Updated config dictionary.
     
     """   
     logging.info("Rename set names.")
     
+    dcfg = DataConfig.wrap(dcfg)
+    
     for s in data.keys():
-        # iterate through parameters and sets
-        for k,v in dcfg.items():
-            # if param, process accordingly
-            if v["type"] == "param":
-                for se in mapping.keys():
-                    if se in v["indices"]:
-                        data[s][k].index = data[s][k].index.rename([s if s!=se
-                                                                else mapping[se]
-                                                                for s
-                                                                in data[s][k].index.names])
+        # iterate through parameters
+        for k in dcfg.params:
+            for se in mapping.keys():
+                if se in dcfg[k]["indices"]:
+                    data[s][k].index = data[s][k].index.rename([s if s!=se
+                                                            else mapping[se]
+                                                            for s
+                                                            in data[s][k].index.names])
         # adjust set name
         for se in mapping.keys():
             data[s][mapping[se]] = data[s].pop(se)
             
 
     # adjust config file
-    for k,v in dcfg.items():
-        if dcfg[k]["type"]=="param":
-            dcfg[k]["indices"] =  [i if i not in mapping.keys() else mapping[i]
-                                  for i in dcfg[k]["indices"]]
-    for se in mapping.keys():
-        dcfg[mapping[se]] = dcfg.pop(se)
+    dcfg = dcfg.rename_sets(mapping)
     
     logging.info("Renamed set names")
     
     return data, dcfg
-        
-def check_data(data, dcfg):
-    """ Check scenario data for issues.
+
+def encode_sets(data,
+                dcfg,
+                vocabulary=None):
+    """ Encode set values as categoricals with a shared vocabulary per set.
+    
+    Set values in the index levels of parameters and in the VALUE column of
+    sets are converted to categoricals, with the same categories (the
+    vocabulary of the set) across all scenarios and parameters. Only sets
+    of dtype str are encoded. Functions of this module accept encoded data
+    and decode it when writing.
+    
+    The encoding is opt-in. Data are not encoded by read_spreadsheets, and
+    the CORE-WESM pipeline (see run_pipeline_functions.run_model) does not
+    encode data, as they are decoded for fratoo in create_multiscale_model
+    anyway.
     
     Parameters
     ----------
     data : dict
         Data dictionary with one or more scenarios.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
+    vocabulary : dict, optional
+        Dictionary with set names as keys and pandas.CategoricalDtype as
+        values, e.g., as returned for another model. Values not included are
+        added. The vocabulary is derived from the data if None. The default
+        is None.
 
     Returns
     -------
-    e : bool
-        True if no issue was identified during checks, otherwise False.
+    data : dict of dicts
+        Dictionary with a dictionary of encoded DataFrames for each scenario.
+    vocabulary : dict
+        Dictionary with set names as keys and pandas.CategoricalDtype as
+        values.
 
     """
-    # FIXME: implement more checks
-
-    logging.info("Performing checks on data.")
     
-    # check if all set values used to define parameters are in respective sets
-    # iterate through models and scenarios
+    logging.info("Encoding set values.")
     
-    e = True
+    dcfg = DataConfig.wrap(dcfg)
+    sets = [k for k in dcfg.sets if dcfg[k]["dtype"] == "str"]
+    
+    # collect values of each set across scenarios and parameters
+    values = {k:list() for k in sets}
+    if vocabulary is not None:
+        for k,v in vocabulary.items():
+            values.setdefault(k, list()).append(v.categories)
     for s in data.keys():
-        # iterate through parameters and sets
-        for k,v in dcfg.items():
-            # skip multi-scale parameters
-            if k.startswith("ft"):
-                continue
-            # if param, check accordingly
-            if v["type"] == "param":
-                for ii in v["indices"]:
-                    if ii == "YEAR":
-                        continue
-                    if not data[s][k].index.get_level_values(ii).isin(
-                            data[s][ii]["VALUE"].tolist()+[""]).all():
-                        # FIXME: raise exception (?)
-                        undef = data[s][k][~data[s][k].index.get_level_values(ii).isin(
-                            data[s][ii]["VALUE"].tolist())]
-                        e=False
-                        logging.error(f"The parameter '{k}' for scenario '{s}'"
-                                    f" is defined for {ii} values"
-                                    f" that are not part of the '{ii}' set. This"
-                                    " can cause errors when running the"
-                                    " model. The relevant entries are:"
-                                    f"{undef}")
+        for k,df in data[s].items():
+            if k in values and "VALUE" in df.columns:
+                values[k].append(pd.Index(df["VALUE"]).unique())
+            for n,lev in _get_index_levels(df.index):
+                if n in values:
+                    values[n].append(lev)
+    
+    vocabulary = dict()
+    for k,v in values.items():
+        vals = pd.Index([], dtype=object).append(
+                        [_decode_index(i) for i in v]).unique().dropna()
+        vocabulary[k] = pd.CategoricalDtype(vals.sort_values())
+    
+    for s in data.keys():
+        for k in list(data[s].keys()):
+            data[s][k] = _encode_frame(data[s][k], vocabulary, k)
+            
+    logging.info("Encoded set values.")
+    
+    return data, vocabulary
 
-        lowerthan = {"ResidualCapacity":"TotalAnnualMaxCapacity",
-                     "TotalAnnualMinCapacity":"TotalAnnualMaxCapacity",
-                     "TotalTechnologyAnnualActivityLowerLimit":"TotalTechnologyAnnualActivityUpperLimit",
-                     "TechnologyActivityByModeLowerLimit":"TechnologyActivityByModeUpperLimit",
-                     "TotalAnnualMinCapacityInvestment":"TotalAnnualMaxCapacityInvestment"}
-        for l,h in lowerthan.items():
-        # check if TotalAnnualMinCapacity is lower than TotalAnnualMaxCapacity
-            logging.debug(f"Checking contradictions between {l} and {h}.")
-            if (data[s][l].reindex_like(
-                data[s][h])>data[s][h]).any().any():
+def decode_sets(data):
+    """ Decode set values encoded as categoricals, see encode_sets.
+    
+    Parameters
+    ----------
+    data : dict
+        Data dictionary with one or more scenarios.
+
+    Returns
+    -------
+    data : dict of dicts
+        Dictionary with a dictionary of decoded DataFrames for each scenario.
+
+    """
+    
+    for s in data.keys():
+        for k in list(data[s].keys()):
+            data[s][k] = _decode_frame(data[s][k])
+            
+    return data
+        
+def check_data(data, dcfg):
+    """ Check scenario data for issues.
+    
+    Parameters
+    ----------
+    data : dict
+        Data dictionary with one or more scenarios.
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the format
+        used for otoole).
+
+    Returns
+    -------
+    e : bool
+        True if no issue was identified during checks, otherwise False.
+
+    """
+    # FIXME: implement more checks
+
+    logging.info("Performing checks on data.")
+    
+    # check if all set values used to define parameters are in respective sets
+    # iterate through models and scenarios
+    
+    dcfg = DataConfig.wrap(dcfg)
+    
+    e = True
+    for s in data.keys():
+        # values of sets, obtained when first used
+        values = dict()
+        # iterate through parameters, skipping multi-scale parameters
+        for k in dcfg.params:
+            if k in dcfg.ft_params:
+                continue
+            v = dcfg[k]
+            for ii in v["indices"]:
+                if ii == "YEAR":
+                    continue
+                if ii not in values:
+                    values[ii] = data[s][ii]["VALUE"].tolist()+[""]
+                if not _level_isin(data[s][k].index, ii,
+                                   values[ii]).all():
+                    # FIXME: raise exception (?)
+                    undef = data[s][k][~data[s][k].index.get_level_values(ii).isin(
+                        data[s][ii]["VALUE"].tolist())]
+                    e=False
+                    logging.error(f"The parameter '{k}' for scenario '{s}'"
+                                f" is defined for {ii} values"
+                                f" that are not part of the '{ii}' set. This"
+                                " can cause errors when running the"
+                                " model. The relevant entries are:"
+                                f"{undef}")
+
+        lowerthan = {"ResidualCapacity":"TotalAnnualMaxCapacity",
+                     "TotalAnnualMinCapacity":"TotalAnnualMaxCapacity",
+                     "TotalTechnologyAnnualActivityLowerLimit":"TotalTechnologyAnnualActivityUpperLimit",
+                     "TechnologyActivityByModeLowerLimit":"TechnologyActivityByModeUpperLimit",
+                     "TotalAnnualMinCapacityInvestment":"TotalAnnualMaxCapacityInvestment"}
+        for l,h in lowerthan.items():
+        # check if TotalAnnualMinCapacity is lower than TotalAnnualMaxCapacity
+            logging.debug(f"Checking contradictions between {l} and {h}.")
+            if (data[s][l].reindex_like(
+                data[s][h])>data[s][h]).any().any():
                 vio = data[s][h][(data[s][l].reindex_like(
                     data[s][h])>data[s][h])].dropna(how="all").dropna(axis=1)
                 e=False
@@ -602,7 +1244,7 @@ def write_datafile(data,
     fuel_rename: bool, optional
         If to rename the FUEL set to COMMIDITY. False if not to update.
         The default is False.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -616,6 +1258,7 @@ def write_datafile(data,
     
     # create deepcopy
     data = _create_data_deepcopy(data)
+    dcfg = DataConfig.wrap(dcfg)
 
     # if required rename FUEL set
     # rename FUEL set to COMMODITY (UI - at one point -  required FUEL 
@@ -623,34 +1266,26 @@ def write_datafile(data,
     # make datafiles consistent with datafiles exported from UI)
     if fuel_rename:
         for s in data.keys():
-            # iterate through parameters and sets
-            for k,v in dcfg.items():
-                # if param, process accordingly
-                if v["type"] == "param":
-                    if "FUEL" in v["indices"]:
-                        data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
-                                                                else "COMMODITY"
-                                                                for s
-                                                                in data[s][k].index.names])
+            # iterate through parameters
+            for k in dcfg.params:
+                if "FUEL" in dcfg[k]["indices"]:
+                    data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
+                                                            else "COMMODITY"
+                                                            for s
+                                                            in data[s][k].index.names])
             # adjust set name
             data[s]["COMMODITY"] = data[s].pop("FUEL")
         
-        # adjust config file
-        for k,v in dcfg.items():
-            if dcfg[k]["type"]=="param":
-                dcfg[k]["indices"] =  [i if i!="FUEL" else "COMMODITY" 
-                                      for i in dcfg[k]["indices"]]
-        dcfg["COMMODITY"] = dcfg.pop("FUEL")
+        # adjust config, leaving the config passed unchanged
+        dcfg = dcfg.rename_sets({"FUEL":"COMMODITY"})
 
         
     # rearrange data for otoole and save a datafile for each model and scenario
     for s in data.keys():
-        for k,v in dcfg.items():
-            if k.startswith("ft_"):
-                continue
-            if v["type"] == "result":
+        for k in dcfg.inputs:
+            if k in dcfg.ft_params:
                 continue
-            if v["type"] == "set":
+            if dcfg[k]["type"] == "set":
                 data[s][k] = data[s][k].loc[:,"VALUE"].to_frame()
             if k == "TECHGROUP":
                 del data[s][k]
@@ -660,7 +1295,7 @@ def write_datafile(data,
                 data[s][k].loc["",:] = ""
                 
             data[s][k] = data[s][k][data[s][k]["VALUE"]!=""].dropna()
-        defaults = {k:v["default"] for k,v in dcfg.items() if v["type"]!="set"}
+        defaults = dict(dcfg.defaults)
         
         logging.info(f"Writing data for scenario {s} to data file.")
         
@@ -671,10 +1306,7 @@ def write_datafile(data,
         #           )
         # write_strategy.write(data[s], os.path.join(path,"datafile_"+s+".txt"))
 
-        ndcfg = copy.deepcopy(dcfg)
-        for k in list(ndcfg.keys()):
-            if ndcfg[k]["type"] == "result":
-                del ndcfg[k]
+        ndcfg = {k:dcfg[k] for k in dcfg.inputs}
         with open('data_config_temp.yaml', 'w') as outfile:
             yaml.dump(ndcfg, outfile, default_flow_style=False)
 
@@ -685,6 +1317,156 @@ def write_datafile(data,
         
     return
 
+def read_datafile(path,
+                  dcfg,
+                  remove_defaults=True):
+    """ Read data from a GNU MathProg datafile, e.g., as written by otoole.
+    
+    Only the otoole list format is supported, i.e., definitions with one
+    row of index values and value per line (tabular or sliced data blocks
+    cannot be parsed). The datafile is parsed line by line. Data are
+    arranged in DataFrames indexed by the indices of the parameter as given
+    in the data config, with years as columns if indexed by YEAR, otherwise
+    with a 'VALUE' column. Sets are DataFrames with a 'VALUE' column. Sets
+    and parameters of the data config that are not defined in the datafile
+    are included as empty DataFrames.
+    
+    Parameters
+    ----------
+    path : str
+        Path to the datafile.
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the format
+        used for otoole).
+    remove_defaults : bool, optional
+        If to remove values equal to the default value of the parameter
+        while parsing, i.e., rows with only default values. Missing values
+        of the remaining rows are set to the default value. The default is
+        True.
+
+    Raises
+    ------
+    ValueError
+        Raised if the datafile cannot be parsed, e.g., as not in the otoole
+        list format.
+
+    Returns
+    -------
+    dict
+        Dictionary of DataFrames for sets and parameters in the datafile.
+
+    """
+    
+    dcfg = DataConfig.wrap(dcfg)
+    data = dict()
+    defaults = dict()
+    
+    # parse definitions in datafile, followed by empty definitions of sets
+    # and parameters of the data config not part of the datafile
+    blocks = itertools.chain(_iter_datafile_blocks(path),
+                             ((dcfg[k]["type"], k, None, [])
+                              for k in dcfg.inputs if k not in data))
+    for kind,name,default,rows in blocks:
+        if name not in dcfg.keys():
+            logger.warning(f"'{name}' in datafile is not part of the data"
+                           " config and will be ignored.")
+            continue
+        if kind != dcfg[name]["type"]:
+            raise ValueError(f"'{name}' is a {dcfg[name]['type']} but"
+                             f" defined as {kind} in the datafile.")
+        
+        if kind == "set":
+            df = pd.DataFrame({"VALUE":[v for r in rows for v in r.split()]})
+            if dcfg[name]["dtype"] == "int":
+                df["VALUE"] = df["VALUE"].astype(int)
+            data[name] = df
+            continue
+        
+        indices = dcfg[name]["indices"]
+        if default is None:
+            default = dcfg[name]["default"]
+        default = float(default)
+        defaults[name] = default
+        
+        # split rows in index and value columns
+        dtypes = {i:(int if dcfg[i]["dtype"] == "int" else str)
+                  for i in indices}
+        dtypes["VALUE"] = float
+        if rows:
+            try:
+                values = pd.read_csv(io.StringIO("\n".join(rows)),
+                                     sep=r"\s+", header=None,
+                                     names=list(dtypes.keys()),
+                                     dtype=dtypes,
+                                     keep_default_na=False)
+            except (ValueError, pd.errors.ParserError) as e:
+                raise ValueError(f"Rows of parameter '{name}' cannot be"
+                                 " parsed or do not match its indices.") from e
+        else:
+            values = pd.DataFrame(columns=list(dtypes.keys())).astype(dtypes)
+        
+        years = None
+        if "YEAR" in indices:
+            years = values["YEAR"].unique()
+        if remove_defaults:
+            values = values.loc[values["VALUE"] != default]
+            
+        # convert to wide format if indexed by years
+        if years is None:
+            df = values.set_index(indices)
+        else:
+            df = values.set_index(indices)["VALUE"].unstack("YEAR")
+            df = df.reindex(columns=years).rename_axis(None, axis=1)
+        data[name] = df
+    
+    # use all years of the YEAR set and years used as columns, set missing
+    # values to default values
+    for name,df in data.items():
+        if dcfg[name]["type"] != "param" or "YEAR" not in dcfg[name]["indices"]:
+            continue
+        years = set(df.columns)
+        if "YEAR" in data:
+            years.update(data["YEAR"]["VALUE"])
+        data[name] = df.reindex(columns=sorted(years))
+        if remove_defaults:
+            data[name] = data[name].fillna(defaults[name])
+    
+    return data
+
+def _iter_datafile_blocks(path):
+    """ Iterate over the set and parameter definitions of a datafile, yields
+    the kind ('set' or 'param'), name, default value (None if not given),
+    and list of data rows of each definition.
+    
+    """
+    
+    header = re.compile(r"^(set|param)\s+(?:default\s+(\S+)\s*:\s*)?"
+                        r"([\w-]+)(?:\s+default\s+(\S+))?\s*:=\s*(.*)$")
+    block = None
+    with open(path) as fh:
+        for line in fh:
+            line = line.split("#", 1)[0].strip()
+            if not line or line in ["end;", "end"]:
+                continue
+            if block is None:
+                m = header.match(line)
+                if m is None:
+                    raise ValueError(f"Cannot parse datafile line: {line}")
+                block = (m.group(1), m.group(3), m.group(2) or m.group(4), [])
+                line = m.group(5)
+                if not line:
+                    continue
+            end = line.endswith(";")
+            line = line.rstrip(";").strip()
+            if line:
+                block[3].append(line)
+            if end:
+                yield block
+                block = None
+    if block is not None:
+        raise ValueError(f"Definition of '{block[1]}' in datafile is not"
+                         " terminated.")
+
 def write_spreadsheet(data,
                       path,
                       dcfg,
@@ -700,7 +1482,7 @@ def write_spreadsheet(data,
     fuel_rename: bool, optional
         If to rename the FUEL set to COMMIDITY. False if not to update.
         The default is False.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -713,28 +1495,23 @@ def write_spreadsheet(data,
     
     # create deepcopy
     data = _create_data_deepcopy(data)
+    dcfg = DataConfig.wrap(dcfg)
     
     # if required rename FUEL set
     if fuel_rename:
         for s in data.keys():
-            # iterate through parameters and sets
-            for k,v in dcfg.items():
-                # if param, process accordingly
-                if v["type"] == "param":
-                    if "FUEL" in v["indices"]:
-                        data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
-                                                                else "COMMODITY"
-                                                                for s
-                                                                in data[s][k].index.names])
+            # iterate through parameters
+            for k in dcfg.params:
+                if "FUEL" in dcfg[k]["indices"]:
+                    data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
+                                                            else "COMMODITY"
+                                                            for s
+                                                            in data[s][k].index.names])
             # adjust set name
             data[s]["COMMODITY"] = data[s].pop("FUEL")
         
-        # adjust config file
-        for k,v in dcfg.items():
-            if dcfg[k]["type"]=="param":
-                dcfg[k]["indices"] =  [i if i!="FUEL" else "COMMODITY" 
-                                      for i in dcfg[k]["indices"]]
-        dcfg["COMMODITY"] = dcfg.pop("FUEL")
+        # adjust config, leaving the config passed unchanged
+        dcfg = dcfg.rename_sets({"FUEL":"COMMODITY"})
         
         
     # rearrange data and save a spreadsheet file for each model and scenario
@@ -759,10 +1536,7 @@ def write_spreadsheet(data,
                     logging.warning(f"Data for parameter {k} for scenario {s} "
                                     "are not available and, thus, not saved.")
                     continue
-                if "short_name" in v.keys():
-                    n = v["short_name"]
-                else:
-                    n = k   
+                n = dcfg.sheet_names[k]
                 if v["type"]=="set":
                     data[s][k].to_excel(writer, sheet_name=n,
                                         merge_cells=False,index=False)
@@ -788,7 +1562,7 @@ def write_csv(data,
     fuel_rename : bool, optional
         If to rename the FUEL set to COMMIDITY. False if not to update.
         The default is False.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -801,28 +1575,23 @@ def write_csv(data,
     
     # create deepcopy
     data = _create_data_deepcopy(data)
+    dcfg = DataConfig.wrap(dcfg)
     
     # if required rename FUEL set
     if fuel_rename:
         for s in data.keys():
-            # iterate through parameters and sets
-            for k,v in dcfg.items():
-                # if param, process accordingly
-                if v["type"] == "param":
-                    if "FUEL" in v["indices"]:
-                        data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
-                                                                else "COMMODITY"
-                                                                for s
-                                                                in data[s][k].index.names])
+            # iterate through parameters
+            for k in dcfg.params:
+                if "FUEL" in dcfg[k]["indices"]:
+                    data[s][k].index = data[s][k].index.rename([s if s!="FUEL"
+                                                            else "COMMODITY"
+                                                            for s
+                                                            in data[s][k].index.names])
             # adjust set name
             data[s]["COMMODITY"] = data[s].pop("FUEL")
         
-        # adjust config file
-        for k,v in dcfg.items():
-            if dcfg[k]["type"]=="param":
-                dcfg[k]["indices"] =  [i if i!="FUEL" else "COMMODITY" 
-                                      for i in dcfg[k]["indices"]]
-        dcfg["COMMODITY"] = dcfg.pop("FUEL")
+        # adjust config, leaving the config passed unchanged
+        dcfg = dcfg.rename_sets({"FUEL":"COMMODITY"})
         
         
     # rearrange data and save a spreadsheet file for each model and scenario
@@ -873,21 +1642,26 @@ def run_model(data,
     scenario_list: list
         List of scenario names (str).
     model_file_path : str
-        File path to GNU Mathprog model file.
+        File path to GNU Mathprog model file. Not used by the highs-native
+        solver, which builds the formulation of
+        osemosys_preprocessing_adapted_f.txt with build_model.
     config_path : str
         File path to data config.
     glpk_dir : str, optional
         Path to folder with GLPK executable. If "None" system installation is used.
         The default is "None".
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
     fuel_rename : bool, optional
         If to rename the FUEL set to COMMIDITY. False if not to update.
         The default is False.
     solver : str, optional
-        String with solver name. Currently cbc and highs are implemented.
-        The default is 'highs'.
+        String with solver name. Currently cbc, highs, and highs-native are
+        implemented. For cbc and highs, the model is translated with glpsol
+        and passed to the solver as LP file, for highs-native, it is built
+        in-process (see build_model) and passed to highs directly, without
+        writing a datafile. The default is 'highs'.
     solver_cwd : str, optional
         Path to working directory for solver. The defaults is './'.
 
@@ -936,9 +1710,12 @@ def run_model(data,
         if not os.path.exists(filep+"/csv/"):
             os.makedirs(filep+"/csv/")
             
-        write_datafile({s:data[s]}, filep, dcfg, fuel_rename=fuel_rename)
+        # datafile only required if translated with glpsol
+        if solver in ["cbc","highs"]:
+            write_datafile({s:data[s]}, filep, dcfg, fuel_rename=fuel_rename)
         
-        glpk_exe = "glpsol" if glpk_dir == "None" else glpk_dir+"glpsol"
+        glpk_exe = ("glpsol" if glpk_dir in [None, "None"]
+                    else glpk_dir+"glpsol")
         # FIXME: this can be extended to allow for the use of other solvers
         if solver == "cbc":
             subprocess.run([glpk_exe,
@@ -1103,6 +1880,51 @@ def run_model(data,
             #     # d.to_csv(filep+"/"+"csv/"+v+"_dual.csv")
             #     # df.to_csv(filep+"/"+"csv/"+"all_dual.csv")
 
+        elif solver == "highs-native":
+            
+            if highspy is None:
+                logging.warning("The highs solver is not installed. The model"
+                             " will not be solved. Install highs or choose a"
+                             " different solver.")
+                return False
+            
+            if (os.path.basename(model_file_path)
+                != "osemosys_preprocessing_adapted_f.txt"):
+                logging.warning(f"The model file '{model_file_path}' is not"
+                                " used by the highs-native solver, which"
+                                " builds the formulation of"
+                                " 'osemosys_preprocessing_adapted_f.txt'.")
+            
+            model = build_model(data[s], dcfg)
+            
+            lp = highspy.HighsLp()
+            lp.num_col_ = len(model["col_cost"])
+            lp.num_row_ = len(model["row_lower"])
+            lp.col_cost_ = model["col_cost"]
+            lp.col_lower_ = model["col_lower"]
+            lp.col_upper_ = model["col_upper"]
+            lp.row_lower_ = model["row_lower"]
+            lp.row_upper_ = model["row_upper"]
+            lp.offset_ = model["offset"]
+            lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+            lp.a_matrix_.start_ = model["a_start"]
+            lp.a_matrix_.index_ = model["a_index"]
+            lp.a_matrix_.value_ = model["a_value"]
+            
+            h = highspy.Highs()
+            h.passModel(lp)
+            h.run()
+            status = h.getModelStatus()
+            if status != highspy.HighsModelStatus.kOptimal:
+                logging.warning(f"Model for scenario {s} has not been solved"
+                                " to optimality (status:"
+                                f" {h.modelStatusToString(status)}).")
+            solution[s] = _get_model_results(model,
+                                             np.asarray(h.getSolution()
+                                                        .col_value),
+                                             dcfg)
+            del h
+
         logging.info(f"Solved model for scenario {s}.")   
 
     # add variable values to model data
@@ -1117,6 +1939,483 @@ def run_model(data,
     
     return data
 
+def build_model(data,
+                dcfg):
+    """ Build the linear program of the OSeMOSYS model for a scenario.
+
+    The constraint matrix is assembled in compressed sparse column (CSC)
+    format directly from the data, i.e., without translating a GNU MathProg
+    model file with glpsol and writing and reading an LP file. The
+    formulation is that of the model file osemosys_preprocessing_adapted_f.txt
+    (variables that are not used in any constraint are not included).
+    Variables are identified by the positions of their set values rather
+    than by names.
+
+    Parameters
+    ----------
+    data : dict
+        Data dictionary of a single scenario.
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the format
+        used for otoole).
+
+    Raises
+    ------
+    ValueError
+        Raised if a parameter is not indexed as required by the model.
+
+    Returns
+    -------
+    model : dict
+        Dictionary with the linear program, i.e., the arrays 'col_cost',
+        'col_lower', 'col_upper', 'row_lower', 'row_upper', and the matrix in
+        CSC format ('a_start', 'a_index', 'a_value') as used by
+        highspy.HighsLp, the objective 'offset', the 'sets' (pandas.Index of
+        set values), and the 'variables' (dictionary with variable names as
+        keys and tuples of an array of column positions, -1 if not included,
+        and the names of the indexing sets as values).
+
+    """
+
+    logging.info("Building model.")
+
+    dcfg = DataConfig.wrap(dcfg)
+
+    # get sets, FUEL might have been renamed to COMMODITY
+    names = {"FUEL":"FUEL" if "FUEL" in data.keys() else "COMMODITY"}
+    sets = {k:_get_model_set(data, dcfg, names.get(k, k))
+            for k in ["REGION","TECHNOLOGY","TIMESLICE","MODE_OF_OPERATION",
+                      "YEAR","FUEL","EMISSION","STORAGE","UDC"]}
+    R,T,L,M,Y,F,E,S,U = (len(sets[k]) for k in sets.keys())
+
+    def param(name, dims, dense=True):
+        return _get_model_param(data, dcfg, name,
+                                [sets[d] for d in dims], dense)
+
+    # years and discounting
+    yv = sets["YEAR"].to_numpy(dtype=float)
+    y0 = yv.min() if Y > 0 else 0
+    y1 = yv.max() if Y > 0 else 0
+    dr = param("DiscountRate", ["REGION"])
+    dfs = (1 + dr[:,None])**(yv - y0)
+    dfm = (1 + dr[:,None])**(yv - y0 + 0.5)
+    ys = param("YearSplit", ["TIMESLICE","YEAR"])
+    ys5 = ys[None,:,None,None,:]
+
+    # vintages of capacity available in each year, (r,t,y,yy) with
+    # 0 <= y-yy < OperationalLife[r,t]
+    ol = param("OperationalLife", ["REGION","TECHNOLOGY"])
+    dy = yv[:,None] - yv[None,:]
+    lr,lt,ly,lyy = np.nonzero((dy >= 0) & (dy < ol[:,:,None,None]))
+
+    # activity ratios as sparse entries (r,t,f/e,m,y)
+    oar = param("OutputActivityRatio",
+                ["REGION","TECHNOLOGY","FUEL","MODE_OF_OPERATION","YEAR"],
+                dense=False)
+    iar = param("InputActivityRatio",
+                ["REGION","TECHNOLOGY","FUEL","MODE_OF_OPERATION","YEAR"],
+                dense=False)
+    ear = param("EmissionActivityRatio",
+                ["REGION","TECHNOLOGY","EMISSION","MODE_OF_OPERATION","YEAR"],
+                dense=False)
+
+    # modes of operation of each technology (MODEperTECHNOLOGY)
+    mpt = np.zeros((T,M), dtype=bool)
+    for c,_ in [oar, iar, ear]:
+        mpt[c[1],c[3]] = True
+
+    # other parameters
+    res = param("ResidualCapacity", ["REGION","TECHNOLOGY","YEAR"])
+    cau = param("CapacityToActivityUnit", ["REGION","TECHNOLOGY"])
+    cf = param("CapacityFactor", ["REGION","TECHNOLOGY","TIMESLICE","YEAR"])
+    af = param("AvailabilityFactor", ["REGION","TECHNOLOGY","YEAR"])
+    cc = param("CapitalCost", ["REGION","TECHNOLOGY","YEAR"])
+    fc = param("FixedCost", ["REGION","TECHNOLOGY","YEAR"])
+    vc = param("VariableCost", ["REGION","TECHNOLOGY","MODE_OF_OPERATION",
+                                "YEAR"])
+    trp = param("TradeRoute", ["REGION","REGION","FUEL","YEAR"])
+
+    mm = _ModelMatrix()
+
+    #%% Variables
+
+    rtmy = (R,T,M,Y)
+    rty = (R,T,Y)
+    roa = mm.add_columns("RateOfActivity",
+                         ["REGION","TIMESLICE","TECHNOLOGY",
+                          "MODE_OF_OPERATION","YEAR"],
+                         (R,L,T,M,Y), mask=mpt[None,None,:,:,None])
+    tam = mm.add_columns("TotalAnnualTechnologyActivityByMode",
+                         ["REGION","TECHNOLOGY","MODE_OF_OPERATION","YEAR"],
+                         rtmy, mask=mpt[None,:,:,None])
+    nc = mm.add_columns("NewCapacity", ["REGION","TECHNOLOGY","YEAR"], rty)
+    anc = mm.add_columns("AccumulatedNewCapacity",
+                         ["REGION","TECHNOLOGY","YEAR"], rty)
+    tca = mm.add_columns("TotalCapacityAnnual",
+                         ["REGION","TECHNOLOGY","YEAR"], rty)
+    cotu = param("CapacityOfOneTechnologyUnit",
+                 ["REGION","TECHNOLOGY","YEAR"])
+    nun = mm.add_columns("NumberOfNewTechnologyUnits",
+                         ["REGION","TECHNOLOGY","YEAR"], rty,
+                         mask=cotu != 0)
+    ci = mm.add_columns("CapitalInvestment",
+                        ["REGION","TECHNOLOGY","YEAR"], rty)
+    ate = mm.add_columns("AnnualTechnologyEmission",
+                         ["REGION","TECHNOLOGY","EMISSION","YEAR"],
+                         (R,T,E,Y), lower=-np.inf)
+    atem = mm.add_columns("AnnualTechnologyEmissionByMode",
+                          ["REGION","TECHNOLOGY","EMISSION",
+                           "MODE_OF_OPERATION","YEAR"],
+                          (R,T,E,M,Y), mask=mpt[None,:,None,:,None],
+                          lower=-np.inf)
+    tr = mm.add_columns("Trade",
+                        ["REGION","REGION","TIMESLICE","FUEL","YEAR"],
+                        (R,R,L,F,Y), lower=-np.inf)
+    avoc = mm.add_columns("AnnualVariableOperatingCost",
+                          ["REGION","TECHNOLOGY","YEAR"], rty, lower=-np.inf)
+    afoc = mm.add_columns("AnnualFixedOperatingCost",
+                          ["REGION","TECHNOLOGY","YEAR"], rty)
+    ols = param("OperationalLifeStorage", ["REGION","STORAGE"])
+    si6 = yv + ols[:,:,None] - 1 <= y1
+    svs = mm.add_columns("SalvageValueStorage",
+                         ["REGION","STORAGE","YEAR"], (R,S,Y), mask=si6)
+    sv = mm.add_columns("SalvageValue", ["REGION","TECHNOLOGY","YEAR"], rty)
+    dsv = mm.add_columns("DiscountedSalvageValue",
+                         ["REGION","TECHNOLOGY","YEAR"], rty)
+    ttm = mm.add_columns("TotalTechnologyModelPeriodActivity",
+                         ["REGION","TECHNOLOGY"], (R,T), lower=-np.inf)
+    itn = mm.add_columns("InputToNewCapacity",
+                         ["REGION","TECHNOLOGY","FUEL","YEAR"], (R,T,F,Y))
+    itt = mm.add_columns("InputToTotalCapacity",
+                         ["REGION","TECHNOLOGY","FUEL","YEAR"], (R,T,F,Y))
+    tta = mm.add_columns("TotalTechnologyAnnualActivity",
+                         ["REGION","TECHNOLOGY","YEAR"], rty)
+    rota = mm.add_columns("RateOfTotalActivity",
+                          ["REGION","TECHNOLOGY","TIMESLICE","YEAR"],
+                          (R,T,L,Y))
+    dtep = mm.add_columns("DiscountedTechnologyEmissionsPenalty",
+                          ["REGION","TECHNOLOGY","YEAR"], rty)
+    ae = mm.add_columns("AnnualEmissions", ["REGION","EMISSION","YEAR"],
+                        (R,E,Y), lower=-np.inf)
+    dem = mm.add_columns("Demand", ["REGION","TIMESLICE","FUEL","YEAR"],
+                         (R,L,F,Y))
+    nsc = mm.add_columns("NewStorageCapacity", ["REGION","STORAGE","YEAR"],
+                         (R,S,Y))
+
+    # activity ratio terms for each timeslice, i.e., rows are selected by
+    # the entries (r,t,f/e,m,y) of the ratio and columns (K,L)
+    def ratio_terms(rows, ratio, coef=None, timeslice=True):
+        (r,t,x,m,y),v = ratio
+        v = v if coef is None else v*coef(r,t,x,m,y)
+        v = v[:,None]*ys[:,y].T if timeslice else v[:,None]
+        mm.add_terms(rows(r,t,x,m,y), roa[r,:,t,m,y], v)
+
+    # capacity terms, i.e., NewCapacity of vintages available in a year
+    # plus ResidualCapacity, rows and coef are selected by (r,t,y)
+    def capacity_terms(rows, coef):
+        rows = rows(lr,lt,ly)
+        cols = nc[lr,lt,lyy].reshape((-1,) + (1,)*(rows.ndim - 1))
+        mm.add_terms(rows, cols, coef(lr,lt,ly))
+
+    #%% Objective function
+
+    mm.add_cost(roa, ys5*vc[:,None]/dfm[:,None,None,None,:])
+    mm.add_cost(nc, cc/dfs[:,None,:])
+    mm.add_cost(nc[lr,lt,lyy], fc[lr,lt,ly]/dfm[lr,ly])
+    mm.add_cost(dtep, 1)
+    mm.add_cost(dsv, -1)
+    ccs = param("CapitalCostStorage", ["REGION","STORAGE","YEAR"])
+    mm.add_cost(nsc, ccs/dfs[:,None,:])
+    mm.offset = float((res*fc/dfm[:,None,:]).sum())
+
+    #%% Constraints
+
+    # Acc3_AverageAnnualRateOfActivity
+    rows = mm.add_rows(rtmy, 0, 0, mask=mpt[None,:,:,None])
+    mm.add_terms(rows[:,None], roa, ys5)
+    mm.add_terms(rows, tam, -1)
+
+    # CAa1_TotalNewCapacity
+    rows = mm.add_rows(rty, 0, 0)
+    mm.add_terms(rows, anc, 1)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: -1)
+
+    # CAa2_TotalAnnualCapacity
+    rows = mm.add_rows(rty, -res, -res)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: 1)
+    mm.add_terms(rows, tca, -1)
+
+    # CAa5_TotalNewCapacity
+    rows = mm.add_rows(rty, 0, 0, mask=cotu != 0)
+    mm.add_terms(rows, nun, cotu)
+    mm.add_terms(rows, nc, -1)
+
+    # CC1_UndiscountedCapitalInvestment
+    rows = mm.add_rows(rty, 0, 0)
+    mm.add_terms(rows, nc, cc)
+    mm.add_terms(rows, ci, -1)
+
+    # E2_AnnualEmissionProduction
+    rows = mm.add_rows((R,T,E,Y), 0, 0)
+    ratio_terms(lambda r,t,e,m,y: rows[r,t,e,y][:,None], ear)
+    mm.add_terms(rows, ate, -1)
+
+    # EBa10_EnergyBalanceEachTS4
+    rows = mm.add_rows((R,R,L,F,Y), 0, 0)
+    mm.add_terms(rows, tr, 1)
+    mm.add_terms(rows, tr.transpose(1,0,2,3,4), 1)
+
+    # NCC1_TotalAnnualMaxNewCapacityConstraint
+    v = param("TotalAnnualMaxCapacityInvestment",
+              ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, -np.inf, v)
+    mm.add_terms(rows, nc, 1)
+
+    # NCC2_TotalAnnualMinNewCapacityConstraint
+    v = param("TotalAnnualMinCapacityInvestment",
+              ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, v, np.inf, mask=v > 0)
+    mm.add_terms(rows, nc, 1)
+
+    # OC1_OperatingCostsVariable
+    rows = mm.add_rows(rty, 0, 0)
+    mm.add_terms(rows[:,None,:,None,:], roa, ys5*vc[:,None])
+    mm.add_terms(rows, avoc, -1)
+
+    # OC2_OperatingCostsFixedAnnual
+    rows = mm.add_rows(rty, -res*fc, -res*fc)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: fc[r,t,y])
+    mm.add_terms(rows, afoc, -1)
+
+    # SI6_SalvageValueStorageAtEndOfPeriod1
+    rows = mm.add_rows((R,S,Y), 0, 0, mask=si6)
+    mm.add_terms(rows, svs, -1)
+
+    # SV3_SalvageValueAtEndOfPeriod3
+    rows = mm.add_rows(rty, 0, 0, mask=yv + ol[:,:,None] - 1 <= y1)
+    mm.add_terms(rows, sv, 1)
+
+    # SV4_SalvageValueDiscountedToStartYear
+    rows = mm.add_rows(rty, 0, 0)
+    mm.add_terms(rows, dsv, 1)
+    mm.add_terms(rows, sv, -1/(1 + dr[:,None,None])**(1 + y1 - y0))
+
+    # TAC1_TotalModelHorizonTechnologyActivity
+    rows = mm.add_rows((R,T), 0, 0)
+    mm.add_terms(rows[:,None,:,None,None], roa, ys5)
+    mm.add_terms(rows, ttm, -1)
+
+    # EBb4_EnergyBalanceEachYear4_ICR and EBb4_EnergyBalanceEachYear4
+    aad = param("AccumulatedAnnualDemand", ["REGION","FUEL","YEAR"])
+    for icr in [True, False]:
+        rows = mm.add_rows((R,F,Y), aad, np.inf)
+        ratio_terms(lambda r,t,f,m,y: rows[r,f,y][:,None], oar)
+        ratio_terms(lambda r,t,f,m,y: rows[r,f,y][:,None], iar,
+                    lambda r,t,f,m,y: -1)
+        mm.add_terms(rows[:,None,None], tr, -trp[:,:,None])
+        if icr:
+            mm.add_terms(rows[:,None], itn, -1)
+            mm.add_terms(rows[:,None], itt, -1)
+
+    # INC1_InputToNewCapacity
+    v = param("InputToNewCapacityRatio",
+              ["REGION","TECHNOLOGY","FUEL","YEAR"])
+    rows = mm.add_rows((R,T,F,Y), 0, 0, mask=v != 0)
+    mm.add_terms(rows, nc[:,:,None,:], v)
+    mm.add_terms(rows, itn, -1)
+
+    # ITC1_InputToTotalCapacity
+    v = param("InputToTotalCapacityRatio",
+              ["REGION","TECHNOLOGY","FUEL","YEAR"])
+    rows = mm.add_rows((R,T,F,Y), 0, 0, mask=v != 0)
+    mm.add_terms(rows, tca[:,:,None,:], v)
+    mm.add_terms(rows, itt, -1)
+
+    # AAC1_TotalAnnualTechnologyActivity
+    rows = mm.add_rows(rty, 0, 0)
+    mm.add_terms(rows[:,None,:,None,:], roa, ys5)
+    mm.add_terms(rows, tta, -1)
+
+    # CAa3_TotalActivityOfEachTechnology
+    rows = mm.add_rows((R,T,L,Y), 0, 0)
+    mm.add_terms(rows.transpose(0,2,1,3)[:,:,:,None,:], roa, 1)
+    mm.add_terms(rows, rota, -1)
+
+    # E1_AnnualEmissionProductionByMode
+    rows = mm.add_rows((R,T,E,M,Y), 0, 0, mask=mpt[None,:,None,:,None])
+    ratio_terms(lambda r,t,e,m,y: rows[r,t,e,m,y][:,None], ear)
+    mm.add_terms(rows, atem, -1)
+
+    # LU1_TechnologyActivityByModeUL
+    v = param("TechnologyActivityByModeUpperLimit",
+              ["REGION","TECHNOLOGY","MODE_OF_OPERATION","YEAR"])
+    rows = mm.add_rows(rtmy, -np.inf, v, mask=mpt[None,:,:,None] & (v != 0))
+    mm.add_terms(rows, tam, 1)
+
+    # LU2_TechnologyActivityByModeLL
+    v = param("TechnologyActivityByModeLowerLimit",
+              ["REGION","TECHNOLOGY","MODE_OF_OPERATION","YEAR"])
+    rows = mm.add_rows(rtmy, v, np.inf, mask=mpt[None,:,:,None])
+    mm.add_terms(rows, tam, 1)
+
+    # LU3_TechnologyActivityIncreaseByMode and
+    # LU4_TechnologyActivityDecreaseByMode, for consecutive years y,yy
+    iy,iyy = np.nonzero(dy == 1)
+    for n,sign in [("TechnologyActivityIncreaseByModeLimit", 1),
+                   ("TechnologyActivityDecreaseByModeLimit", -1)]:
+        v = param(n, ["REGION","TECHNOLOGY","MODE_OF_OPERATION",
+                      "YEAR"])[...,iyy]
+        rows = mm.add_rows((R,T,M,len(iy)),
+                           -np.inf if sign == 1 else 0,
+                           0 if sign == 1 else np.inf,
+                           mask=mpt[None,:,:,None] & (v != 0))
+        mm.add_terms(rows, tam[...,iy], 1)
+        mm.add_terms(rows, tam[...,iyy], -(1 + sign*v))
+
+    # AAC2_TotalAnnualTechnologyActivityUpperLimit
+    v = param("TotalTechnologyAnnualActivityUpperLimit",
+              ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, -np.inf, v)
+    mm.add_terms(rows[:,None,:,None,:], roa, ys5)
+
+    # AAC3_TotalAnnualTechnologyActivityLowerLimit
+    v = param("TotalTechnologyAnnualActivityLowerLimit",
+              ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, v, np.inf, mask=v > 0)
+    mm.add_terms(rows[:,None,:,None,:], roa, ys5)
+
+    # CAa4_Constraint_Capacity
+    rows = mm.add_rows((R,L,T,Y), -np.inf,
+                       (res[:,:,None,:]*cf*cau[:,:,None,None])
+                       .transpose(0,2,1,3))
+    mm.add_terms(rows[:,:,:,None,:], roa, 1)
+    capacity_terms(lambda r,t,y: rows[r,:,t,y],
+                   lambda r,t,y: -cf[r,t,:,y]*cau[r,t][:,None])
+
+    # CAb1_PlannedMaintenance
+    v = (cf*ys[None,None]).sum(axis=2)*af*cau[:,:,None]
+    rows = mm.add_rows(rty, -np.inf, res*v)
+    mm.add_terms(rows[:,None,:,None,:], roa, ys5)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: -v[r,t,y])
+
+    # E5_DiscountedEmissionsPenaltyByTechnology
+    ep = param("EmissionsPenalty", ["REGION","EMISSION","YEAR"])
+    rows = mm.add_rows(rty, 0, 0)
+    ratio_terms(lambda r,t,e,m,y: rows[r,t,y][:,None], ear,
+                lambda r,t,e,m,y: ep[r,e,y]/dfm[r,y])
+    mm.add_terms(rows, dtep, -1)
+
+    # E6_EmissionsAccounting1
+    rows = mm.add_rows((R,E,Y), 0, 0)
+    ratio_terms(lambda r,t,e,m,y: rows[r,e,y][:,None], ear)
+    mm.add_terms(rows, ae, -1)
+
+    # E8_AnnualEmissionsLimit
+    rows = mm.add_rows((R,E,Y), -np.inf,
+                       param("AnnualEmissionLimit",
+                             ["REGION","EMISSION","YEAR"])
+                       - param("AnnualExogenousEmission",
+                               ["REGION","EMISSION","YEAR"]))
+    ratio_terms(lambda r,t,e,m,y: rows[r,e,y][:,None], ear)
+
+    # E9_ModelPeriodEmissionsLimit
+    rows = mm.add_rows((R,E), -np.inf,
+                       param("ModelPeriodEmissionLimit",
+                             ["REGION","EMISSION"])
+                       - param("ModelPeriodExogenousEmission",
+                               ["REGION","EMISSION"]))
+    ratio_terms(lambda r,t,e,m,y: rows[r,e][:,None], ear)
+
+    # EBa11_EnergyBalanceEachTS5
+    v = (param("SpecifiedAnnualDemand", ["REGION","FUEL","YEAR"])[:,:,None]
+         * param("SpecifiedDemandProfile",
+                 ["REGION","FUEL","TIMESLICE","YEAR"])).transpose(0,2,1,3)
+    rows = mm.add_rows((R,L,F,Y), v, np.inf)
+    ratio_terms(lambda r,t,f,m,y: rows[r,:,f,y], oar)
+    ratio_terms(lambda r,t,f,m,y: rows[r,:,f,y], iar, lambda r,t,f,m,y: -1)
+    mm.add_terms(rows[:,None], tr, -trp[:,:,None])
+
+    # EBa9_EnergyBalanceEachTS3
+    rows = mm.add_rows((R,L,F,Y), v, v)
+    mm.add_terms(rows, dem, 1)
+
+    # RE4_EnergyConstraint
+    v = param("REMinProductionTarget", ["REGION","YEAR"])
+    retf = param("RETagFuel", ["REGION","FUEL","YEAR"])
+    rett = param("RETagTechnology", ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows((R,Y), -np.inf, 0)
+    ratio_terms(lambda r,t,f,m,y: rows[r,y][:,None], oar,
+                lambda r,t,f,m,y: v[r,y]*retf[r,f,y], timeslice=False)
+    ratio_terms(lambda r,t,f,m,y: rows[r,y][:,None], oar,
+                lambda r,t,f,m,y: -rett[r,t,y])
+
+    # RM3_ReserveMargin_Constraint
+    rm = param("ReserveMargin", ["REGION","YEAR"])
+    rmtf = param("ReserveMarginTagFuel", ["REGION","FUEL","YEAR"])
+    v = (param("ReserveMarginTagTechnology", ["REGION","TECHNOLOGY","YEAR"])
+         * cau[:,:,None])
+    rows = mm.add_rows((R,L,Y), -np.inf, (res*v).sum(axis=1)[:,None,:])
+    ratio_terms(lambda r,t,f,m,y: rows[r,:,y], oar,
+                lambda r,t,f,m,y: rmtf[r,f,y]*rm[r,y], timeslice=False)
+    capacity_terms(lambda r,t,y: rows[r,:,y],
+                   lambda r,t,y: -v[r,t,y][:,None])
+
+    # SV1_SalvageValueAtEndOfPeriod1 and SV2_SalvageValueAtEndOfPeriod2
+    sve = yv + ol[:,:,None] - 1 > y1
+    d = dr[:,None,None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        v = np.where(d > 0,
+                     1 - ((1 + d)**(y1 - yv + 1) - 1)
+                     / ((1 + d)**ol[:,:,None] - 1),
+                     1 - (y1 - yv + 1)/ol[:,:,None])
+    for mask in [sve & (d > 0), sve & (d == 0)]:
+        rows = mm.add_rows(rty, 0, 0, mask=mask)
+        mm.add_terms(rows, sv, 1)
+        mm.add_terms(rows, nc, -cc*v)
+
+    # TAC2_TotalModelHorizonTechnologyActivityUpperLimit
+    v = param("TotalTechnologyModelPeriodActivityUpperLimit",
+              ["REGION","TECHNOLOGY"])
+    rows = mm.add_rows((R,T), -np.inf, v)
+    mm.add_terms(rows[:,None,:,None,None], roa, ys5)
+
+    # TAC3_TotalModelHorizonTechnologyActivityLowerLimit
+    v = param("TotalTechnologyModelPeriodActivityLowerLimit",
+              ["REGION","TECHNOLOGY"])
+    rows = mm.add_rows((R,T), v, np.inf, mask=v > 0)
+    mm.add_terms(rows[:,None,:,None,None], roa, ys5)
+
+    # TCC1_TotalAnnualMaxCapacityConstraint
+    v = param("TotalAnnualMaxCapacity", ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, -np.inf, v - res)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: 1)
+
+    # TCC2_TotalAnnualMinCapacityConstraint
+    v = param("TotalAnnualMinCapacity", ["REGION","TECHNOLOGY","YEAR"])
+    rows = mm.add_rows(rty, v - res, np.inf, mask=v > 0)
+    capacity_terms(lambda r,t,y: rows[r,t,y], lambda r,t,y: 1)
+
+    # UDC1_UserDefinedConstraintInequality and
+    # UDC2_UserDefinedConstraintEquality
+    tag = param("UDCTag", ["REGION","UDC"])[:,:,None]
+    v = param("UDCConstant", ["REGION","UDC","YEAR"])
+    for mask,lower in [(tag == 0, -np.inf), (tag == 1, v)]:
+        rows = mm.add_rows((R,U,Y), lower, v, mask=mask)
+        for n,cols in [("UDCMultiplierTotalCapacity", tca),
+                       ("UDCMultiplierNewCapacity", nc),
+                       ("UDCMultiplierActivity", tta)]:
+            mm.add_terms(rows[:,None], cols[:,:,None,:],
+                         param(n, ["REGION","TECHNOLOGY","UDC","YEAR"]))
+
+    model = mm.to_csc()
+    model["sets"] = sets
+
+    logging.info(f"Built model with {len(model['col_cost'])} variables, "
+                 f"{len(model['row_lower'])} constraints, and "
+                 f"{len(model['a_value'])} nonzeros.")
+
+    return model
+
 def save_results(results,
                  results_path,
                  scenario_list,
@@ -1135,7 +2434,7 @@ def save_results(results,
         Path to directory to save results in.
     scenario_list : list
         List of scenario names to be saved.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
     parameter_list : list, optional
@@ -1173,7 +2472,7 @@ def save_results(results,
                     continue
                 if parameter_list is not None and k not in parameter_list:
                     continue
-                df.to_csv(filep+k+".csv")
+                _decode_frame(df).to_csv(filep+k+".csv")
         else:
             with pd.ExcelWriter(filep+"Results.xlsx",
                                 engine='openpyxl') as writer:
@@ -1182,7 +2481,7 @@ def save_results(results,
                         continue
                     if parameter_list is not None and k not in parameter_list:
                         continue
-                    df.to_excel(writer,
+                    _decode_frame(df).to_excel(writer,
                                 merge_cells=False,
                                 sheet_name=k)
                 
@@ -1200,7 +2499,7 @@ def load_results(results_path,
     Parameters
     ----------
 
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
     data : dict, optional
@@ -1266,7 +2565,7 @@ def demap_multiscale_results(data,
     region_sep : str
         Region separator to applied when REGION set values are integrated into
         other sets' values, e.g., TECHNOLOGY.
-    dcfg : dict
+    dcfg : dict or DataConfig
         Dictionary that includes configuration of OSeMOSYS data (in the format
         used for otoole).
 
@@ -1363,25 +2662,26 @@ def expand_results(results):
     
     for s in results.keys():
         
-        results[s]["ProductionByTechnologyAnnual"] = (
-            results[s]["RateOfActivity"]
-            *results[s]["OutputActivityRatio"]
-            *results[s]["YearSplit"]).dropna().groupby(["REGION","TECHNOLOGY","FUEL","YEAR"]).sum()
-        
-        results[s]["TotalProductionByTechnologyAnnual"] = (
-            results[s]["RateOfActivity"]
-            *results[s]["OutputActivityRatio"]
-            *results[s]["YearSplit"]).dropna().groupby(["REGION","TECHNOLOGY","YEAR"]).sum()
+        # products are computed by joining on coded set values
+        (results[s]["ProductionByTechnologyAnnual"],
+         results[s]["TotalProductionByTechnologyAnnual"]) = _product_sum(
+            [results[s]["RateOfActivity"],
+             results[s]["OutputActivityRatio"],
+             results[s]["YearSplit"]],
+            [["REGION","TECHNOLOGY","FUEL","YEAR"],
+             ["REGION","TECHNOLOGY","YEAR"]])
         
-        results[s]["UseByTechnologyAnnual"] = (
-            results[s]["RateOfActivity"]
-            *results[s]["InputActivityRatio"]
-            *results[s]["YearSplit"]).dropna().groupby(["REGION","TECHNOLOGY","FUEL","YEAR"]).sum()
+        (results[s]["UseByTechnologyAnnual"],) = _product_sum(
+            [results[s]["RateOfActivity"],
+             results[s]["InputActivityRatio"],
+             results[s]["YearSplit"]],
+            [["REGION","TECHNOLOGY","FUEL","YEAR"]])
         
-        results[s]["AnnualEmissions"] = (
-            results[s]["RateOfActivity"]
-            *results[s]["EmissionActivityRatio"]
-            *results[s]["YearSplit"]).dropna().groupby(["REGION","EMISSION","YEAR"]).sum()
+        (results[s]["AnnualEmissions"],) = _product_sum(
+            [results[s]["RateOfActivity"],
+             results[s]["EmissionActivityRatio"],
+             results[s]["YearSplit"]],
+            [["REGION","EMISSION","YEAR"]])
         
         
         results[s]["CostInvestment"] = (results[s]["NewCapacity"]
@@ -1412,14 +2712,1191 @@ def expand_results(results):
     return results
 
 
+
+def _get_file_tables(f,
+                     dcfg,
+                     use_markers,
+                     table_marker,
+                     engine,
+                     cache_dir,
+                     cache_size):
+    """ Get the cleaned data tables of a spreadsheet file, using the cache if
+    a cache directory is provided.
+    
+    """
+    
+    if cache_dir is None:
+        return _read_spreadsheet_file(f, dcfg, use_markers, table_marker,
+                                      engine)
+    
+    # load from cache if file unchanged, otherwise parse file
+    key = _cache_key(f, dcfg, use_markers, table_marker, engine)
+    dts = _load_cached_tables(cache_dir, key)
+    if dts is None:
+        dts = _read_spreadsheet_file(f, dcfg, use_markers, table_marker,
+                                     engine)
+        _save_cached_tables(cache_dir, key, f, dts, cache_size)
+    else:
+        logging.debug(f"Data tables of '{f}' loaded from cache.")
+        
+    return dts
+
+def _read_spreadsheet_file(f,
+                           dcfg,
+                           use_markers,
+                           table_marker,
+                           engine):
+    """ Read and clean the data tables of a single spreadsheet file.
+    
+    Parameters
+    ----------
+    f : str
+        Path to spreadsheet file.
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the same
+        format as used for otoole).
+    use_markers: bool
+        If to read spreadsheet file using markers for tables.
+    table_marker: str
+        String of table marker.
+    engine: str
+        Engine used to read spreadsheet file, see read_workbook.
+
+    Returns
+    -------
+    dts : list of DataFrames
+        List of cleaned data tables.
+
+    """
+    
+    # import file
+    sf = read_workbook(f,
+                       engine=engine,
+                       sheet_name=None,
+                       header=None,
+                       na_values=[""],
+                       keep_default_na=False)
+    
+    return _get_sheet_tables(sf, dcfg, use_markers, table_marker)
+
+def _get_frame_tables(sheets,
+                      dcfg,
+                      use_markers,
+                      table_marker):
+    """ Get the cleaned data tables of a workbook in memory, i.e., of a
+    dictionary of sheet DataFrames with the header row as columns (e.g., as
+    read with read_workbook and keep_default_na=False).
+    
+    """
+    
+    sf = dict()
+    for sn,df in sheets.items():
+        # rearrange as read without header, empty cells as NaN
+        grid = pd.DataFrame(np.vstack([np.asarray(df.columns,
+                                                  dtype=object)[None,:],
+                                       df.to_numpy(dtype=object)]))
+        sf[sn] = grid.mask(grid == "")
+    
+    return _get_sheet_tables(sf, dcfg, use_markers, table_marker)
+
+def _get_sheet_tables(sf,
+                      dcfg,
+                      use_markers,
+                      table_marker):
+    """ Get the cleaned data tables of the sheets of a workbook as read
+    without header.
+    
+    """
+    
+    # list of data tables
+    dts = list()
+    
+    # compile data config into schema for reading
+    schema = _get_read_schema(dcfg)
+    
+    # iterate through sheets
+    for sn,df in sf.items():
+        
+        for h,r,c0,c1 in _get_table_bounds(df, use_markers, table_marker):
+            # get table (its columns are views of the sheet), set column
+            # names and reset index
+            dt = df.iloc[h+1:r,c0:c1]
+            dt.columns = df.iloc[h,c0:c1]
+            dt.index = pd.RangeIndex(len(dt))
+            
+            # check if PARAMETER is used instead of SET column and rename
+            if "PARAMETER" in dt.columns and not dt.empty and dt.loc[0,"PARAMETER"] in schema["sets"]:
+                dt.columns = pd.Index(["SET" if c == "PARAMETER" else c
+                                       for c in dt.columns],
+                                      dtype=object, name=dt.columns.name)
+            
+            dt = _apply_read_schema(dt, schema)
+            
+            # add to list of data tables
+            dts.append(dt)
+    
+    return dts
+
+def _get_read_schema(dcfg):
+    """ Compile the data config into a schema for reading data tables.
+    
+    Parameters
+    ----------
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the same
+        format as used for otoole).
+
+    Returns
+    -------
+    schema : dict
+        Dictionary with set names ('sets'), short names mapped to full
+        names ('short_names'), and names of float parameters
+        ('float_params'), whose value columns are parsed as float.
+
+    """
+    
+    dcfg = DataConfig.wrap(dcfg)
+    
+    return dcfg._lookup("read_schema",
+                        lambda: {"sets":dcfg.sets,
+                                 "short_names":dcfg.short_names,
+                                 "float_params":[n for n in dcfg.params
+                                                 if dcfg[n]["dtype"]
+                                                 == "float"]})
+
+def _apply_read_schema(dt,
+                       schema):
+    """ Replace short names in the PARAMETER (or SET) column of a data table.
+    Only this column is replaced, and only if it includes short names, i.e.,
+    other columns are not copied and can be views of the sheet.
+    
+    """
+    
+    c = "SET" if "SET" in dt.columns else "PARAMETER"
+    if c not in dt.columns:
+        return dt
+    i = dt.columns.get_loc(c)
+    col = dt.iloc[:,i]
+    if col.isin(schema["short_names"].keys()).any():
+        dt.isetitem(i, col.replace(schema["short_names"]))
+    
+    return dt
+
+def _parse_value_columns(params,
+                         schema):
+    """ Parse value columns (VALUE and year columns) of parameter data as
+    float if only used by float parameters.
+    
+    Columns that cannot be parsed are kept as read, and values are cast when
+    preparing parameters.
+    
+    """
+    
+    isfloat = params["PARAMETER"].isin(schema["float_params"]).to_numpy()
+    for c in params.columns:
+        if not (c == "VALUE" or (isinstance(c, (int, np.integer))
+                                 and not isinstance(c, bool))):
+            continue
+        if params[c].dtype != object or params[c][~isfloat].notna().any():
+            continue
+        try:
+            params[c] = params[c].astype("float64")
+        except (ValueError, TypeError):
+            continue
+        
+    return params
+
+def _get_table_bounds(df,
+                      use_markers,
+                      table_marker):
+    """ Get boundaries of the data tables of a sheet.
+    
+    A table ends at the first empty cell in its first column (rows) and in
+    its header row (columns). If markers are used, each table starts with
+    the marker, followed by the header row, otherwise the table starts with
+    the header row in the first cell of the sheet.
+    
+    Parameters
+    ----------
+    df : DataFrame
+        Sheet data as read without header.
+    use_markers: bool
+        If to use markers for tables.
+    table_marker: str
+        String of table marker.
+
+    Returns
+    -------
+    bounds : list of tuples
+        List of tables, each given by the position of the header row, the
+        end row, and the start and end column (end positions exclusive).
+
+    """
+    
+    bounds = list()
+    if df.empty:
+        return bounds
+    
+    # empty cells, computed once for the sheet
+    na = df.isna().to_numpy()
+    
+    def _first(a):
+        # position of first True value or length if none
+        return int(a.argmax()) if a.any() else len(a)
+    
+    if use_markers is False:
+        starts = [(0,0)]
+    else:
+        starts = [(r+1,c) for r,c in np.argwhere(
+                                        (df == table_marker).to_numpy())]
+    
+    for h,c in starts:
+        # skip tables without header row
+        if h >= df.shape[0] or na[h,c]:
+            continue
+        r = h + _first(na[h:,c])
+        c1 = c + _first(na[h,c:])
+        bounds.append((h,r,c,c1))
+        
+    return bounds
+
+def _get_scenario_rows(df,
+                       levers,
+                       scenario,
+                       all_marker):
+    """ Get boolean array of data table rows relevant for a scenario.
+    
+    Parameters
+    ----------
+    df : DataFrame
+        Data table with MODEL and SCENARIO columns and a range index.
+    levers : Series
+        Exploded scenario levers of the data table, i.e., one entry per lever
+        indexed by row.
+    scenario : dict
+        Dictionary describing the scenario (name, model, levers, timehorizon).
+    all_marker : str
+        String of marker symbalizing all values within the applicable set.
+
+    Returns
+    -------
+    rows : numpy.ndarray
+        Boolean array, True for relevant rows.
+
+    """
+    
+    rows = np.zeros(len(df), dtype=bool)
+    rows[levers.index[levers.isin(scenario["levers"])]] = True
+    rows = rows | (df["SCENARIO"] == all_marker).to_numpy()
+    rows = rows & ((df["MODEL"] == scenario["model"])
+                   | (df["MODEL"] == all_marker)).to_numpy()
+    
+    return rows
+
+def _prepare_parameter(df,
+                       v,
+                       dcfg,
+                       years,
+                       rounding,
+                       all_marker):
+    """ Prepare data table rows of a parameter for all scenarios.
+    
+    Parameters
+    ----------
+    df : DataFrame
+        Data table rows of the parameter.
+    v : dict
+        Configuration of the parameter.
+    dcfg : dict or DataConfig
+        Dictionary that includes configuration of OSeMOSYS data (in the same
+        format as used for otoole).
+    years : list
+        Years used across all scenarios.
+    rounding : int
+        The number of digits parameter values are to be rounded to. False
+        for no rounding.
+    all_marker : str
+        String of marker symbalizing all values within the applicable set.
+
+    Returns
+    -------
+    df : DataFrame
+        Parameter data in long format indexed by scenario lever, parameter
+        indices, and the row of the data table.
+    rank : numpy.ndarray
+        Precedence of each row, i.e., rows defined for all scenarios
+        first, followed by the levers in lexicographic order.
+
+    """
+    
+    # drop irrelevant columns
+    df = df.drop(["MODEL","PARAMETER"]
+                 + [c for c in df.columns
+                    if ("YEAR" in v["indices"])
+                    and c not in [s for s in v["indices"]
+                                  if s !="YEAR"]
+                    +years+["SCENARIO"]]
+                 + [c for c in df.columns
+                    if ("YEAR" not in v["indices"])
+                    and c not in (v["indices"]+["VALUE"]+["SCENARIO"])]
+                 ,axis=1)
+    
+    # set and sort index, keeping data table row to allow filtering
+    df = df.rename_axis("ROW").set_index(["SCENARIO"]+[s for s in v["indices"]
+                                                       if s != "YEAR"],
+                                         append=True)
+    df = df.reorder_levels(list(range(1, df.index.nlevels)) + [0])
+    df = df.sort_index()
+    
+    # set dtypes (value columns of float parameters are mostly parsed as
+    # float already)
+    if not (df.dtypes == v["dtype"]).all():
+        df = df.astype(v["dtype"])
+    if v["dtype"] == "str":
+        df = df.replace("nan",pd.NA)
+    if "YEAR" in v["indices"]:
+        df.columns = df.columns.astype(dcfg["YEAR"]["dtype"])
+        
+    # if float round if required
+    if (v["dtype"] == "float") and (rounding != False):
+        df = df.round(rounding)
+        
+    # rearrange params indexed over YEAR
+    if "YEAR" in v["indices"]:
+        df.columns.name = "YEAR"
+        df = df.stack()
+        df.name = "VALUE"
+        df = df.to_frame()
+    
+    # get precedence of rows based on scenario levers
+    sc = df.index.get_level_values("SCENARIO")
+    rank = pd.Categorical(sc,
+                          categories=[all_marker]
+                          +sorted(se for se in sc.unique() if se != all_marker),
+                          ordered=True).codes
+        
+    return df, rank
+
+class _PreparedParameters(Mapping):
+    """ Mapping of parameter names to prepared parameter data for all
+    scenarios, see _prepare_parameter, prepared when first accessed.
+    
+    """
+    
+    def __init__(self, groups, empty, dcfg, years, rounding, all_marker):
+        
+        self._groups = groups
+        self._empty = empty
+        self._dcfg = dcfg
+        self._years = years
+        self._rounding = rounding
+        self.all_marker = all_marker
+        self._data = dict()
+    
+    def __getitem__(self, k):
+        
+        if k not in self._data:
+            self._data[k] = _prepare_parameter(self._groups.get(k,
+                                                                self._empty),
+                                               self._dcfg[k], self._dcfg,
+                                               self._years, self._rounding,
+                                               self.all_marker)
+            
+        return self._data[k]
+    
+    def __iter__(self):
+        
+        return iter(self._dcfg.params)
+    
+    def __len__(self):
+        
+        return sum(1 for k in self)
+
+def _get_parameter_base(pdata,
+                        k,
+                        modelrows,
+                        scenario):
+    """ Get rows of a parameter defined for all scenarios of a model.
+    
+    Parameters
+    ----------
+    pdata : _PreparedParameters
+        Prepared parameter data.
+    k : str
+        Name of parameter.
+    modelrows : numpy.ndarray
+        Boolean array, True for data table rows relevant for the model.
+    scenario : dict
+        Dictionary describing a scenario of the model (name, model, levers,
+        timehorizon).
+
+    Returns
+    -------
+    df : DataFrame
+        Parameter data defined for all scenarios.
+
+    """
+    
+    df, rank = pdata[k]
+    df = df.take(np.flatnonzero((rank == 0)
+                                & modelrows[df.index.get_level_values("ROW")]))
+    
+    # check for duplicates
+    idx = df.index.droplevel("ROW")
+    if idx.has_duplicates:
+        logging.error(f"The values of parameter '{k}' are not unique"
+                        f" for scenario '{scenario['name']}' with model '{scenario['model']}'.")
+        logging.debug("The duplicates are:")
+        logging.debug(df[idx.duplicated(keep=False)])
+        raise ValueError(f"The values of parameter '{k}' are not "
+                        f"unique for scenario '{scenario['name']}' with model '{scenario['model']}'.")
+        
+    return df.droplevel(["SCENARIO","ROW"])
+
+def _get_scenario_parameter(pdata,
+                            k,
+                            rows,
+                            scenario,
+                            delta):
+    """ Get parameter data of a scenario.
+    
+    Parameters
+    ----------
+    pdata : _PreparedParameters
+        Prepared parameter data.
+    k : str
+        Name of parameter.
+    rows : numpy.ndarray
+        Boolean array, True for data table rows relevant for the scenario.
+    scenario : dict
+        Dictionary describing the scenario (name, model, levers,
+        timehorizon).
+    delta : bool
+        If to only get scenario-specific rows, i.e., excluding rows defined
+        for all scenarios.
+
+    Returns
+    -------
+    df : DataFrame
+        Parameter data of the scenario.
+
+    """
+    
+    df, rank = pdata[k]
+    s = scenario
+    
+    # get all relevant values
+    fil = rows[df.index.get_level_values("ROW")]
+    # remove years not to be used
+    if "YEAR" in df.index.names:
+        fil = fil & df.index.get_level_values("YEAR").isin(
+                                    range(*s["timehorizon"]))
+    # only keep scenario-specific rows if delta, with rows defined for all
+    # scenarios (rank 0) in shared base
+    if delta:
+        fil = fil & (rank != 0)
+    # select by position (take), avoiding checks of boolean selections
+    df = df.take(np.flatnonzero(fil))
+    rank = rank[fil]
+    
+    # check for duplicates
+    idx = df.index.droplevel("ROW")
+    isall = idx.get_level_values("SCENARIO") == pdata.all_marker
+    if idx[isall].has_duplicates or idx[~isall].has_duplicates:
+
+        logging.error(f"The values of parameter '{k}' are not unique"
+                        f" for scenario '{s['name']}' with model '{s['model']}'.")
+        logging.debug("The duplicates are:")
+        logging.debug(df[idx.duplicated(keep=False)])
+        raise ValueError(f"The values of parameter '{k}' are not "
+                        f"unique for scenario '{s['name']}' with model '{s['model']}'.")
+        
+    # sort so that rows defined for all scenarios are appearing
+    # first and drop scenario level
+    df = df.take(np.argsort(rank, kind="stable"))
+    df = df.droplevel(["SCENARIO","ROW"])
+    
+    # if duplicates, only use second/last values (specifically defined for
+    # the scenario)
+    df = df.take(np.flatnonzero(~df.index.duplicated(keep="last")))
+    
+    if df.empty and not delta:
+        logging.debug(f"The values for parameter '{k}' are empty "
+                        f"for scenario '{s['name']}' with model '{s['model']}'.")
+        
+    return df
+
+def _read_table_file(f,
+                     **kwargs):
+    """ Read csv or parquet file as sheet, see read_workbook.
+    
+    """
+    
+    if f.endswith(".csv"):
+        return pd.read_csv(f, **kwargs)
+    
+    if pq is None:
+        df = pd.read_parquet(f)
+    else:
+        tbl = pq.read_table(f)
+        meta = (tbl.schema.metadata or dict()).get(b"ospro")
+        df = (tbl.to_pandas() if meta is None
+              else _from_table_file(tbl, json.loads(meta)))
+    # restore year columns (parquet requires str column names)
+    df.columns = [int(c) if isinstance(c, str) and c.isdigit() else c
+                  for c in df.columns]
+    # empty cells as read from spreadsheets without default NaN values
+    if (kwargs.get("keep_default_na", True) is False
+        and "" not in kwargs.get("na_values", [])):
+        for c in df.columns[df.isna().any().to_numpy()]:
+            df[c] = df[c].astype(object).where(df[c].notna(), "")
+    if kwargs.get("header", 0) is None:
+        df = pd.DataFrame(np.vstack([np.array(df.columns, dtype=object),
+                                     df.to_numpy(dtype=object)]))
+        
+    return df
+
+def _write_xlsx_rows(f,
+                     sheets,
+                     index):
+    """ Write sheets to spreadsheet file row by row using xlsxwriter in
+    constant memory mode, see write_workbook.
+    
+    The cells written are the same as for pandas.DataFrame.to_excel (with
+    merge_cells=False), but header and index cells are not formatted.
+
+    """
+    
+    wb = xlsxwriter.Workbook(f, {"constant_memory":True,
+                                 "strings_to_formulas":False,
+                                 "strings_to_urls":False,
+                                 "nan_inf_to_errors":True})
+    try:
+        for n,df in sheets.items():
+            ws = wb.add_worksheet(n)
+            if index(n):
+                df = df.reset_index()
+            ws.write_row(0, 0, ["" if c is None else _scalar(c)
+                                for c in df.columns])
+            vals = df.to_numpy(dtype=object)
+            vals[pd.isna(vals)] = None
+            for r,row in enumerate(vals.tolist(), start=1):
+                ws.write_row(r, 0, [_scalar(v) for v in row])
+    finally:
+        wb.close()
+
+def _scalar(v):
+    """ Get Python scalar of numpy scalar.
+    
+    """
+    
+    return v.item() if isinstance(v, np.generic) else v
+
+def _write_table_file(df,
+                      f):
+    """ Write sheet to csv or parquet file, see write_workbook.
+    
+    Column names are stored as str for parquet files. Object columns with a
+    mix of str, int, and float values (as read from spreadsheets) are stored
+    as one column per type, which are combined when the file is read.
+
+    """
+    
+    if f.endswith(".csv"):
+        df.to_csv(f, index=False)
+        return
+    
+    cols = dict()
+    mixed = dict()
+    for i in range(df.shape[1]):
+        n = str(df.columns[i])
+        col = df.iloc[:,i]
+        if (col.dtype == object
+            and pd.api.types.infer_dtype(col, skipna=True)
+            not in ["string","integer","floating","boolean","empty"]):
+            adf, m = _to_arrow_frame(col.to_frame())
+            mixed[n] = [c.split("_")[1] for c in adf.columns]
+            for c,ts in zip(adf.columns, mixed[n]):
+                cols[f"{n}.{ts}"] = adf[c]
+        else:
+            cols[n] = col.to_numpy()
+    
+    tbl = pa.Table.from_pandas(pd.DataFrame(cols, index=range(len(df))),
+                               preserve_index=False)
+    tbl = tbl.replace_schema_metadata({**(tbl.schema.metadata or dict()),
+                                       b"ospro":json.dumps({"mixed":mixed})})
+    pq.write_table(tbl, f)
+
+def _from_table_file(tbl, meta):
+    """ Restore sheet from (arrow table of) parquet file as written by
+    _write_table_file.
+    
+    """
+    
+    cols = dict()
+    for c in tbl.column_names:
+        n, _, ts = c.rpartition(".")
+        if n not in meta["mixed"]:
+            cols[c] = tbl.column(c).to_pandas().to_numpy()
+            continue
+        if n not in cols:
+            cols[n] = np.full(tbl.num_rows, np.nan, dtype=object)
+        col = tbl.column(c)
+        fil = col.is_valid().to_numpy(zero_copy_only=False)
+        cols[n][fil] = col.drop_null().to_pylist()
+    
+    return pd.DataFrame(cols, index=range(tbl.num_rows))
+
+def _is_table_dir(path):
+    """ Check if path is a directory with parquet files, i.e., a workbook
+    written by write_workbook.
+    
+    """
+    
+    return (os.path.isdir(path)
+            and any(f.endswith(".parquet") for f in os.listdir(path)))
+
+def _get_source_files(f):
+    """ Get the files of a spreadsheet file or directory read as workbook.
+    
+    """
+    
+    if not os.path.isdir(f):
+        return [f]
+    
+    return [os.path.join(f, n) for n in sorted(os.listdir(f))
+            if n.endswith((".csv",".parquet"))]
+
+def _cache_key(f,
+               dcfg,
+               use_markers,
+               table_marker,
+               engine):
+    """ Get cache key for the data tables of a spreadsheet file.
+    
+    The key is based on the content of the file and the configuration
+    entries used when cleaning the data tables.
+
+    """
+    
+    h = hashlib.sha256()
+    for sf in _get_source_files(f):
+        if sf != f:
+            h.update(os.path.basename(sf).encode())
+        with open(sf, "rb") as fh:
+            for chunk in iter(lambda: fh.read(2**20), b""):
+                h.update(chunk)
+            
+    dcfg = DataConfig.wrap(dcfg)
+    cfg = {"sets":sorted(dcfg.sets),
+           "short_names":sorted(dcfg.short_names.items()),
+           "use_markers":use_markers,
+           "table_marker":table_marker,
+           "engine":engine,
+           "version":_CACHE_VERSION}
+    h.update(json.dumps(cfg, sort_keys=True, default=str).encode())
+    
+    return h.hexdigest()
+
+def _load_cached_tables(cache_dir, key):
+    """ Load data tables from cache, returns None if not cached.
+    
+    """
+    
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry, "meta.json")):
+        return None
+    
+    try:
+        with open(os.path.join(entry, "meta.json")) as fh:
+            meta = json.load(fh)
+        dts = [_from_arrow_frame(pq.read_table(os.path.join(entry,
+                                                             f"{i}.parquet")),
+                                 m)
+               for i,m in enumerate(meta["tables"])]
+    except (OSError, ValueError, KeyError, pa.ArrowException) as exc:
+        logging.warning(f"Could not load cache entry {key}, entry is"
+                        f" removed ({exc}).")
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    
+    # update access time for LRU eviction
+    os.utime(entry)
+    
+    return dts
+
+def _save_cached_tables(cache_dir, key, f, dts, cache_size):
+    """ Save data tables to cache and evict least recently used entries.
+    
+    """
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    # write to temporary directory first, then move in place
+    tmp = os.path.join(cache_dir, f".{key}.{os.getpid()}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+    meta = {"source":os.path.abspath(f),
+            "created":time.time(),
+            "tables":list()}
+    for i,dt in enumerate(dts):
+        adf, m = _to_arrow_frame(dt)
+        adf.to_parquet(os.path.join(tmp, f"{i}.parquet"), index=False)
+        meta["tables"].append(m)
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+    try:
+        os.rename(tmp, os.path.join(cache_dir, key))
+    except OSError:
+        # entry has been created concurrently
+        shutil.rmtree(tmp, ignore_errors=True)
+        
+    _evict_cache(cache_dir, cache_size)
+
+def _evict_cache(cache_dir, cache_size):
+    """ Remove least recently used cache entries until size is not exceeded.
+    
+    """
+    
+    entries = list()
+    for e in os.scandir(cache_dir):
+        if not e.is_dir() or e.name.startswith("."):
+            continue
+        try:
+            size = sum(fe.stat().st_size for fe in os.scandir(e.path))
+            entries.append((e.stat().st_mtime, size, e.path))
+        except OSError:
+            # entry removed concurrently
+            continue
+        
+    total = sum(e[1] for e in entries)
+    for atime, size, path in sorted(entries):
+        if total <= cache_size:
+            break
+        logging.debug(f"Removing cache entry {path}.")
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def _to_arrow_frame(dt):
+    """ Convert data table into a frame that can be stored as parquet file.
+    
+    Object columns can hold a mix of str, int, and float values (as read from
+    spreadsheets), which is preserved by splitting them into one column per
+    type.
+
+    """
+    
+    def _code(v):
+        if isinstance(v, str):
+            return "s"
+        if isinstance(v, (bool, np.bool_)):
+            return "b"
+        if isinstance(v, (int, np.integer)):
+            return "i"
+        if pd.isna(v):
+            return ""
+        if isinstance(v, (float, np.floating)):
+            return "f"
+        return "o"
+    
+    cols = dict()
+    meta = {"columns":[[type(_scalar(c)).__name__, _scalar(c)]
+                       for c in dt.columns],
+            "columns_name":_scalar(dt.columns.name),
+            "length":len(dt),
+            "dtypes":list()}
+    for i in range(dt.shape[1]):
+        col = dt.iloc[:,i]
+        meta["dtypes"].append(str(col.dtype))
+        if col.dtype != object:
+            cols[f"{i}"] = col.to_numpy()
+            continue
+        vals = col.to_numpy()
+        codes = np.array([_code(v) for v in vals], dtype=object)
+        # other values (e.g., dates) are stored as strings
+        if (codes == "o").any():
+            vals = np.where(codes == "o", vals.astype(str), vals)
+            codes[codes == "o"] = "s"
+        for ts,dtype in [("s","string"),("b","boolean"),
+                         ("i","Int64"),("f","Float64")]:
+            fil = codes == ts
+            if fil.any():
+                cols[f"{i}_{ts}"] = pd.Series(np.where(fil, vals, None),
+                                              dtype=object).astype(dtype)
+    
+    return pd.DataFrame(cols, index=range(len(dt))), meta
+
+def _from_arrow_frame(tbl, meta):
+    """ Restore data table from (arrow table of) frame as created by
+    _to_arrow_frame.
+    
+    """
+    
+    names = set(tbl.column_names)
+    cols = list()
+    for i,dtype in enumerate(meta["dtypes"]):
+        if dtype != "object":
+            col = tbl.column(f"{i}").to_numpy()
+            if str(col.dtype) != dtype:
+                col = pd.Series(col).astype(dtype).to_numpy()
+            cols.append(col)
+            continue
+        vals = np.full(meta["length"], np.nan, dtype=object)
+        for ts in ["f","i","b","s"]:
+            if f"{i}_{ts}" in names:
+                col = tbl.column(f"{i}_{ts}")
+                fil = col.is_valid().to_numpy(zero_copy_only=False)
+                vals[fil] = col.drop_null().to_pylist()
+        cols.append(vals)
+    
+    dt = pd.DataFrame(dict(enumerate(cols)), index=range(meta["length"]))
+    dt.columns = pd.Index([{"int":int,"float":float,"str":str,"bool":bool}
+                           .get(t, lambda v: v)(v)
+                           for t,v in meta["columns"]], dtype=object,
+                          name=meta["columns_name"])
+    
+    return dt
+
+def _get_index_levels(idx):
+    """ Get names and (unique) values of the levels of an index.
+    
+    """
+    
+    if isinstance(idx, pd.MultiIndex):
+        return list(zip(idx.names, idx.levels))
+    
+    return [(idx.name, idx.unique())]
+
+def _decode_index(idx):
+    """ Convert categorical index to index of its values.
+    
+    """
+    
+    if isinstance(idx, pd.CategoricalIndex):
+        return idx.astype(idx.categories.dtype)
+    
+    return idx
+
+def _encode_frame(df, vocabulary, name=None):
+    """ Encode index levels (and the VALUE column of a set) of a DataFrame,
+    see encode_sets.
+    
+    """
+    
+    if name in vocabulary and "VALUE" in df.columns:
+        df = df.astype({"VALUE":vocabulary[name]})
+    
+    if isinstance(df.index, pd.MultiIndex):
+        lev = [i for i,n in enumerate(df.index.names) if n in vocabulary]
+        if lev:
+            df = df.set_axis(df.index.set_levels(
+                    [pd.CategoricalIndex(_decode_index(df.index.levels[i]),
+                                         dtype=vocabulary[df.index.names[i]])
+                     for i in lev],
+                    level=lev, verify_integrity=False), axis=0)
+    elif df.index.name in vocabulary:
+        df = df.set_axis(pd.CategoricalIndex(_decode_index(df.index),
+                                             dtype=vocabulary[df.index.name],
+                                             name=df.index.name), axis=0)
+        
+    return df
+
+def _decode_frame(df):
+    """ Decode categorical index levels and columns of a DataFrame, see
+    encode_sets. DataFrames without categoricals are returned as they are.
+    
+    """
+    
+    cols = {c:dt.categories.dtype for c,dt in df.dtypes.items()
+            if isinstance(dt, pd.CategoricalDtype)}
+    if cols:
+        df = df.astype(cols)
+    
+    if isinstance(df.index, pd.MultiIndex):
+        lev = [i for i,l in enumerate(df.index.levels)
+               if isinstance(l, pd.CategoricalIndex)]
+        if lev:
+            df = df.set_axis(df.index.set_levels(
+                            [_decode_index(df.index.levels[i]) for i in lev],
+                            level=lev, verify_integrity=False), axis=0)
+    elif isinstance(df.index, pd.CategoricalIndex):
+        df = df.set_axis(_decode_index(df.index), axis=0)
+        
+    return df
+
+def _level_isin(idx, name, values):
+    """ Check if values of an index level are in values, evaluating unique
+    level values only.
+    
+    """
+    
+    if not isinstance(idx, pd.MultiIndex):
+        return idx.isin(values)
+    
+    i = idx.names.index(name)
+    # append result for missing values (code -1)
+    isin = np.append(_decode_index(idx.levels[i]).isin(values),
+                     pd.Index([np.nan], dtype=object).isin(values))
+    
+    return isin[idx.codes[i]]
+
+def _product_sum(frames, by):
+    """ Multiply the VALUE columns of DataFrames, aligned on their common
+    index levels, and sum the product by groups of index levels.
+    
+    The DataFrames are joined on index levels coded with a vocabulary
+    shared by all DataFrames, which is considerably faster than aligning
+    the MultiIndexes. Rows with missing values are dropped. Levels encoded
+    as categoricals (see encode_sets) stay encoded.
+    
+    Parameters
+    ----------
+    frames : list of DataFrames
+        DataFrames with VALUE column.
+    by : list of lists
+        Index levels to group the product by for each result.
+
+    Returns
+    -------
+    list of DataFrames
+        Sum of product for each group of index levels.
+
+    """
+    
+    levels = dict()
+    dtypes = dict()
+    for df in frames:
+        for n,lev in _get_index_levels(df.index):
+            levels.setdefault(n, list()).append(_decode_index(lev))
+            if isinstance(lev, pd.CategoricalIndex):
+                dtypes[n] = lev.dtype
+    vocabulary = dict()
+    for n,v in levels.items():
+        vocab = v[0].append(v[1:]).unique().dropna()
+        try:
+            vocab = vocab.sort_values()
+        except TypeError:
+            pass
+        vocabulary[n] = pd.CategoricalDtype(vocab)
+    
+    # get long frames with coded index levels
+    cfs = list()
+    for df in frames:
+        idx = df.index
+        if not isinstance(idx, pd.MultiIndex):
+            idx = pd.MultiIndex.from_arrays([idx])
+        cols = dict()
+        for i,n in enumerate(idx.names):
+            pos = vocabulary[n].categories.get_indexer(
+                                                _decode_index(idx.levels[i]))
+            codes = np.where(idx.codes[i] == -1, -1, pos[idx.codes[i]])
+            cols[n] = pd.Categorical.from_codes(codes, dtype=vocabulary[n])
+        cols["VALUE"] = df["VALUE"].to_numpy()
+        cfs.append(pd.DataFrame(cols))
+    
+    # join and multiply values
+    jdf = cfs[0]
+    for cf in cfs[1:]:
+        on = [c for c in cf.columns if c in jdf.columns and c != "VALUE"]
+        jdf = jdf.merge(cf, on=on, suffixes=("","_r"))
+        jdf["VALUE"] = jdf["VALUE"]*jdf.pop("VALUE_r")
+    jdf = jdf.dropna(subset=["VALUE"])
+    
+    res = list()
+    for b in by:
+        df = jdf.groupby(b, observed=True, sort=True)[["VALUE"]].sum()
+        if isinstance(df.index, pd.MultiIndex):
+            df.index = df.index.remove_unused_levels()
+        # decode levels, or use encoding of data frames
+        df = _decode_frame(df)
+        df = _encode_frame(df, {n:dtypes[n] for n in b if n in dtypes})
+        res.append(df)
+        
+    return res
          
 def _create_data_deepcopy(data):
     
     d = dict()
     for s in data.keys():
+        # share rows not materialized for scenario data containers
+        if isinstance(data[s], ScenarioData):
+            d[s] = data[s].copy()
+            for k in d[s]._data.keys():
+                d[s]._data[k] = _decode_frame(d[s]._data[k])
+            continue
         d[s] = dict()
         for k,v in data[s].items():
-            d[s][k] = v.copy(deep=True)
+            d[s][k] = _decode_frame(v.copy(deep=True))
             
     return d
 
+class _ModelMatrix:
+    """ Linear program assembled from arrays of column and row positions,
+    see build_model.
+
+    Columns and rows are added as arrays of positions with the shape of the
+    domain of a variable or constraint (-1 for members not included).
+    Terms are added as arrays of row positions, column positions, and
+    coefficients, which are broadcast against each other.
+
+    """
+
+    def __init__(self):
+
+        self.variables = dict()
+        self.offset = 0.0
+        self._cols = 0
+        self._rows = 0
+        self._col_bounds = list()
+        self._row_bounds = list()
+        self._cost = list()
+        self._terms = list()
+
+    def add_columns(self, name, dims, shape, mask=True, lower=0.0,
+                    upper=np.inf):
+
+        mask = np.broadcast_to(mask, shape)
+        ids = np.full(shape, -1, dtype=np.int64)
+        n = int(mask.sum())
+        ids[mask] = np.arange(self._cols, self._cols + n)
+        self._cols += n
+        self._col_bounds.append((np.full(n, lower, dtype=float),
+                                 np.full(n, upper, dtype=float)))
+        self.variables[name] = (ids, dims)
+
+        return ids
+
+    def add_rows(self, shape, lower, upper, mask=True):
+
+        mask = np.broadcast_to(mask, shape)
+        ids = np.full(shape, -1, dtype=np.int64)
+        n = int(mask.sum())
+        ids[mask] = np.arange(self._rows, self._rows + n)
+        self._rows += n
+        self._row_bounds.append(
+            (np.broadcast_to(lower, shape)[mask].astype(float),
+             np.broadcast_to(upper, shape)[mask].astype(float)))
+
+        return ids
+
+    def add_terms(self, rows, cols, values):
+
+        rows, cols, values = np.broadcast_arrays(rows, cols, values)
+        keep = (rows >= 0) & (cols >= 0) & (values != 0)
+        self._terms.append((rows[keep], cols[keep],
+                            values[keep].astype(float)))
+
+    def add_cost(self, cols, values):
+
+        cols, values = np.broadcast_arrays(cols, values)
+        keep = (cols >= 0) & (values != 0)
+        self._cost.append((cols[keep], values[keep].astype(float)))
+
+    def to_csc(self):
+
+        model = dict()
+
+        model["col_cost"] = np.zeros(self._cols)
+        for cols,values in self._cost:
+            np.add.at(model["col_cost"], cols, values)
+        for k,i in [("col_lower",0), ("col_upper",1)]:
+            model[k] = np.concatenate([b[i] for b in self._col_bounds])
+        for k,i in [("row_lower",0), ("row_upper",1)]:
+            model[k] = np.concatenate([b[i] for b in self._row_bounds])
+
+        # sum duplicate entries and sort by column, then row
+        rows = np.concatenate([t[0] for t in self._terms])
+        cols = np.concatenate([t[1] for t in self._terms])
+        values = np.concatenate([t[2] for t in self._terms])
+        keys, inv = np.unique(cols*max(self._rows, 1) + rows,
+                              return_inverse=True)
+        values = np.bincount(inv, weights=values, minlength=len(keys))
+        keep = values != 0
+        keys = keys[keep]
+        model["a_value"] = values[keep]
+        model["a_index"] = (keys % max(self._rows, 1)).astype(np.int32)
+        model["a_start"] = np.searchsorted(
+            keys // max(self._rows, 1),
+            np.arange(self._cols + 1)).astype(np.int32)
+
+        model["offset"] = self.offset
+        model["variables"] = self.variables
+
+        return model
+
+def _get_model_set(data, dcfg, name):
+    """ Get unique values of a set as index, see build_model.
+
+    """
+
+    if name not in data.keys():
+        return pd.Index([])
+
+    df = _decode_frame(data[name])
+    values = df["VALUE"][df["VALUE"] != ""].dropna()
+
+    return pd.Index(values.astype(dcfg[name]["dtype"] if name in dcfg
+                                  else str)).unique()
+
+def _get_model_param(data, dcfg, name, sets, dense=True):
+    """ Get values of a parameter as array over the given sets (filled with
+    the default value), or, if not dense, as tuple of the positions of the
+    set values and the values of the non-zero entries, see build_model.
+
+    """
+
+    default = float(dcfg[name].get("default", 0)) if name in dcfg else 0.0
+    if not dense and default != 0:
+        raise ValueError(f"Parameter '{name}' requires a default value of"
+                         " 0 to be used in the model.")
+
+    df = (_decode_frame(data[name]) if name in data.keys()
+          else pd.DataFrame(columns=["VALUE"]))
+    values = pd.to_numeric(df["VALUE"], errors="coerce").to_numpy(dtype=float)
+    if len(values) > 0 and df.index.nlevels != len(sets):
+        raise ValueError(f"Parameter '{name}' is indexed over"
+                         f" {df.index.nlevels} sets, but the model requires"
+                         f" {len(sets)}.")
+
+    # positions of set values, values not in sets are omitted
+    pos = [s.get_indexer(df.index.get_level_values(i).astype(s.dtype))
+           if len(values) > 0 else np.zeros(0, dtype=np.int64)
+           for i,s in enumerate(sets)]
+    keep = ~np.isnan(values)
+    for p in pos:
+        keep &= p >= 0
+    pos = tuple(p[keep] for p in pos)
+    values = values[keep]
+
+    if not dense:
+        keep = values != 0
+        return tuple(p[keep] for p in pos), values[keep]
+
+    arr = np.full(tuple(len(s) for s in sets), default)
+    arr[pos] = values
+
+    return arr
+
+def _get_model_results(model, values, dcfg):
+    """ Get values of the variables of a model built with build_model as
+    DataFrames, index levels are named as in the data config.
+
+    """
+
+    dcfg = DataConfig.wrap(dcfg)
+
+    results = dict()
+    for v,(ids,dims) in model["variables"].items():
+        mask = ids >= 0
+        if not mask.any():
+            continue
+        # second occurrences of sets are prefixed, e.g., _REGION for Trade
+        names = (dcfg[v]["indices"] if v in dcfg
+                 else [d if d not in dims[:i] else "_"+d
+                       for i,d in enumerate(dims)])
+        idx = pd.MultiIndex(levels=[model["sets"][d] for d in dims],
+                            codes=np.nonzero(mask),
+                            names=names,
+                            verify_integrity=False)
+        results[v] = pd.DataFrame({"VALUE":values[ids[mask]]}, index=idx)
+
+    return results
@@ -0,0 +1,365 @@
+"""
+
+Registry of raw input data sources of CORE-WESM
+
+
+"""
+
+import os
+import time
+import json
+import shutil
+import hashlib
+import logging
+from collections import OrderedDict
+
+import pandas as pd
+
+import ospro as op
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# version of cached tables, to be increased if readers change
+_CACHE_VERSION = 1
+
+# readers of registered raw data sources, by name
+SOURCES = dict()
+
+# normalised tables, by cache key, least recently used first
+_TABLES = OrderedDict()
+# maximum number of tables kept in memory
+_TABLES_SIZE = 8
+
+
+def register_source(name):
+    """ Register reader of a raw data source (decorator).
+
+    The reader is called with the file path of the source, the file path to
+    the list of counties, and the engine to read spreadsheet files, and
+    returns a normalised, typed table indexed by REGION (county codes).
+
+    Parameters
+    ----------
+    name : str
+        Name of the raw data source.
+
+    Returns
+    -------
+    function
+        Decorator registering the reader.
+
+    """
+
+    def decorator(func):
+        SOURCES[name] = func
+        return func
+
+    return decorator
+
+def load_source(name, path, list_counties=None, engine=None, cache_dir=None):
+    """ Load normalised table of a raw data source.
+
+    The most recently used tables are cached in memory and, if a cache
+    directory is provided, all tables are cached as parquet files on disk
+    (requires pyarrow). Cache entries are keyed by the content of the source
+    file, the list of counties, and the SOURCES.txt file describing the raw
+    data (searched for in the parent directories of the source file).
+
+    Parameters
+    ----------
+    name : str
+        Name of the raw data source (see SOURCES).
+    path : str
+        File path to the raw data source.
+    list_counties : str, optional
+        File path to list of counties, required for sources that map county
+        names to codes. The default is None.
+    engine : str, optional
+        Engine used to read spreadsheet files (see ospro.read_workbook).
+        The default is None.
+    cache_dir : str, optional
+        Path to directory used to cache tables on disk. The default is
+        None.
+
+    Raises
+    ------
+    KeyError
+        Raised if the raw data source is not registered.
+
+    Returns
+    -------
+    DataFrame
+        Normalised table of the raw data source.
+
+    """
+
+    if name not in SOURCES:
+        raise KeyError(f"Raw data source '{name}' is not registered.")
+
+    key = _get_cache_key(name, path, list_counties)
+    if key in _TABLES:
+        _TABLES.move_to_end(key)
+        return _TABLES[key].copy()
+
+    entry = (None if cache_dir is None or pa is None
+             else os.path.join(cache_dir, key))
+    df = None if entry is None else _load_cached_table(entry)
+    if df is None:
+        df = SOURCES[name](path, list_counties, engine)
+        if entry is not None:
+            _save_cached_table(cache_dir, entry, path, df)
+    else:
+        logger.debug(f"Raw data source '{name}' loaded from cache.")
+
+    _TABLES[key] = df
+    if len(_TABLES) > _TABLES_SIZE:
+        _TABLES.popitem(last=False)
+
+    return df.copy()
+
+def _get_cache_key(name, path, list_counties):
+    """ Get cache key of a raw data source based on the content of its file,
+    the list of counties, and SOURCES.txt.
+    """
+
+    files = [path]
+    if list_counties is not None:
+        files.append(list_counties)
+    d = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.isfile(os.path.join(d, "SOURCES.txt")):
+            files.append(os.path.join(d, "SOURCES.txt"))
+            break
+        if os.path.dirname(d) == d:
+            break
+        d = os.path.dirname(d)
+
+    h = hashlib.sha256(json.dumps([name, _CACHE_VERSION]).encode())
+    for f in files:
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(2**20), b""):
+                h.update(chunk)
+
+    return h.hexdigest()
+
+def _load_cached_table(entry):
+    """ Load table from cache entry, returns None if not cached.
+    """
+
+    if not os.path.isfile(os.path.join(entry, "meta.json")):
+        return None
+
+    try:
+        with open(os.path.join(entry, "meta.json")) as fh:
+            meta = json.load(fh)
+        df = pd.read_parquet(os.path.join(entry, "table.parquet"))
+    except (OSError, ValueError, KeyError, pa.ArrowException) as exc:
+        logger.warning(f"Could not load cache entry {entry}, entry is"
+                       f" removed ({exc}).")
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+    df.columns = pd.Index([int(c) if t == "int" else c
+                           for c,t in zip(df.columns, meta["column_types"])])
+
+    # update access time for LRU eviction
+    os.utime(entry)
+
+    return df
+
+def _save_cached_table(cache_dir, entry, path, df):
+    """ Save table to cache entry (with the layout used by ospro, i.e., it
+    can be invalidated with ospro.invalidate_cache).
+    """
+
+    # write to temporary directory first, then move in place
+    tmp = os.path.join(cache_dir,
+                       f".{os.path.basename(entry)}.{os.getpid()}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+    df.rename(columns=str).to_parquet(os.path.join(tmp, "table.parquet"))
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump({"source":os.path.abspath(path),
+                   "created":time.time(),
+                   "column_types":["int" if isinstance(c, int) else "str"
+                                   for c in df.columns]}, fh)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # entry has been created concurrently
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _to_county_codes(index, list_counties):
+    """ Map county names of KNBS tables to county codes, other names (e.g.,
+    'Kenya', 'Rural', 'Urban') are kept.
+    """
+
+    counties = pd.read_csv(list_counties,
+                           keep_default_na=False)
+    index = index.astype(str).map(lambda n: {"Nairobi City":"Nairobi",
+                                             "Homabay":"HomaBay",
+                                             "Taita-Taveta":"TaitaTaveta"}.get(n, n))
+    index = index.str.replace(" ","")
+    mapping = counties.loc[:,["ID","NAME"]].set_index("NAME")["ID"].to_dict()
+
+    return pd.Index([mapping.get(n, n) for n in index], name="REGION")
+
+
+#%% Raw data sources
+
+
+@register_source("housing_cooking_fuel")
+def _read_housing_cooking_fuel(path, list_counties, engine):
+    """ KNBS Housing Survey Table 5.7, main cooking fuel (%) and number of
+    households, aggregated to stove technologies.
+    """
+
+    df = op.read_workbook(path,
+                          engine=engine,
+                          sheet_name="Table 5.7",
+                          skiprows=2,
+                          usecols="A:S"
+                          )
+    df.columns = ['Geography',
+                  'ELC001',
+                  'ELC001',
+                  'ELC001',
+                  'ELC001',
+                  'BGS001',
+                  'LPG001',
+                  'ETH001',
+                  'NA',
+                  'BIO00X',
+                  'BIO00X',
+                  'CHC00X',
+                  'BIO00X',
+                  'BIO00X',
+                  'BIO00X',
+                  'KER001',
+                  'NA',
+                  'BIO00X',
+                  'HH']
+    df = df.loc[df["Geography"] != "County"].set_index("Geography")
+    df.columns.names = ["Stoves"]
+    df = df.T.groupby("Stoves").sum().T
+    df.index = _to_county_codes(df.index, list_counties)
+
+    return df.astype(float)
+
+@register_source("housing_cooking_stoves")
+def _read_housing_cooking_stoves(path, list_counties, engine):
+    """ KNBS Housing Survey Table 5.8, main cooking appliance (%).
+    """
+
+    df = op.read_workbook(path,
+                          engine=engine,
+                          sheet_name="Table 5.8",
+                          skiprows=1,
+                          usecols="A:N"
+                          )
+    df.columns = ["Geography"] + list(df.columns[1:])
+    df = df.loc[df["Geography"] != "County"].set_index("Geography")
+    df.index = _to_county_codes(df.index, list_counties)
+
+    return df.astype(float)
+
+@register_source("housing_urban_rural")
+def _read_housing_urban_rural(path, list_counties, engine):
+    """ KNBS Housing Survey Table 3.5, distribution of households by rural
+    and urban residence (%) and number of households.
+    """
+
+    df = op.read_workbook(path,
+                          engine=engine,
+                          sheet_name="Table 3.5",
+                          skiprows=2,
+                          usecols="A:D"
+                          )
+    df.columns = ["Geography","Rural","Urban","Total"]
+    df = df.loc[df["Geography"] != "County"].set_index("Geography")
+    df.index = _to_county_codes(df.index, list_counties)
+
+    return df.astype(float)
+
+@register_source("population")
+def _read_population(path, list_counties, engine):
+    """ KNBS population projections by county and year.
+    """
+
+    df = pd.read_csv(path,
+                     keep_default_na=False,
+                     index_col= "ID")
+    df = df.loc[df.index != "",
+                [c for c in df.columns if c.isdigit()]]
+    df = df.apply(pd.to_numeric)
+    df.columns = df.columns.astype(int)
+    df.index.name = "REGION"
+
+    return df
+
+@register_source("population_urban_rural")
+def _read_population_urban_rural(path, list_counties, engine):
+    """ KNBS Census 2019, urban and rural population by county.
+    """
+
+    df = pd.read_csv(path,
+                     keep_default_na=False,
+                     skiprows=3,
+                     usecols = [2,5,8],
+                     index_col= "ID",
+                     thousands=",")
+    df = df.loc[df.index != ""]
+    df = df.apply(pd.to_numeric)
+    df.columns = ["Urban","Rural"]
+    df.index.name = "REGION"
+
+    return df
+
+@register_source("gcp")
+def _read_gcp(path, list_counties, engine):
+    """ KNBS Gross County Product by economic sector ('Sec_1' to 'Sec_19').
+    """
+
+    df = pd.read_csv(path,
+                     keep_default_na=False,
+                     usecols= ["ID"] + ["Sec_"+str(i) for i in range (1,20)],
+                     index_col = "ID")
+    df = df.loc[df.index != ""]
+    df = df.apply(pd.to_numeric)
+    df.index.name = "REGION"
+
+    return df
+
+@register_source("electricity_access")
+def _read_electricity_access(path, list_counties, engine):
+    """ Household electricity access by county and year (Fields et al.,
+    2025).
+    """
+
+    df = pd.read_csv(path,
+                     usecols=[2,4,5,6,7],
+                     index_col=[0],
+                     keep_default_na=False
+                     )
+    df.index.name = "REGION"
+    df.columns = df.columns.astype(int)
+
+    return df
+
+@register_source("market_segmentation")
+def _read_market_segmentation(path, list_counties, engine):
+    """ Clean cooking market segmentation by county (Kenya National Cooking
+    Transition Strategy), households by quintiles 'Q1' to 'Q4'.
+    """
+
+    df = pd.read_csv(path,
+                     usecols=[3,4,5,6,7,8],
+                     index_col=[0],
+                     keep_default_na=False
+                     )
+    df.index.name = "REGION"
+
+    return df
@@ -7,7 +7,6 @@ Functions for running CORE-WESM
 
 import os
 import logging
-import yaml
 
 import pandas as pd
 
@@ -30,6 +29,10 @@ def run_model(dataconfig_file,
               agg_config = None,
               agg_timeslices = None,
               solve = "optimize",
+              solver = None,
+              cache_dir = None,
+              n_workers = 1,
+              engine = None,
               overwrite = False):
 
     
@@ -42,14 +45,18 @@ def run_model(dataconfig_file,
                          " the model.")
             return
         
+    # build the model in-process if its formulation is implemented in
+    # ospro.build_model, otherwise translate it with glpsol
+    if solver is None:
+        solver = ("highs-native"
+                  if (os.path.basename(model_file_path)
+                      == "osemosys_preprocessing_adapted_f.txt")
+                  else "highs")
+
     #%% Load config file
             
     # load data config file
-    with open(dataconfig_file) as s:    
-        try:
-            dcfg = yaml.safe_load(s)
-        except yaml.YAMLError as exc:
-            logger.error(exc)  
+    dcfg = op.DataConfig.from_file(dataconfig_file)
         
 #%% Load CORE-WESM data and process data
     
@@ -57,7 +64,10 @@ def run_model(dataconfig_file,
     data = op.read_spreadsheets(path = input_path,
                                 scenario_list = scenario_list,
                                 all_marker = "#ALL",
-                                dcfg = dcfg)
+                                dcfg = dcfg,
+                                cache_dir = cache_dir,
+                                n_workers = n_workers,
+                                engine = engine)
     # rename set
     if rename_set is not None:
         data, dcfg = op.rename_set(mapping=rename_set,
@@ -169,7 +179,8 @@ def run_model(dataconfig_file,
                                glpk_dir = glpk_dir,
                                results_path = output_path,
                                scenario_list = [v["name"] for v in scenario_list],
-                               dcfg = dcfg)
+                               dcfg = dcfg,
+                               solver = solver)
         
         ### Process and save results
         
@@ -221,7 +232,8 @@ def run_model(dataconfig_file,
                                    glpk_dir = glpk_dir,
                                    results_path = output_path,
                                    scenario_list = [v["name"] for v in scenario_list],
-                                   dcfg = dcfg)
+                                   dcfg = dcfg,
+                                   solver = solver)
                 # load and expand results
                 res_list.append(res)
     
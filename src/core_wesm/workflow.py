@@ -45,48 +45,65 @@ with open("config_files/analysis_config_"+rcfg["name"]+".yaml") as stream:
         
 logger.info("Config files loaded.")
 
-#%% Convert the datafile to a spreadsheet file
-dp.convert_datafile(dataconfig_file = pcfg["filepaths"]["data_config_file_NM"],
-                    data_file = pcfg["filepaths"]["national_data_file"],
-                    output_file = pcfg["filepaths"]["national_spreadsheet_file"],
-                    overwrite=True)
-
+# if to pass data between stages in memory, saving models only as checkpoints
+in_memory = pcfg["io"]["in_memory"]
+save = pcfg["io"]["checkpoints"] or not in_memory
 
 #%% Downscale to a county-resolved model
-dp.downscale(input_file = pcfg["filepaths"]["national_spreadsheet_file"],
-              dataconfig_file = pcfg["filepaths"]["data_config_file_NM"],
-              tech_sector_mapping = pcfg["filepaths"]["tech_to_sector_mapping_file"],
-              comm_sector_mapping = pcfg["filepaths"]["comm_to_sector_mapping_file"],
-              list_counties = pcfg["filepaths"]["list_counties_file"],
-              pop_file = pcfg["filepaths"]["pop_file"],
-              pop_file_ruur = pcfg["filepaths"]["pop_file_ruur"],
-              gdp_file = pcfg["filepaths"]["gdp_file"],
-              county_sectors = pcfg["downscaling"]["downscaled_sectors"],
-              remove_fte_tech_mode = pcfg["downscaling"]["remove_fte_tech_mode"],
-              output_path = pcfg["filepaths"]["downscaled_model_path"],
-              overwrite=True)
+# (the datafile is parsed directly, it can be converted to a spreadsheet
+# file, e.g., for inspection, using dp.convert_datafile)
+model = dp.downscale(input_file = pcfg["filepaths"]["national_data_file"],
+                      dataconfig_file = pcfg["filepaths"]["data_config_file_NM"],
+                      tech_sector_mapping = pcfg["filepaths"]["tech_to_sector_mapping_file"],
+                      comm_sector_mapping = pcfg["filepaths"]["comm_to_sector_mapping_file"],
+                      list_counties = pcfg["filepaths"]["list_counties_file"],
+                      pop_file = pcfg["filepaths"]["pop_file"],
+                      pop_file_ruur = pcfg["filepaths"]["pop_file_ruur"],
+                      gdp_file = pcfg["filepaths"]["gdp_file"],
+                      county_sectors = pcfg["downscaling"]["downscaled_sectors"],
+                      remove_fte_tech_mode = pcfg["downscaling"]["remove_fte_tech_mode"],
+                      output_path = (pcfg["filepaths"]["downscaled_model_path"]
+                                     if save else None),
+                      engine = pcfg["io"]["reader_engine"],
+                      output_format = pcfg["io"]["output_format"],
+                      n_workers = pcfg["io"]["n_workers"],
+                      writer_engine = pcfg["io"]["writer_engine"],
+                      incremental = pcfg["downscaling"]["incremental"],
+                      gdp_method = pcfg["downscaling"]["gdp_method"],
+                      cache_dir = pcfg["filepaths"]["cache_dir"],
+                      overwrite=True)
 
 
 #%% Process the model (this again makes use of the filepaths and parameters set out in the configuration file)
-dp.process_county_model(input_path = pcfg["filepaths"]["downscaled_model_path"],
-                        dataconfig_file = pcfg["filepaths"]["data_config_file_NM"],
-                        datasets = pcfg["county_processing"]["datasets"],
-                        ft_param = pcfg["filepaths"]["ft_param"],
-                        output_path = pcfg["filepaths"]["county_processed_path"],
-                        list_counties = pcfg["filepaths"]["list_counties_file"],
-                        housing_char = pcfg["filepaths"]["housing_char"],
-                        housing_dem = pcfg["filepaths"]["housing_dem"],
-                        nat_scens = pcfg["filepaths"]["nat_scens"],
-                        el_access = pcfg["filepaths"]["el_access"],
-                        market_seg = pcfg["filepaths"]["market_seg"],
-                        overwrite=True
-                        )
+model = dp.process_county_model(input_path = pcfg["filepaths"]["downscaled_model_path"],
+                                dataconfig_file = pcfg["filepaths"]["data_config_file_NM"],
+                                datasets = pcfg["county_processing"]["datasets"],
+                                ft_param = pcfg["filepaths"]["ft_param"],
+                                output_path = (pcfg["filepaths"]["county_processed_path"]
+                                               if save else None),
+                                list_counties = pcfg["filepaths"]["list_counties_file"],
+                                housing_char = pcfg["filepaths"]["housing_char"],
+                                housing_dem = pcfg["filepaths"]["housing_dem"],
+                                nat_scens = pcfg["filepaths"]["nat_scens"],
+                                el_access = pcfg["filepaths"]["el_access"],
+                                market_seg = pcfg["filepaths"]["market_seg"],
+                                milestones = pcfg["county_processing"]["cooking_milestones"],
+                                cache_dir = pcfg["filepaths"]["cache_dir"],
+                                n_workers = pcfg["io"]["n_workers"],
+                                engine = pcfg["io"]["reader_engine"],
+                                output_format = pcfg["io"]["output_format"],
+                                writer_engine = pcfg["io"]["writer_engine"],
+                                data = model if in_memory else None,
+                                return_data = in_memory,
+                                overwrite=True
+                                )
 
 
 #%% Run the model for each of the selected scenarios and save the results
 
 rp.run_model(dataconfig_file = pcfg["filepaths"]["data_config_file_CW"],
-              input_path = pcfg["filepaths"]["county_processed_path"],
+              input_path = (model if in_memory and model is not None
+                            else pcfg["filepaths"]["county_processed_path"]),
               model_file_path= acfg["runs"]["model_file"],
               scenario_list = acfg["scenarios"],
               spatial_config = acfg["runs"]["spatial_config"],
@@ -96,4 +113,8 @@ rp.run_model(dataconfig_file = pcfg["filepaths"]["data_config_file_CW"],
               agg_years = acfg["runs"]["agg_years"],
               agg_config = acfg["runs"]["agg_cfg"],
               agg_timeslices = acfg["runs"]["agg_ts"],
+              cache_dir = pcfg["filepaths"]["cache_dir"],
+              n_workers = pcfg["io"]["n_workers"],
+              engine = pcfg["io"]["reader_engine"],
+              solver = acfg["runs"].get("solver"),
               solve = "optimize")
@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core_wesm import ospro as op
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src", "core_wesm")
+
+
+def _get_tiny_model():
+    """Tiny model with two technologies, two years, and one timeslice.
+
+    GEN1 is cheaper to operate but limited to a capacity of 6, GEN2 covers
+    the remaining demand with its residual capacity and emits CO2.
+    """
+    dcfg = op.DataConfig.from_file(os.path.join(SRC, "config_files",
+                                                "config_CORE-WESM.yaml"))
+    dcfg = op.DataConfig({k: v for k, v in dcfg.items()
+                          if not k.startswith("ft_")})
+
+    sets = {"REGION": ["R1"], "TECHNOLOGY": ["GEN1", "GEN2"],
+            "TIMESLICE": ["ALL"], "MODE_OF_OPERATION": [1],
+            "YEAR": [2020, 2021], "COMMODITY": ["ELC"],
+            "EMISSION": ["CO2"]}
+    params = {
+        "DiscountRate": {("R1",): 0.05},
+        "YearSplit": {("ALL", y): 1 for y in sets["YEAR"]},
+        "SpecifiedAnnualDemand": {("R1", "ELC", y): 10
+                                  for y in sets["YEAR"]},
+        "SpecifiedDemandProfile": {("R1", "ELC", "ALL", y): 1
+                                   for y in sets["YEAR"]},
+        "OutputActivityRatio": {("R1", t, "ELC", 1, y): 1
+                                for t in sets["TECHNOLOGY"]
+                                for y in sets["YEAR"]},
+        "EmissionActivityRatio": {("R1", "GEN2", "CO2", 1, y): 0.5
+                                  for y in sets["YEAR"]},
+        "VariableCost": {("R1", t, 1, y): c
+                         for t, c in [("GEN1", 1), ("GEN2", 3)]
+                         for y in sets["YEAR"]},
+        "CapitalCost": {("R1", "GEN2", y): 100 for y in sets["YEAR"]},
+        "ResidualCapacity": {("R1", "GEN2", y): 5 for y in sets["YEAR"]},
+        "TotalAnnualMaxCapacity": {("R1", "GEN1", y): 6
+                                   for y in sets["YEAR"]},
+        "OperationalLife": {("R1", t): 10 for t in sets["TECHNOLOGY"]},
+    }
+
+    data = dict()
+    for k in dcfg.inputs:
+        if dcfg[k]["type"] == "set":
+            data[k] = pd.DataFrame({"VALUE": sets.get(k, [])})
+            continue
+        entries = params.get(k, dict())
+        indices = dcfg[k]["indices"]
+        # single-index parameters have a flat index (as read with
+        # read_spreadsheets)
+        if len(indices) == 1:
+            idx = pd.Index([e[0] for e in entries.keys()], name=indices[0])
+        elif entries:
+            idx = pd.MultiIndex.from_tuples(list(entries.keys()),
+                                            names=indices)
+        else:
+            idx = pd.MultiIndex.from_arrays([[]]*len(indices),
+                                            names=indices)
+        data[k] = pd.DataFrame({"VALUE": list(entries.values())},
+                               index=idx, dtype=float)
+
+    return data, dcfg
+
+
+def _solve(model):
+    highspy = pytest.importorskip("highspy")
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = len(model["col_cost"])
+    lp.num_row_ = len(model["row_lower"])
+    lp.col_cost_ = model["col_cost"]
+    lp.col_lower_ = model["col_lower"]
+    lp.col_upper_ = model["col_upper"]
+    lp.row_lower_ = model["row_lower"]
+    lp.row_upper_ = model["row_upper"]
+    lp.offset_ = model["offset"]
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = model["a_start"]
+    lp.a_matrix_.index_ = model["a_index"]
+    lp.a_matrix_.value_ = model["a_value"]
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.passModel(lp)
+    h.run()
+    assert h.getModelStatus() == highspy.HighsModelStatus.kOptimal
+
+    return (h.getInfo().objective_function_value,
+            np.asarray(h.getSolution().col_value))
+
+
+def test_build_model():
+    """Optimal objective and variable values of a tiny model"""
+    data, dcfg = _get_tiny_model()
+    model = op.build_model(data, dcfg)
+    obj, values = _solve(model)
+
+    # only variable costs, discounted to the middle of each year
+    assert obj == pytest.approx(sum((6*1 + 4*3)/1.05**(y + 0.5)
+                                    for y in range(2)))
+
+    res = op._get_model_results(model, values, dcfg)
+    roa = res["RateOfActivity"]["VALUE"]
+    assert roa.index.names == dcfg["RateOfActivity"]["indices"]
+    assert roa.xs("GEN1", level="TECHNOLOGY").to_numpy() == pytest.approx(
+        [6, 6])
+    assert roa.xs("GEN2", level="TECHNOLOGY").to_numpy() == pytest.approx(
+        [4, 4])
+    nc = res["NewCapacity"]["VALUE"]
+    assert nc.loc[("R1", "GEN1", 2020)] == pytest.approx(6)
+    assert nc.loc[("R1", "GEN1", 2021)] == pytest.approx(0)
+    assert nc.xs("GEN2", level="TECHNOLOGY").to_numpy() == pytest.approx(
+        [0, 0])
+    ae = res["AnnualEmissions"]["VALUE"]
+    assert ae.to_numpy() == pytest.approx([2, 2])
+
+
+def test_build_model_glpk(tmp_path, monkeypatch):
+    """Same LP as translated by GLPK from the model file"""
+    highspy = pytest.importorskip("highspy")
+    glpk = pytest.importorskip("swiglpk")
+
+    data, dcfg = _get_tiny_model()
+    model = op.build_model(data, dcfg)
+    obj, values = _solve(model)
+
+    # translate model file with GLPK
+    monkeypatch.chdir(tmp_path)
+    mdata, mdcfg = op.rename_set(mapping={"COMMODITY": "FUEL"},
+                                 data={"S": {k: v.copy()
+                                             for k, v in data.items()}},
+                                 dcfg=dcfg)
+    op.write_datafile(mdata, str(tmp_path), mdcfg)
+    tran = glpk.glp_mpl_alloc_wksp()
+    assert glpk.glp_mpl_read_model(
+        tran, os.path.join(SRC, "osemosys_preprocessing_adapted_f.txt"),
+        1) == 0
+    assert glpk.glp_mpl_read_data(tran, "datafile_S.txt") == 0
+    assert glpk.glp_mpl_generate(tran, None) == 0
+    prob = glpk.glp_create_prob()
+    glpk.glp_mpl_build_prob(tran, prob)
+    glpk.glp_write_lp(prob, None, "opt.lp")
+    glpk.glp_delete_prob(prob)
+    glpk.glp_mpl_free_wksp(tran)
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.readModel("opt.lp")
+    h.run()
+    assert h.getModelStatus() == highspy.HighsModelStatus.kOptimal
+
+    # GLPK drops the constant term of the objective
+    assert (h.getInfo().objective_function_value
+            == pytest.approx(obj - model["offset"]))
+    assert h.getLp().num_col_ == len(model["col_cost"])
+    assert h.getLp().num_row_ == len(model["row_lower"])
+
+    ref = pd.Series(h.getSolution().col_value,
+                    index=h.allVariableNames())
+    ids, dims = model["variables"]["RateOfActivity"]
+    for pos in zip(*np.nonzero(ids >= 0)):
+        name = ("RateOfActivity("
+                + ",".join(str(model["sets"][d][p])
+                           for d, p in zip(dims, pos)) + ")")
+        assert values[ids[pos]] == pytest.approx(ref[name])
@@ -0,0 +1,141 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core_wesm import ospro as op
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+pytest.importorskip("pyarrow")
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "src", "core_wesm",
+                      "config_files", "config_CORE-WESM.yaml")
+
+
+def _get_config():
+    dcfg = op.DataConfig.from_file(CONFIG)
+    return op.DataConfig({k: v for k, v in dcfg.items()
+                          if not k.startswith("ft_")})
+
+
+def _get_tables():
+    """Data tables as parsed from a spreadsheet file, with mixed object
+    columns"""
+    return [pd.DataFrame({"PARAMETER": ["CapitalCost"]*3,
+                          "SCENARIO": ["#ALL"]*3,
+                          "REGION": ["RE1", "RE1", 1],
+                          "TECHNOLOGY": ["T1", 2, 3.5],
+                          2020: [10, 11.5, np.nan],
+                          2021: ["1", 2, 3.25]}),
+            pd.DataFrame({"SET": ["YEAR"]*2,
+                          "SCENARIO": ["#ALL"]*2,
+                          "VALUE": [2020, 2021]})]
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Record files parsed instead of loaded from the cache"""
+    files = list()
+
+    def _read_spreadsheet_file(f, *args):
+        files.append(f)
+        return _get_tables()
+
+    monkeypatch.setattr(op, "_read_spreadsheet_file", _read_spreadsheet_file)
+    return files
+
+
+def _get_file_tables(f, dcfg, cache_dir, cache_size=2**30):
+    return op._get_file_tables(f, dcfg, False, None, None, cache_dir,
+                               cache_size)
+
+
+def test_cache_hit(tmp_path, parsed):
+    """Tables are loaded from the cache unless the file content or the
+    data config change"""
+    cache_dir = str(tmp_path / "cache")
+    f = str(tmp_path / "model.xlsx")
+    with open(f, "w") as fh:
+        fh.write("v1")
+    dcfg = _get_config()
+
+    dts = _get_file_tables(f, dcfg, cache_dir)
+    cached = _get_file_tables(f, dcfg, cache_dir)
+    assert parsed == [f]
+    for dt, exp in zip(cached, dts):
+        pd.testing.assert_frame_equal(dt, exp)
+
+    with open(f, "w") as fh:
+        fh.write("v2")
+    _get_file_tables(f, dcfg, cache_dir)
+    assert parsed == [f]*2
+
+    dcfg = op.DataConfig({k: v for k, v in dcfg.items() if k != "STORAGE"})
+    _get_file_tables(f, dcfg, cache_dir)
+    assert parsed == [f]*3
+    _get_file_tables(f, dcfg, cache_dir)
+    assert parsed == [f]*3
+    assert len(os.listdir(cache_dir)) == 3
+
+
+def test_arrow_frame_roundtrip():
+    """Mixed str, int, and float object columns are restored"""
+    for dt in _get_tables():
+        adf, meta = op._to_arrow_frame(dt)
+        tbl = op.pa.Table.from_pandas(adf, preserve_index=False)
+        res = op._from_arrow_frame(tbl, meta)
+        pd.testing.assert_frame_equal(res, dt)
+        for c in dt.columns:
+            assert ([type(v) for v in res[c]]
+                    == [type(op._scalar(v)) for v in dt[c]])
+
+
+def test_cache_eviction(tmp_path, parsed):
+    """Least recently used entries are removed if the size is exceeded"""
+    cache_dir = str(tmp_path / "cache")
+    dcfg = _get_config()
+    files = list()
+    for n in ["a", "b", "c"]:
+        files.append(str(tmp_path / f"{n}.xlsx"))
+        with open(files[-1], "w") as fh:
+            fh.write(n)
+    keys = [op._cache_key(f, dcfg, False, None, None) for f in files]
+
+    _get_file_tables(files[0], dcfg, cache_dir)
+    _get_file_tables(files[1], dcfg, cache_dir)
+    size = sum(e.stat().st_size
+               for e in os.scandir(os.path.join(cache_dir, keys[0])))
+    os.utime(os.path.join(cache_dir, keys[0]), (1000, 1000))
+    os.utime(os.path.join(cache_dir, keys[1]), (2000, 2000))
+    # loading the first entry marks it as recently used
+    _get_file_tables(files[0], dcfg, cache_dir)
+    _get_file_tables(files[2], dcfg, cache_dir, cache_size=2.5*size)
+
+    assert sorted(os.listdir(cache_dir)) == sorted([keys[0], keys[2]])
+    assert parsed == files
+
+
+def test_invalidate_cache(tmp_path, parsed):
+    """Only the entries of the given source are removed"""
+    cache_dir = str(tmp_path / "cache")
+    dcfg = _get_config()
+    files = list()
+    for n in ["a", "b"]:
+        files.append(str(tmp_path / f"{n}.xlsx"))
+        with open(files[-1], "w") as fh:
+            fh.write(n)
+        _get_file_tables(files[-1], dcfg, cache_dir)
+
+    assert op.invalidate_cache(cache_dir, path=files[0]) == 1
+    assert os.listdir(cache_dir) == [op._cache_key(files[1], dcfg, False,
+                                                   None, None)]
+    _get_file_tables(files[0], dcfg, cache_dir)
+    _get_file_tables(files[1], dcfg, cache_dir)
+    assert parsed == files + [files[0]]
+
+    assert op.invalidate_cache(cache_dir) == 2
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,122 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src", "core_wesm")
+# the pipeline modules import each other as top-level modules
+sys.path.insert(0, SRC)
+
+import county_functions as cf  # noqa: E402
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+TECHS = ["RK1BIO001", "RK1BIO005", "RK1CHC001", "RK1CHC005", "RK1ELC001",
+         "RK1LPG001"]
+YEARS = [2019, 2020, 2021, 2022]
+REGIONS = ["C1", "C2", "C3"]
+
+# county fractions in 2021 and 2022 as calculated by the previous,
+# DataFrame-based implementation of _cooking_pathway (rows by scenario,
+# county, and technology), the correction step of the allocation applies in
+# both years
+EXPECTED = [
+    [0.2983606557377049, 0.1477386934673367],
+    [0.1929184879715594, 0.18886626517121702],
+    [0.061904761904761914, 0.04179104477611941],
+    [0.07959941821689943, 0.0790577574001619],
+    [0.15372316667964758, 0.21201340578488234],
+    [0.21349350948942672, 0.33053283340028267],
+    [0.1278688524590164, 0.06331658291457286],
+    [0.07876470948022476, 0.07711026902211188],
+    [0.21666666666666665, 0.14626865671641792],
+    [0.09664978513612257, 0.09599209940515795],
+    [0.17736331872533886, 0.22888327567321162],
+    [0.30268666753263074, 0.3884291162685278],
+    [0.25573770491803277, 0.12663316582914572],
+    [0.31348654087609445, 0.30690180489824537],
+    [0.09285714285714286, 0.06268656716417911],
+    [0.15252691558977222, 0.15148899526920293],
+    [0.046782051102018885, 0.08691337999798217],
+    [0.1386096446569388, 0.26537608684124475],
+    [0.0745901639344262, 0.0],
+    [0.28129053590804126, 0.13768399838247417],
+    [0.0412698412698413, 0.02089552238805971],
+    [0.12445311946536802, 0.21300068077650192],
+    [0.15236588248174113, 0.34658148057655996],
+    [0.3260304569405821, 0.2818383178764043],
+    [0.0319672131147541, 0.0],
+    [0.09521782969936117, 0.046606514748137214],
+    [0.1444444444444445, 0.07313432835820896],
+    [0.14039973785427126, 0.1979414303765471],
+    [0.17865300526257313, 0.3284813618091865],
+    [0.4093177696245958, 0.3538363647079202],
+    [0.06393442622950815, 0.0],
+    [0.40415652423615356, 0.19782352808125955],
+    [0.061904761904761914, 0.03134328358208955],
+    [0.23469467857931456, 0.48232566880306266],
+    [0.044982716617511895, 0.12397868467180248],
+    [0.19032689243274994, 0.16452883486178577]
+]
+
+
+def _get_inputs():
+    """National pathways of two scenarios, phasing down traditional stoves,
+    and the county data of three counties"""
+    nat = pd.DataFrame([[.50, .05, .25, .05, .05, .10],
+                        [.30, .10, .20, .10, .10, .20],
+                        [.20, .15, .15, .10, .15, .25],
+                        [.10, .15, .10, .10, .20, .35],
+                        [.50, .05, .25, .05, .05, .10],
+                        [.25, .05, .30, .05, .15, .20],
+                        [.05, .20, .10, .15, .15, .35],
+                        [.00, .10, .05, .25, .30, .30]],
+                       index=pd.MultiIndex.from_product([["S1", "S2"],
+                                                         YEARS],
+                                                        names=["SCENARIO",
+                                                               "YEAR"]),
+                       columns=pd.Index(TECHS, name="TECHNOLOGY"))
+    nat = nat.stack().unstack("YEAR")
+    dem = pd.DataFrame([[10, 11, 12, 13], [20, 20, 21, 22], [5, 6, 6, 7]],
+                       index=pd.Index(REGIONS, name="REGION"),
+                       columns=YEARS, dtype=float)
+    base = pd.DataFrame([[.70, .02, .10, .03, .05, .10],
+                         [.30, .05, .35, .05, .05, .20],
+                         [.60, .10, .15, .05, .02, .08]],
+                        index=pd.Index(REGIONS, name="REGION"),
+                        columns=pd.Index(TECHS, name="TECHNOLOGY")).stack()
+    ela = pd.DataFrame([[.5, .6, .7, .8], [.9, .92, .95, .97],
+                        [.2, .3, .35, .5]],
+                       index=pd.Index(REGIONS, name="REGION"), columns=YEARS)
+    q = pd.Series([.3, .6, .1], index=pd.Index(REGIONS, name="REGION"))
+
+    return nat, dem, base, ela, q
+
+
+def test_cooking_pathway():
+    """Allocation matches the previous implementation"""
+    nat, dem, base, ela, q = _get_inputs()
+    cr = cf._cooking_pathway(nat, dem, base, REGIONS, ela, q, "RK1", [2019],
+                             [2019, 2021, 2022])
+
+    assert cr.index.tolist() == [(s, r, t) for s in ["S1", "S2"]
+                                 for r in REGIONS for t in TECHS]
+    assert cr.columns.tolist() == YEARS
+    np.testing.assert_allclose(cr[[2021, 2022]].to_numpy(), EXPECTED,
+                               rtol=1e-12, atol=1e-14)
+    np.testing.assert_allclose(cr[2019].to_numpy(),
+                               np.tile(base.to_numpy(), 2))
+    np.testing.assert_allclose(cr[2020], (cr[2019]+cr[2021])/2)
+    np.testing.assert_allclose(cr.groupby(level=["SCENARIO", "REGION"]).sum(),
+                               1)
+
+
+def test_fill_linear():
+    """Interpolation as DataFrame.interpolate(axis=1)"""
+    v = np.array([[np.nan, 1, np.nan, np.nan, 4, np.nan],
+                  [2, np.nan, 3, np.nan, np.nan, np.nan]])
+    exp = pd.DataFrame(v).interpolate(axis=1).to_numpy()
+    np.testing.assert_allclose(cf._fill_linear(v, np.arange(6.)), exp)
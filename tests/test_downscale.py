@@ -0,0 +1,262 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src", "core_wesm")
+# the pipeline modules import each other as top-level modules
+sys.path.insert(0, SRC)
+
+import county_functions as cf  # noqa: E402
+import data_pipeline_functions as dp  # noqa: E402
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+pytest.importorskip("pyarrow")
+
+CONFIG = os.path.join(SRC, "config_files", "config_OSeMOSYS_Kenya.yaml")
+
+DATAFILE = """# Model file written by otoole
+param default 0 : CapitalCost :=
+RE1 PWR 2020 100
+RE1 PWR 2021 90
+;
+param default 0 : EmissionActivityRatio :=
+RE1 PWR CO2 1 2020 0.5
+RE1 PWR CO2 1 2021 0.5
+;
+param default 0 : InputActivityRatio :=
+RE1 FTERES ELC003 1 2020 1
+RE1 FTERES ELC003 1 2021 1
+RE1 RESCK RESELC 1 2020 1.2
+RE1 RESCK RESELC 1 2021 1.1
+;
+param default 0 : OutputActivityRatio :=
+RE1 PWR ELC003 1 2020 1
+RE1 PWR ELC003 1 2021 1
+RE1 FTERES RESELC 1 2020 1
+RE1 FTERES RESELC 1 2021 1
+RE1 FTERES RESELC 2 2020 1
+RE1 RESCK RESCOOK 1 2020 1
+RE1 RESCK RESCOOK 1 2021 1
+;
+param default 0 : ResidualCapacity :=
+RE1 RESCK 2020 4
+RE1 RESCK 2021 2
+;
+param default 0 : SpecifiedAnnualDemand :=
+RE1 RESCOOK 2020 10
+RE1 RESCOOK 2021 12
+;
+set COMMODITY :=
+ELC003
+RESELC
+RESCOOK
+{}
+;
+set EMISSION :=
+CO2
+;
+set MODE_OF_OPERATION :=
+1
+2
+;
+set REGION :=
+RE1
+;
+set TECHNOLOGY :=
+PWR
+FTERES
+RESCK
+;
+set YEAR :=
+2020
+2021
+;
+end;
+"""
+
+
+def _write_inputs(path, extra_commodity=""):
+    """Write a national model with a power and a residential sector, and
+    the inputs to downscale it to two counties"""
+    files = {k: str(path / f) for k, f in
+             [("input_file", "datafile.txt"),
+              ("tech_sector_mapping", "tech_to_sector.xlsx"),
+              ("comm_sector_mapping", "com_to_sector.xlsx"),
+              ("list_counties", "list_counties.csv"),
+              ("pop_file", "population.csv"),
+              ("pop_file_ruur", "population_ruur.csv"),
+              ("gdp_file", "GCP_2020.csv")]}
+
+    with open(files["input_file"], "w") as fh:
+        fh.write(DATAFILE.format(extra_commodity))
+    pd.DataFrame({"technology": ["PWR", "FTERES", "RESCK"],
+                  "sector": ["Power", "Residential", "Residential"]}
+                 ).to_excel(files["tech_sector_mapping"], index=False)
+    pd.DataFrame({"commodity": ["ELC003", "RESELC", "RESCOOK"],
+                  "sector": ["Power", "Residential", "Residential"]}
+                 ).to_excel(files["comm_sector_mapping"], index=False)
+    pd.DataFrame({"ID": ["C1", "C2"], "NAME": ["County1", "County2"]}
+                 ).to_csv(files["list_counties"], index=False)
+    _write_population(files["pop_file"], 100)
+    with open(files["pop_file_ruur"], "w") as fh:
+        fh.write("\n\n\n"
+                 "a,b,ID,c,d,Urban,e,f,Rural\n"
+                 ",,C1,,,30,,,70\n"
+                 ",,C2,,,\"1,000\",,,500\n")
+    pd.DataFrame({"ID": ["C1", "C2"],
+                  **{"Sec_"+str(i): [1, 3] for i in range(1, 20)}}
+                 ).to_csv(files["gdp_file"], index=False)
+
+    return files
+
+
+def _write_population(path, c1):
+    pd.DataFrame({"ID": ["C1", "C2"], "2020": [c1, 300],
+                  "2021": [c1+10, 310]}).to_csv(path, index=False)
+
+
+def _downscale(files, output_path, **kwargs):
+    kwargs = {"county_sectors": ["Residential"],
+              "remove_fte_tech_mode": True,
+              "output_format": "parquet",
+              "incremental": True,
+              **kwargs}
+    return dp.downscale(dataconfig_file=CONFIG, output_path=output_path,
+                        overwrite=True, **files, **kwargs)
+
+
+def _get_state(path):
+    """Modification time of all files of a saved model"""
+    return {os.path.join(d, f): os.stat(os.path.join(d, f)).st_mtime_ns
+            for d, _, fs in os.walk(path) for f in fs}
+
+
+def _assert_model_equal(path, ref):
+    data = cf.load_model(path)
+    exp = cf.load_model(ref)
+    assert set(data.keys()) == set(exp.keys())
+    for k in exp.keys():
+        assert set(data[k].keys()) == set(exp[k].keys())
+        for sn in exp[k].keys():
+            pd.testing.assert_frame_equal(data[k][sn], exp[k][sn])
+
+
+def test_downscale_incremental(tmp_path):
+    """Incremental updates match a full rebuild"""
+    files = _write_inputs(tmp_path)
+    out = str(tmp_path / "model") + "/"
+    ref = str(tmp_path / "ref") + "/"
+
+    # the first incremental run builds the model completely
+    assert _downscale(files, out) is not None
+    assert os.path.isfile(out + ".downscale_manifest.json")
+
+    # unchanged inputs keep the model
+    state = _get_state(out)
+    assert _downscale(files, out) is None
+    assert _get_state(out) == state
+
+    # changed downscaling factors only update the sheets of the affected
+    # parameters
+    _write_population(files["pop_file"], 200)
+    assert _downscale(files, out) is None
+    state_upd = _get_state(out)
+    changed = {f for f in state if state_upd.get(f) != state[f]}
+    assert out + "C1/SpecifiedAnnualDemand.parquet" in changed
+    assert out + "C1/OutputActivityRatio.parquet" not in changed
+    assert out + "National/CapitalCost.parquet" not in changed
+    _downscale(files, ref, incremental=False)
+    _assert_model_equal(out, ref)
+
+    # changed national data of a set reuse the FTE relinking of the
+    # manifest, i.e., FTE output fuels are removed
+    files = _write_inputs(tmp_path, extra_commodity="XTRA")
+    _write_population(files["pop_file"], 200)
+    assert _downscale(files, out) is None
+    com = cf.load_model(out)["National"]["COMMODITY"]
+    assert "XTRA" in com["VALUE"].tolist()
+    assert "RESELC" not in com["VALUE"].tolist()
+    _downscale(files, ref, incremental=False)
+    _assert_model_equal(out, ref)
+
+
+def test_downscale_incremental_damaged(tmp_path):
+    """Deleted or changed saved models are saved again"""
+    files = _write_inputs(tmp_path)
+    out = str(tmp_path / "model") + "/"
+    ref = str(tmp_path / "ref") + "/"
+    _downscale(files, out)
+    _downscale(files, ref, incremental=False)
+
+    os.remove(out + "C1/SpecifiedAnnualDemand.parquet")
+    assert dp._get_damaged_outputs(out, dp._load_manifest(out)["files"],
+                                   "parquet") == {"C1": {"SpecifiedAnnualDemand"}}
+    assert _downscale(files, out) is None
+    _assert_model_equal(out, ref)
+
+    shutil.rmtree(out + "C2")
+    assert dp._get_damaged_outputs(out, dp._load_manifest(out)["files"],
+                                   "parquet") == {"C2": None}
+    _downscale(files, out)
+    _assert_model_equal(out, ref)
+    assert dp._get_damaged_outputs(out, dp._load_manifest(out)["files"],
+                                   "parquet") == dict()
+
+
+def test_downscale_incremental_rebuild(tmp_path):
+    """Changes of inputs and options that affect all data rebuild the
+    model, plain rebuilds remove the manifest"""
+    files = _write_inputs(tmp_path)
+    out = str(tmp_path / "model") + "/"
+    _downscale(files, out)
+
+    # a rebuild returns the complete model
+    assert _downscale(files, out, remove_fte_tech_mode=False) is not None
+    assert _downscale(files, out, remove_fte_tech_mode=False) is None
+    pd.DataFrame({"ID": ["C1", "C2"], "NAME": ["County1", "County 2"]}
+                 ).to_csv(files["list_counties"], index=False)
+    assert _downscale(files, out, remove_fte_tech_mode=False) is not None
+
+    _downscale(files, out, incremental=False)
+    assert dp._load_manifest(out) is None
+    assert _downscale(files, out) is not None
+
+
+def test_load_manifest(tmp_path):
+    """Missing, invalid or incomplete manifests are ignored"""
+    path = str(tmp_path)
+    assert dp._load_manifest(path) is None
+    with open(os.path.join(path, ".downscale_manifest.json"), "w") as fh:
+        fh.write("{")
+    assert dp._load_manifest(path) is None
+    dp._save_manifest(path, {"version": 1, "inputs": {}})
+    assert dp._load_manifest(path) is None
+    manifest = {k: {} for k in ["version", "inputs", "params", "outputs",
+                                "relink", "files"]}
+    dp._save_manifest(path, manifest)
+    assert dp._load_manifest(path) == manifest
+
+
+def test_downscale_registry(tmp_path):
+    """Factors of a registry provided are used to downscale"""
+    files = _write_inputs(tmp_path)
+    for k in ["pop_file", "pop_file_ruur", "gdp_file"]:
+        files[k] = None
+    registry = dp.FactorRegistry(["C1", "C2"])
+    registry.register("Residential", pd.Series({"C1": 0.25, "C2": 0.75}))
+
+    model = _downscale(files, None, registry=registry, incremental=False)
+    for c, f in [("C1", 0.25), ("C2", 0.75)]:
+        df = model[c]["SpecifiedAnnualDemand"]
+        assert df[2020].tolist() == [10*f]
+        assert df[2021].tolist() == [12*f]
+
+    with pytest.raises(ValueError):
+        _downscale(files, None, registry=dp.FactorRegistry(["C2", "C1"]),
+                   incremental=False)
@@ -0,0 +1,126 @@
+import pandas as pd
+
+from core_wesm import ospro as op
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+SETS = {"REGION": ["R1", "R2"], "TECHNOLOGY": ["GEN1", "GEN2", "USE1"],
+        "FUEL": ["ELC", "GAS"], "EMISSION": ["CO2"],
+        "TIMESLICE": ["D", "N"], "MODE_OF_OPERATION": [1, 2],
+        "YEAR": [2020, 2021]}
+
+
+def _get_config():
+    dcfg = {k: {"type": "set",
+                "dtype": "int" if k in ["MODE_OF_OPERATION", "YEAR"]
+                else "str"}
+            for k in SETS.keys()}
+    return op.DataConfig(dcfg)
+
+
+def _frame(names, rows):
+    idx = pd.MultiIndex.from_tuples([r[:-1] for r in rows], names=names)
+    return pd.DataFrame({"VALUE": [float(r[-1]) for r in rows]}, index=idx)
+
+
+def _get_results():
+    """Results of a scenario, with rows without matching activity ratios
+    and activity ratios of inactive technologies"""
+    res = {k: pd.DataFrame({"VALUE": v}) for k, v in SETS.items()}
+    res["RateOfActivity"] = _frame(
+        ["REGION", "TIMESLICE", "TECHNOLOGY", "MODE_OF_OPERATION", "YEAR"],
+        [(r, ts, t, m, y, v)
+         for (r, t, m, v) in [("R1", "GEN1", 1, 4), ("R1", "GEN2", 1, 2),
+                              ("R1", "GEN2", 2, 1), ("R2", "GEN1", 1, 3),
+                              ("R2", "USE1", 1, 5)]
+         for ts in SETS["TIMESLICE"] for y in SETS["YEAR"]])
+    res["OutputActivityRatio"] = _frame(
+        ["REGION", "TECHNOLOGY", "FUEL", "MODE_OF_OPERATION", "YEAR"],
+        [(r, t, "ELC", m, y, v)
+         for (r, t, m, v) in [("R1", "GEN1", 1, 1), ("R1", "GEN2", 1, 1),
+                              ("R1", "GEN2", 2, 0.9), ("R2", "GEN1", 1, 1),
+                              ("R2", "GEN2", 1, 1)]
+         for y in SETS["YEAR"]])
+    res["InputActivityRatio"] = _frame(
+        ["REGION", "TECHNOLOGY", "FUEL", "MODE_OF_OPERATION", "YEAR"],
+        [(r, t, f, 1, y, v)
+         for (r, t, f, v) in [("R1", "GEN2", "GAS", 2.5),
+                              ("R2", "USE1", "ELC", 1.2)]
+         for y in SETS["YEAR"]])
+    res["EmissionActivityRatio"] = _frame(
+        ["REGION", "TECHNOLOGY", "EMISSION", "MODE_OF_OPERATION", "YEAR"],
+        [(r, "GEN2", "CO2", m, y, v)
+         for (r, m, v) in [("R1", 1, 0.5), ("R1", 2, 0.7), ("R2", 1, 0.5)]
+         for y in SETS["YEAR"]])
+    res["YearSplit"] = _frame(["TIMESLICE", "YEAR"],
+                              [(ts, y, v) for ts, v in [("D", 0.4),
+                                                        ("N", 0.6)]
+                               for y in SETS["YEAR"]])
+    res["NewCapacity"] = _frame(["REGION", "TECHNOLOGY", "YEAR"],
+                                [("R1", "GEN1", 2020, 4),
+                                 ("R2", "GEN1", 2021, 1)])
+    res["TotalCapacityAnnual"] = _frame(["REGION", "TECHNOLOGY", "YEAR"],
+                                        [("R1", "GEN1", y, 4)
+                                         for y in SETS["YEAR"]])
+    res["CapitalCost"] = _frame(["REGION", "TECHNOLOGY", "YEAR"],
+                                [(r, "GEN1", y, 100)
+                                 for r in SETS["REGION"]
+                                 for y in SETS["YEAR"]])
+    res["OperationalLife"] = _frame(["REGION", "TECHNOLOGY"],
+                                    [(r, "GEN1", 20)
+                                     for r in SETS["REGION"]])
+    res["DiscountRate"] = pd.DataFrame({"VALUE": [0.05, 0.05]},
+                                       index=pd.Index(SETS["REGION"],
+                                                      name="REGION"))
+
+    return res
+
+
+def _product_sum(res, ratio, by):
+    """Previous arithmetic of expand_results"""
+    return (res["RateOfActivity"]*res[ratio]
+            * res["YearSplit"]).dropna().groupby(by).sum()
+
+
+def test_product_sum():
+    """Same sums of products as by aligning the MultiIndexes"""
+    res = _get_results()
+    by = [["REGION", "TECHNOLOGY", "FUEL", "YEAR"],
+          ["REGION", "TECHNOLOGY", "YEAR"]]
+    for ratio, b in [("OutputActivityRatio", by),
+                     ("InputActivityRatio", by[:1]),
+                     ("EmissionActivityRatio", [["REGION", "EMISSION",
+                                                 "YEAR"]])]:
+        dfs = op._product_sum([res["RateOfActivity"], res[ratio],
+                               res["YearSplit"]], b)
+        for df, levels in zip(dfs, b):
+            exp = _product_sum(res, ratio, levels)
+            pd.testing.assert_frame_equal(df, exp)
+
+
+def test_encode_sets_roundtrip():
+    """Results expanded from encoded data decode to the values expanded
+    from plain data"""
+    exp = op.expand_results({"S1": _get_results()})
+
+    data, vocabulary = op.encode_sets({"S1": _get_results()}, _get_config())
+    assert sorted(vocabulary.keys()) == ["EMISSION", "FUEL", "REGION",
+                                         "TECHNOLOGY", "TIMESLICE"]
+    assert list(vocabulary["TECHNOLOGY"].categories) == SETS["TECHNOLOGY"]
+    roa = data["S1"]["RateOfActivity"].index
+    assert isinstance(roa.levels[roa.names.index("TECHNOLOGY")],
+                      pd.CategoricalIndex)
+    assert isinstance(data["S1"]["FUEL"]["VALUE"].dtype, pd.CategoricalDtype)
+
+    res = op.expand_results(data)
+    ptech = res["S1"]["ProductionByTechnologyAnnual"].index
+    assert (ptech.levels[ptech.names.index("FUEL")].dtype
+            == vocabulary["FUEL"])
+    res = op.decode_sets(res)
+
+    assert res["S1"].keys() == exp["S1"].keys()
+    for k in exp["S1"].keys():
+        pd.testing.assert_frame_equal(res["S1"][k], exp["S1"][k],
+                                      check_index_type=False)
@@ -0,0 +1,127 @@
+import os
+
+import otoole
+import pandas as pd
+import pytest
+
+from core_wesm import ospro as op
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+CONFIG = os.path.join(os.path.dirname(__file__), "..", "src", "core_wesm",
+                      "config_files", "config_CORE-WESM.yaml")
+
+DATAFILE = """# Model file written by otoole
+param default 0.05 : DiscountRate :=
+;
+param default 0 : CapitalCost :=
+RE1 T1 2020 10
+RE1 T1 2021 11
+RE1 T2 2022 5
+RE1 T2 2021 0
+;
+param default 1 : OperationalLife :=
+RE1 T1 20
+RE1 T2 1
+;
+param default 0 : OutputActivityRatio :=
+RE1 T1 C1 1 2020 1
+RE1 T1 C1 1 2021 1
+RE1 T1 C1 1 2022 1
+;
+set COMMODITY :=
+C1
+;
+set MODE_OF_OPERATION :=
+1
+;
+set REGION :=
+RE1
+;
+set TECHNOLOGY :=
+T1
+T2
+;
+set YEAR :=
+2020
+2021
+2022
+;
+end;
+"""
+
+
+def _get_config():
+    dcfg = op.DataConfig.from_file(CONFIG)
+    return op.DataConfig({k: v for k, v in dcfg.items()
+                          if not k.startswith("ft_")})
+
+
+def _read_spreadsheet(path, dcfg):
+    """Read a spreadsheet converted with otoole as done in downscale"""
+    data = op.read_workbook(path, sheet_name=None)
+    for k in dcfg.inputs:
+        if k not in data:
+            data[k] = data.pop(dcfg[k]["short_name"])
+        if dcfg[k]["type"] == "set":
+            continue
+        df = data[k].set_index([i for i in dcfg[k]["indices"]
+                                if i != "YEAR" or "YEAR" in data[k].columns])
+        if "YEAR" in df.index.names:
+            df = df.unstack("YEAR").droplevel(level=0, axis=1)
+        default = dcfg[k]["default"]
+        df = df.loc[~(df == default).all(axis=1)]
+        data[k] = df.fillna(default)
+    return data
+
+
+def test_read_datafile(tmp_path, monkeypatch):
+    """Datafile parsed directly as read with otoole from a spreadsheet"""
+    monkeypatch.chdir(tmp_path)
+    dcfg = _get_config()
+    with open("datafile.txt", "w") as fh:
+        fh.write(DATAFILE)
+    with open("config.yaml", "w") as fh:
+        op.yaml.dump({k: dcfg[k] for k in dcfg.inputs}, fh)
+    otoole.convert("config.yaml", "datafile", "excel", "datafile.txt",
+                   "model.xlsx")
+
+    data = op.read_datafile("datafile.txt", dcfg)
+    ref = _read_spreadsheet("model.xlsx", dcfg)
+
+    assert set(data.keys()) == set(dcfg.inputs)
+    assert data["TECHNOLOGY"]["VALUE"].tolist() == ["T1", "T2"]
+    assert data["YEAR"]["VALUE"].tolist() == [2020, 2021, 2022]
+    assert data["DiscountRate"].empty
+    cc = data["CapitalCost"]
+    assert cc.columns.tolist() == [2020, 2021, 2022]
+    assert cc.loc[("RE1", "T1")].tolist() == [10, 11, 0]
+    assert cc.loc[("RE1", "T2")].tolist() == [0, 0, 5]
+    assert data["OperationalLife"]["VALUE"].to_dict() == {("RE1", "T1"): 20}
+
+    for k in ["REGION", "TECHNOLOGY", "YEAR", "MODE_OF_OPERATION",
+              "COMMODITY"]:
+        assert (data[k]["VALUE"].astype(str).tolist()
+                == ref[k]["VALUE"].astype(str).tolist())
+    for k in ["DiscountRate", "CapitalCost", "OperationalLife",
+              "OutputActivityRatio"]:
+        df = data[k].rename(index=str)
+        exp = ref[k].rename(index=str)
+        exp.columns = [int(c) if str(c).isdigit() else c
+                       for c in exp.columns]
+        pd.testing.assert_frame_equal(df, exp.astype(float),
+                                      check_dtype=False,
+                                      check_index_type=False,
+                                      check_column_type=False,
+                                      check_names=False)
+
+
+def test_read_datafile_tabular(tmp_path):
+    """Only the list format written by otoole is supported"""
+    path = tmp_path / "datafile.txt"
+    path.write_text("param default 0 : CapitalCost : 2020 2021 :=\n"
+                    "RE1 T1 10 11\n;\nend;\n")
+    with pytest.raises(ValueError):
+        op.read_datafile(str(path), _get_config())
@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+from core_wesm import ospro as op
+
+__author__ = "lhofbauer"
+__copyright__ = "lhofbauer"
+__license__ = "MIT"
+
+
+def _frame(rows):
+    idx = pd.MultiIndex.from_tuples([r[:-1] for r in rows],
+                                    names=["REGION", "TECHNOLOGY", "YEAR"])
+    return pd.DataFrame({"VALUE": [float(r[-1]) for r in rows]}, index=idx)
+
+
+def _get_data(calls=None):
+    """Scenario data with a shared and a lazily resolved parameter"""
+    calls = calls if calls is not None else list()
+
+    def _delta():
+        calls.append("VariableCost")
+        return _frame([("RE1", "T1", 2021, 5)])
+
+    base = {"CapitalCost": _frame([("RE1", "T1", 2020, 10),
+                                   ("RE1", "T1", 2021, 11),
+                                   ("RE1", "T1", 2030, 12)]),
+            "VariableCost": _frame([("RE1", "T1", 2020, 1),
+                                    ("RE1", "T1", 2021, 2)])}
+    sd = op.ScenarioData(base=base, years=range(2020, 2022))
+    sd["TECHNOLOGY"] = pd.DataFrame({"VALUE": ["T1"]})
+    sd._set_delta("CapitalCost", _frame([("RE1", "T1", 2021, 20)]))
+    sd._set_delta("VariableCost", _delta)
+
+    return sd
+
+
+def test_materialize():
+    """Override rows take precedence and shared rows are filtered by
+    year"""
+    sd = _get_data()
+    assert list(sd) == ["TECHNOLOGY", "CapitalCost", "VariableCost"]
+    assert sd["CapitalCost"]["VALUE"].to_dict() == {("RE1", "T1", 2020): 10,
+                                                    ("RE1", "T1", 2021): 20}
+    assert sd["VariableCost"]["VALUE"].to_dict() == {("RE1", "T1", 2020): 1,
+                                                     ("RE1", "T1", 2021): 5}
+    assert sd._base["CapitalCost"]["VALUE"].tolist() == [10, 11, 12]
+
+
+def test_contains():
+    """Membership checks do not materialize parameters"""
+    calls = list()
+    sd = _get_data(calls)
+    assert "VariableCost" in sd
+    assert "CapitalCost" in sd
+    assert "FixedCost" not in sd
+    assert calls == []
+    assert set(sd._delta) == {"CapitalCost", "VariableCost"}
+    sd["VariableCost"]
+    sd["VariableCost"]
+    assert calls == ["VariableCost"]
+
+
+def test_delete():
+    """Parameters can be deleted before and after materialization"""
+    calls = list()
+    sd = _get_data(calls)
+    del sd["VariableCost"]
+    sd["CapitalCost"]
+    del sd["CapitalCost"]
+    assert list(sd) == ["TECHNOLOGY"]
+    assert len(sd) == 1
+    assert calls == []
+    with pytest.raises(KeyError):
+        sd["VariableCost"]
+    with pytest.raises(KeyError):
+        del sd["CapitalCost"]
+
+
+def test_copy():
+    """Copies share rows not materialized but not materialized values"""
+    calls = list()
+    sd = _get_data(calls)
+    sd["CapitalCost"]
+    c = sd.copy()
+
+    c["CapitalCost"].loc[("RE1", "T1", 2020), "VALUE"] = 0
+    c["TECHNOLOGY"] = pd.DataFrame({"VALUE": ["T2"]})
+    c["FixedCost"] = _frame([("RE1", "T1", 2020, 3)])
+    del c["VariableCost"]
+    assert sd["CapitalCost"].loc[("RE1", "T1", 2020), "VALUE"] == 10
+    assert sd["TECHNOLOGY"]["VALUE"].tolist() == ["T1"]
+    assert list(sd) == ["TECHNOLOGY", "CapitalCost", "VariableCost"]
+    assert calls == []
+
+    c = sd.copy()
+    c["VariableCost"].loc[("RE1", "T1", 2020), "VALUE"] = 0
+    assert "VariableCost" in sd._delta
+    assert sd["VariableCost"].loc[("RE1", "T1", 2020), "VALUE"] == 1
+    assert calls == ["VariableCost"]*2
+
+
+def test_create_data_deepcopy():
+    """Deep copies of scenario data containers are independent"""
+    data = {"S1": _get_data()}
+    data["S1"]["CapitalCost"]
+    d = op._create_data_deepcopy(data)
+
+    assert isinstance(d["S1"], op.ScenarioData)
+    assert list(d["S1"]) == list(data["S1"])
+    for k in data["S1"]:
+        pd.testing.assert_frame_equal(d["S1"][k], data["S1"][k])
+    d["S1"]["CapitalCost"].loc[("RE1", "T1", 2020), "VALUE"] = 0
+    d["S1"]["VariableCost"].loc[("RE1", "T1", 2020), "VALUE"] = 0
+    assert data["S1"]["CapitalCost"].loc[("RE1", "T1", 2020), "VALUE"] == 10
+    assert data["S1"]["VariableCost"].loc[("RE1", "T1", 2020), "VALUE"] == 1